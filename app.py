@@ -3,11 +3,16 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.impute import SimpleImputer
-from sklearn.neighbors import NearestNeighbors
 from datetime import datetime
 
+from backend.data_manager import read_dataset, source_version
+from backend.filter_index import FilterIndex
+from backend.cube import KPICube, kpi_totals, describe_totals
+from backend.trend import binned_trend
+from backend.model_store import load_or_train
+from backend.importance import ImportanceService, importance_job_id
+from backend.cache import LRUCache, filter_key
+
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Interactive Dashboard — CCTI & Market Reaction Analysis",
@@ -55,32 +60,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- 2. DATA LOADING & CACHING ---
-@st.cache_data
+@st.cache_resource
 def load_data():
     """Lengths and caches the dataset."""
     try:
-        df = pd.read_csv("final_with_CCTI.csv")
-        
-        # Date Conversion
-        df['FILING_DATE'] = pd.to_datetime(df['FILING_DATE'])
+        # Shared with the FastAPI backend: parsed, typed and imputed once per
+        # CSV version, then memory-mapped from the on-disk snapshot. A cached
+        # resource, not cache_data: reruns get the same frame instead of a copy,
+        # so nothing below may modify it. The widgets need real datetimes.
+        df = read_dataset("final_with_CCTI.csv", compact=False)
         df['ym'] = df['FILING_DATE'].dt.to_period('M')
         
-        # Ensure numeric columns are actually numeric
-        numeric_cols = [
-            'CCTI', 'Return_30D_new', 'ExcessRet', 'Vol_30d', 'Momentum_12_1', 
-            'BM_w', 'Size_w', 'Negative', 'Positive', 'Uncertainty', 
-            'Litigious', 'StrongModal', 'WeakModal', 'Constraining', 'CCTI_sq'
-        ]
-        
-        # Handle non-numeric coercion errors
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Impute missing values (Median Imputation)
-        imputer = SimpleImputer(strategy='median')
-        df[numeric_cols] = imputer.fit_transform(df[numeric_cols])
-        
         return df
     except FileNotFoundError:
         st.error("Dataset 'final_with_CCTI.csv' not found. Please ensure it is in the same directory.")
@@ -88,6 +78,11 @@ def load_data():
 
 df_raw = load_data()
 
+@st.cache_resource
+def data_version():
+    # Version of the CSV load_data read (both are cached for the server's lifetime)
+    return source_version("final_with_CCTI.csv")
+
 if df_raw.empty:
     st.stop()
 
@@ -121,34 +116,50 @@ if not selected_forms:
 # Assuming 0, 1. Mapping to Readable
 conditions = {0: "Expansion (0)", 1: "Recession (1)"}
 if 'MarketCondition' in df_raw.columns:
-    df_raw['MarketCondition_Label'] = df_raw['MarketCondition'].map(conditions)
     all_conditions = list(conditions.values())
     selected_conditions = st.sidebar.multiselect("Market Condition", all_conditions, default=all_conditions)
 else:
     selected_conditions = []
+selected_mc = [k for k, v in conditions.items() if v in selected_conditions]
 
 # --- APPLY FILTERS ---
-mask = (
-    (df_raw['FILING_DATE'] >= pd.to_datetime(date_range[0])) & 
-    (df_raw['FILING_DATE'] <= pd.to_datetime(date_range[1])) &
-    (df_raw['SIC'].isin(selected_sics)) &
-    (df_raw['FORM_TYPE'].isin(selected_forms))
+# Built once per server; the leading underscore tells Streamlit not to hash the frame
+@st.cache_resource
+def build_kpi_cube(_df_in):
+    return KPICube(_df_in), FilterIndex(_df_in)
+
+kpi_cube, kpi_index = build_kpi_cube(df_raw)
+
+# Date slice + code lookups on the shared frame (a view when only dates are
+# narrowed); the charts below only read it, nothing is copied per rerun
+df = kpi_index.select(
+    df_raw, start_date=date_range[0], end_date=date_range[1],
+    sics=selected_sics, forms=selected_forms,
+    # An emptied condition picker matches nothing (an empty list would mean "all")
+    market_conditions=(selected_mc or [-1]) if 'MarketCondition' in df_raw.columns else None
 )
 
-if 'MarketCondition' in df_raw.columns:
-    mask &= (df_raw['MarketCondition_Label'].isin(selected_conditions))
-
-df = df_raw[mask].copy()
-
 st.title("Interactive Dashboard — CCTI & Market Reaction Analysis")
 st.markdown("Explore how **Corporate Communication Text Complexity (CCTI)** and sentiment affect **30-day Excess Stock Returns**. This tool leverages Machine Learning to uncover nonlinear relationships.")
 
 # --- 4. TOP METRICS ---
+@st.cache_resource
+def importance_service():
+    return ImportanceService(LRUCache(64 * 1024 * 1024))
+kpi_totals_f = kpi_totals(
+    kpi_cube, df_raw, kpi_index,
+    start_date=date_range[0], end_date=date_range[1],
+    sics=selected_sics, forms=selected_forms,
+    # An emptied condition picker matches nothing (an empty list would mean "all")
+    market_conditions=(selected_mc or [-1]) if 'MarketCondition' in df_raw.columns else None
+)
+kpis = describe_totals(kpi_totals_f, kpi_cube.measures)
+
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Filings", f"{len(df):,}")
-col2.metric("Avg CCTI", f"{df['CCTI'].mean():.2f}")
-col3.metric("Avg Excess Return", f"{df['ExcessRet'].mean():.4f}")
-col4.metric("Avg Volatility", f"{df['Vol_30d'].mean():.4f}")
+col1.metric("Total Filings", f"{kpi_totals_f['count']:,}")
+col2.metric("Avg CCTI", f"{kpis['CCTI']['mean']:.2f}")
+col3.metric("Avg Excess Return", f"{kpis['ExcessRet']['mean']:.4f}")
+col4.metric("Avg Volatility", f"{kpis['Vol_30d']['mean']:.4f}")
 
 st.markdown("---")
 
@@ -198,11 +209,15 @@ with col_right:
         y="ExcessRet", 
         hover_data=['CoName', 'FILING_DATE', 'ACC_NUM'],
         opacity=0.5,
-        trendline="lowess",
-        trendline_color_override="red",
         title="CCTI vs Excess Returns (with lowess trend)",
         color_discrete_sequence=['#475569']
     )
+    # Grid-binned LOWESS over all filtered points: cost does not grow with the row count
+    trend_x, trend_y = binned_trend(df_chart2['CCTI'], df_chart2['ExcessRet'])
+    fig_scatter.add_trace(go.Scatter(
+        x=trend_x, y=trend_y, mode='lines', name='lowess trend',
+        line=dict(color='red')
+    ))
     fig_scatter.update_layout(xaxis_title="CCTI (Complexity)", yaxis_title="30-Day Excess Return", plot_bgcolor="white")
     st.plotly_chart(fig_scatter, use_container_width=True)
     st.caption("The red trendline (LOESS) highlights the nonlinear relationship involving complexity and returns.")
@@ -218,24 +233,16 @@ with col_left_2:
     sentiment_vars = ['Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining']
     selected_sentiment = st.selectbox("Select Sentiment Variable", sentiment_vars, index=0)
     
-    # Create bins for CCTI
-    df['CCTI_Bin'] = pd.cut(df['CCTI'], bins=20, labels=False)
-    
-    # Group by Bin and calculate mean sentiment/ExcessRet
-    heatmap_data = df.groupby('CCTI_Bin')[[selected_sentiment, 'ExcessRet']].mean().reset_index()
+    # Create bins for CCTI (a separate series: df is a view on the shared frame)
+    ccti_bin = pd.cut(df['CCTI'], bins=20, labels=False).rename('CCTI_Bin')
     
     # We want a 2D representation. Let's bin Sentiment too for a proper heatmap matrix?
     # Or just a bar chart of Sentiment across CCTI bins? The prompt asks for heatmap.
     # Approach: X=CCTI Bins, Y=Quantiles of Sentiment, Color=Mean ExcessRet
     
     try:
-        df['Sentiment_Bin'] = pd.qcut(df[selected_sentiment], q=10, labels=False, duplicates='drop')
-        pivot_table = df.pivot_table(
-            index='Sentiment_Bin', 
-            columns='CCTI_Bin', 
-            values='ExcessRet', 
-            aggfunc='mean'
-        )
+        sentiment_bin = pd.qcut(df[selected_sentiment], q=10, labels=False, duplicates='drop').rename('Sentiment_Bin')
+        pivot_table = df['ExcessRet'].groupby([sentiment_bin, ccti_bin]).mean().unstack('CCTI_Bin')
         
         fig_heat = px.imshow(
             pivot_table,
@@ -260,19 +267,45 @@ with col_right_2:
     ]
     target = 'ExcessRet'
     
-    if st.button("Train Feature Importance Model"):
-        with st.spinner("Training Random Forest..."):
-            X = df[features]
-            y = df[target]
-            
-            rf = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42)
-            rf.fit(X, y)
-            
-            importances = pd.DataFrame({
-                'Feature': features,
-                'Importance': rf.feature_importances_
-            }).sort_values(by='Importance', ascending=True)
-            
+    # Background jobs keyed by the sidebar filters: repeat views come from the
+    # store, and a rerun of the script does not interrupt a running fit
+    imp_service = importance_service()
+    imp_filters = dict(
+        start_date=date_range[0], end_date=date_range[1], sics=selected_sics,
+        forms=selected_forms, market_conditions=selected_mc or [-1]
+    )
+    imp_job_id = importance_job_id(data_version(), filter_key(imp_filters), 'impurity', 1)
+    imp_job = imp_service.get(imp_job_id)
+    df_imp = df[features + [target]]
+
+    if imp_job is None and st.button("Train Feature Importance Model"):
+        imp_job = imp_service.submit(imp_job_id, lambda: df_imp, method='impurity', n_repeats=1, features=features)
+
+    if imp_job is None:
+        st.info("Click the button to train the model and view feature importances.")
+    else:
+        # While the fit runs only this fragment re-runs (polling the job), so
+        # the rest of the page, the simulator included, renders right away
+        running = imp_job["status"] in ("queued", "running")
+
+        @st.fragment(run_every=0.5 if running else None)
+        def importance_panel():
+            job = imp_service.get(imp_job_id) or {"status": "failed", "error": "job expired"}
+            if job["status"] in ("queued", "running"):
+                st.progress(job["progress"], text="Training Random Forest...")
+                return
+            if running:
+                # Finished since the page was drawn: rerun once to stop the polling
+                st.rerun()
+
+            if job["status"] == "failed":
+                st.warning(f"Feature importance failed: {job['error']}")
+                return
+            importances = pd.DataFrame([
+                {'Feature': r['feature'], 'Importance': r['importance']}
+                for r in job["result"]["impurity"]
+            ]).sort_values(by='Importance', ascending=True)
+
             fig_imp = px.bar(
                 importances, 
                 x='Importance', 
@@ -284,8 +317,8 @@ with col_right_2:
             )
             fig_imp.update_layout(height=400)
             st.plotly_chart(fig_imp, use_container_width=True)
-    else:
-        st.info("Click the button to train the model and view feature importances.")
+
+        importance_panel()
 
 st.markdown("---")
 
@@ -302,14 +335,12 @@ def train_simulation_model(df_in):
         'CCTI', 'CCTI_sq', 'Momentum_12_1', 'Vol_30d', 'BM_w', 'Size_w',
         'Negative', 'Positive'
     ]
-    # Simple imputation just in case
-    df_clean = df_in.dropna(subset=feats + ['ExcessRet'])
-    
-    model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=42)
-    model.fit(df_clean[feats], df_clean['ExcessRet'])
-    
-    knn = NearestNeighbors(n_neighbors=5)
-    knn.fit(df_clean[feats])
+    # Loaded from the model store; trained only when the data or settings change
+    model, knn, rows = load_or_train(
+        "streamlit_sim_rf", df_in, feats, 'ExcessRet',
+        n_estimators=100, max_depth=10, random_state=42
+    )
+    df_clean = df_in.iloc[rows]
     
     return model, knn, df_clean
 
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from .data_manager import parse_frame, source_version, resolve_path
+from .ml_engine import _feature_cols
+from .regression import regression_columns, SPECS, _solve
+
+# Walk-forward (out-of-sample) evaluation of the dashboard's RandomForest and
+# the notebook's OLS CCTI_sq specification.
+#
+# Filings are ordered by FILING_DATE and cut into consecutive test periods
+# (years by default). Each fold trains on the filings before its test period
+# (all of them, or the last --window periods) and scores the period, so no
+# model ever sees a filing dated after the ones it predicts. Every
+# (fold, model) pair is an independent task on a process pool.
+#
+# The matrices come from the raw CSV, not the served frame: the dashboard
+# median-imputes over the whole sample, which would leak later filings into
+# earlier folds. Rows without a target are dropped, every other gap stays NaN
+# and is filled inside each fold with the medians of its training rows.
+#
+# The date-sorted feature matrices are built once per dataset version and
+# feature set and stored as .npy files; a fold is a pair of row ranges into
+# them, and workers memory-map the arrays, so folds are neither copied nor
+# pickled and a rerun with other windows or hyperparameters skips the build.
+#
+# Results (per-fold R^2, out-of-sample R^2 against the training mean, MSE,
+# MAE and fit/predict timing, plus pooled totals per model) are written to
+# CCTI_BACKTEST_DIR; the latest run is served by GET /api/backtest.
+#
+#   python -m backend.backtest --freq Y --min-train 5000 --workers 8
+#   python -m backend.backtest --freq Q --window 12 --embargo 90
+
+BACKTEST_VERSION = 2 # bump when the cached matrix layout changes
+BACKTEST_DIR = os.environ.get(
+    "CCTI_BACKTEST_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".backtest")
+)
+LATEST = "latest.json"
+TARGET = 'ExcessRet'
+OLS_SPEC = 'ccti_sq'
+RF_PARAMS = {"n_estimators": 50, "max_depth": 10, "random_state": 42} # as in ml_engine
+MODELS = ('RandomForest', 'OLS_' + OLS_SPEC)
+FREQS = ('Y', 'Q', 'M')
+
+_matrices = {} # matrix dir -> memory-mapped arrays, per process
+
+def _matrix_key(version: str):
+    config = {
+        "backtest": BACKTEST_VERSION, "version": version, "target": TARGET,
+        "rf": list(_feature_cols), "ols": SPECS[OLS_SPEC][1],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+def build_matrices(file_path: str = "final_with_CCTI.csv"):
+    """
+    Date-sorted fold matrices for the dataset at file_path, built on first use
+    from the unimputed CSV: rows (CSV row numbers), days (int), y (target),
+    X (forest features) and Z (OLS design, const first), with the feature gaps
+    left as NaN for run_fold to fill. Rows without a date or target are dropped.
+    Returns (matrix dir, dataset version).
+    """
+    path = resolve_path(file_path)
+    version = source_version(path)
+    out = os.path.join(BACKTEST_DIR, f"matrices-{version}-{_matrix_key(version)}")
+    if os.path.exists(os.path.join(out, "meta.json")):
+        print(f"Loaded fold matrices: {out}")
+        return out, version
+
+    raw = pd.read_csv(path)
+    raw['__row'] = np.arange(len(raw))
+    df = parse_frame(raw) # sorted by date, nothing imputed
+    if TARGET not in df.columns or 'FILING_DATE' not in df.columns:
+        raise ValueError(f"Dataset lacks FILING_DATE or {TARGET}")
+    df = df[(df['FILING_DATE'].notna() & df[TARGET].notna()).to_numpy()]
+    order = df['__row'].to_numpy()
+
+    X = np.column_stack([df[c].to_numpy(dtype=float) if c in df.columns else np.full(len(df), np.nan)
+                         for c in _feature_cols]) if len(df) else np.empty((0, len(_feature_cols)))
+    cols = regression_columns(df)
+    target, variables = SPECS[OLS_SPEC]
+    missing = [v for v in [target] + variables if v not in cols]
+    if missing:
+        raise ValueError(f"Dataset lacks OLS columns: {missing}")
+    Z = np.column_stack([np.ones(len(df))] + [cols[v] for v in variables])
+
+    tmp = f"{out}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    arrays = {
+        "rows": order.astype(np.int64),
+        "days": df['FILING_DATE'].to_numpy().astype('datetime64[D]').astype(np.int64),
+        "y": df[TARGET].to_numpy(dtype=float),
+        "X": np.ascontiguousarray(X),
+        "Z": np.ascontiguousarray(Z),
+    }
+    for name, a in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), a)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"version": version, "source": path, "rows": int(len(order)),
+                   "rf_features": list(_feature_cols), "ols": ['const'] + variables,
+                   "created": time.time()}, f, indent=1)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    print(f"Fold matrices written: {out} ({len(order)} rows)")
+    return out, version
+
+def load_matrices(matrix_dir: str):
+    arrays = _matrices.get(matrix_dir)
+    if arrays is None:
+        arrays = {name: np.load(os.path.join(matrix_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("days", "y", "X", "Z")}
+        _matrices[matrix_dir] = arrays
+    return arrays
+
+def make_folds(days: np.ndarray, freq: str = 'Y', window: int = None, embargo: int = 0,
+               min_train: int = 1000, start: str = None):
+    """
+    Walk-forward folds over sorted day numbers: one per test period of freq,
+    trained on the rows before it (the last `window` periods only, if given,
+    and ending `embargo` days before the test period). Returns dicts with row
+    ranges into the sorted arrays.
+    """
+    if freq not in FREQS:
+        raise ValueError(f"freq must be one of {list(FREQS)}")
+    if not len(days):
+        return []
+    first, last = (pd.Timestamp(np.datetime64(int(d), 'D')) for d in (days[0], days[-1]))
+    periods = pd.period_range(first, last, freq=freq)
+
+    def day(ts):
+        return int(np.datetime64(ts.normalize().to_datetime64(), 'D').astype(np.int64))
+
+    folds = []
+    for period in periods:
+        if start and period.end_time < pd.Timestamp(start):
+            continue
+        test_lo = int(np.searchsorted(days, day(period.start_time), 'left'))
+        test_hi = int(np.searchsorted(days, day(period.end_time), 'right'))
+        train_hi = int(np.searchsorted(days, day(period.start_time) - embargo, 'left'))
+        train_lo = 0
+        if window:
+            train_lo = int(np.searchsorted(days, day((period - window).start_time), 'left'))
+        if test_hi <= test_lo or train_hi - train_lo < min_train:
+            continue
+        folds.append({
+            "fold": len(folds),
+            "test_period": str(period),
+            "train": (train_lo, train_hi),
+            "test": (test_lo, test_hi),
+        })
+    return folds
+
+def _scores(y: np.ndarray, pred: np.ndarray, train_mean: float):
+    err = y - pred
+    sse = float(err @ err)
+    n = len(y)
+    sum_y = float(y.sum())
+    sum_y2 = float(y @ y)
+    tss = sum_y2 - sum_y ** 2 / n if n else 0.0
+    bench = y - train_mean
+    sse_bench = float(bench @ bench)
+    return {
+        "n_test": n,
+        "r2": 1 - sse / tss if tss > 0 else None,
+        "r2_oos": 1 - sse / sse_bench if sse_bench > 0 else None,
+        "mse": sse / n if n else None,
+        "rmse": float(np.sqrt(sse / n)) if n else None,
+        "mae": float(np.abs(err).mean()) if n else None,
+        # Pooling terms for the per-model totals
+        "sse": sse, "sae": float(np.abs(err).sum()), "sum_y": sum_y, "sum_y2": sum_y2,
+        "sse_bench": sse_bench,
+    }
+
+def impute_fold(train: np.ndarray, test: np.ndarray):
+    """Fills the NaNs of both slices with the training slice's column medians (0 for an all-NaN column)."""
+    train, test = np.array(train), np.array(test)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # all-NaN columns
+        medians = np.nanmedian(train, axis=0) if len(train) else np.zeros(train.shape[1])
+    medians = np.nan_to_num(medians, nan=0.0)
+    for a in (train, test):
+        rows, cols = np.nonzero(np.isnan(a))
+        a[rows, cols] = medians[cols]
+    return train, test
+
+def run_fold(matrix_dir: str, model: str, fold: dict, rf_params: dict = None):
+    """Trains model on the fold's training rows and scores its test rows."""
+    m = load_matrices(matrix_dir)
+    (a, b), (c, d) = fold["train"], fold["test"]
+    y_train, y_test = np.asarray(m["y"][a:b]), np.asarray(m["y"][c:d])
+
+    if model == 'RandomForest':
+        X_train, X_test = impute_fold(m["X"][a:b], m["X"][c:d])
+        t0 = time.perf_counter()
+        # One core per task: the pool already runs a task per core
+        rf = RandomForestRegressor(n_jobs=1, **(rf_params or RF_PARAMS))
+        rf.fit(X_train, y_train)
+        t1 = time.perf_counter()
+        pred = rf.predict(X_test) if len(X_test) else np.empty(0)
+    else:
+        Z_train, Z_test = impute_fold(m["Z"][a:b], m["Z"][c:d])
+        t0 = time.perf_counter()
+        W = np.column_stack([Z_train, y_train])
+        k = Z_train.shape[1]
+        beta = _solve(W.T @ W, list(range(k)), k)[0]
+        t1 = time.perf_counter()
+        pred = Z_test @ beta
+    t2 = time.perf_counter()
+
+    result = {
+        "fold": fold["fold"], "model": model, "test_period": fold["test_period"],
+        "n_train": len(y_train),
+        "fit_seconds": t1 - t0, "predict_seconds": t2 - t1,
+    }
+    result.update(_scores(y_test, pred, float(y_train.mean()) if len(y_train) else 0.0))
+    return result
+
+def summarize(results: list):
+    """Pooled out-of-sample metrics per model over all folds."""
+    summary = {}
+    for model in MODELS:
+        rows = [r for r in results if r["model"] == model and r["n_test"]]
+        if not rows:
+            continue
+        n = sum(r["n_test"] for r in rows)
+        sse = sum(r["sse"] for r in rows)
+        sum_y = sum(r["sum_y"] for r in rows)
+        tss = sum(r["sum_y2"] for r in rows) - sum_y ** 2 / n
+        bench = sum(r["sse_bench"] for r in rows)
+        fold_r2 = [r["r2"] for r in rows if r["r2"] is not None]
+        summary[model] = {
+            "folds": len(rows),
+            "n_test": n,
+            "r2": 1 - sse / tss if tss > 0 else None,
+            "r2_oos": 1 - sse / bench if bench > 0 else None,
+            "mse": sse / n,
+            "rmse": float(np.sqrt(sse / n)),
+            "mae": sum(r["sae"] for r in rows) / n,
+            "mean_fold_r2": float(np.mean(fold_r2)) if fold_r2 else None,
+            "fit_seconds": sum(r["fit_seconds"] for r in rows),
+            "predict_seconds": sum(r["predict_seconds"] for r in rows),
+        }
+    return summary
+
+def backtest(file_path: str = "final_with_CCTI.csv", freq: str = 'Y', window: int = None,
+             embargo: int = 0, min_train: int = 1000, start: str = None, workers: int = None,
+             models=MODELS, rf_params: dict = None):
+    """Runs every (fold, model) task, in parallel when workers > 1. Returns the results document."""
+    t0 = time.time()
+    matrix_dir, version = build_matrices(file_path)
+    folds = make_folds(np.asarray(load_matrices(matrix_dir)["days"]), freq, window, embargo, min_train, start)
+    tasks = [(model, fold) for fold in folds for model in models]
+    # Biggest training sets first, so the pool does not end on one long forest
+    tasks.sort(key=lambda t: (t[0] != 'RandomForest', -(t[1]["train"][1] - t[1]["train"][0])))
+    workers = workers or os.cpu_count() or 1
+
+    results = []
+    if workers <= 1:
+        for model, fold in tasks:
+            results.append(run_fold(matrix_dir, model, fold, rf_params))
+            _progress(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks) or 1)) as pool:
+            futures = [pool.submit(run_fold, matrix_dir, model, fold, rf_params) for model, fold in tasks]
+            for future in as_completed(futures):
+                results.append(future.result())
+                _progress(results[-1])
+    results.sort(key=lambda r: (r["fold"], r["model"]))
+
+    fold_info = {f["fold"]: f for f in folds}
+    for r in results:
+        fold = fold_info[r["fold"]]
+        r["train_rows"], r["test_rows"] = list(fold["train"]), list(fold["test"])
+    return {
+        "created": time.time(),
+        "dataset_version": version,
+        "source": resolve_path(file_path),
+        "config": {
+            "freq": freq, "window": window, "embargo": embargo, "min_train": min_train,
+            "start": start, "target": TARGET, "models": list(models),
+            "rf_params": rf_params or RF_PARAMS, "rf_features": list(_feature_cols),
+            "ols": ['const'] + SPECS[OLS_SPEC][1],
+        },
+        "workers": workers,
+        "wall_seconds": time.time() - t0,
+        "summary": summarize(results),
+        "folds": results,
+    }
+
+def _progress(r: dict):
+    r2 = "n/a" if r["r2_oos"] is None else f"{r['r2_oos']:.4f}"
+    print(f"  {r['test_period']:>8} {r['model']:<12} train={r['n_train']:<8} "
+          f"test={r['n_test']:<7} R2_oos={r2} fit={r['fit_seconds']:.2f}s")
+
+def save_results(doc: dict, directory: str = None):
+    """Writes the run and points latest.json at it (atomic rename)."""
+    directory = directory or BACKTEST_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(doc["created"]))
+    path = os.path.join(directory, f"backtest-{doc['dataset_version']}-{stamp}.json")
+    payload = json.dumps(doc, indent=1)
+    for target in (path, os.path.join(directory, LATEST)):
+        tmp = f"{target}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.write(payload)
+        os.replace(tmp, target)
+    return path
+
+_latest = (None, None) # (mtime_ns, document)
+
+def latest_results(directory: str = None):
+    """The newest saved run, or None; re-read only when latest.json changes."""
+    global _latest
+    path = os.path.join(directory or BACKTEST_DIR, LATEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _latest[0] != mtime:
+        with open(path) as f:
+            _latest = (mtime, json.load(f))
+    return _latest[1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the RandomForest and OLS CCTI_sq models.")
+    parser.add_argument("--data", default="final_with_CCTI.csv")
+    parser.add_argument("--freq", default="Y", choices=FREQS, help="test period length")
+    parser.add_argument("--window", type=int, default=None, help="rolling window in periods (default: expanding)")
+    parser.add_argument("--embargo", type=int, default=0, help="days between training and test rows")
+    parser.add_argument("--min-train", type=int, default=1000)
+    parser.add_argument("--start", default=None, help="first test period on or after this date")
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=MODELS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default=None, help="also write the per-fold table to a CSV")
+    args = parser.parse_args()
+
+    doc = backtest(args.data, args.freq, args.window, args.embargo, args.min_train, args.start,
+                   args.workers, tuple(args.models))
+    path = save_results(doc)
+    if args.out:
+        pd.DataFrame(doc["folds"]).to_csv(args.out, index=False)
+    for model, s in doc["summary"].items():
+        r2, r2_oos = (("n/a" if v is None else f"{v:.4f}") for v in (s['r2'], s['r2_oos']))
+        print(f"{model}: {s['folds']} folds, n={s['n_test']}, R2={r2}, "
+              f"R2_oos={r2_oos}, MSE={s['mse']:.4f}, fit {s['fit_seconds']:.1f}s")
+    print(f"Backtest in {doc['wall_seconds']:.1f}s -> {path}")
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+FILTER_FIELDS = ['start_date', 'end_date', 'sics', 'forms', 'market_conditions']
+
+def _canonical_list(values):
+    if not values:
+        return None
+    unique = set(values)
+    try:
+        return sorted(unique)
+    except TypeError:
+        return sorted(unique, key=repr)
+
+def _canonical_date(value):
+    if not value:
+        return None
+    try:
+        return pd.to_datetime(value).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        return str(value)
+
+def canonical_filters(filters: dict):
+    """Normalizes a FilterRequest-like dict: None/empty are equal, lists are sorted sets."""
+    return {
+        'start_date': _canonical_date(filters.get('start_date')),
+        'end_date': _canonical_date(filters.get('end_date')),
+        'sics': _canonical_list([float(v) for v in filters.get('sics') or []]),
+        'forms': _canonical_list([str(v) for v in filters.get('forms') or []]),
+        'market_conditions': _canonical_list([int(v) for v in filters.get('market_conditions') or []]),
+    }
+
+def filter_key(filters: dict):
+    payload = json.dumps(canonical_filters(filters), sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+REQUEST_CANONICAL_BYTES = 64 * 1024 # larger bodies are hashed as sent
+
+def request_key(method: str, path: str, query: list, body: bytes):
+    """Hash of a request: method, path, sorted query pairs and the body (JSON with sorted keys)."""
+    h = hashlib.sha1(json.dumps([method.upper(), path, sorted(query)]).encode())
+    if body and len(body) <= REQUEST_CANONICAL_BYTES:
+        try:
+            payload = json.loads(body)
+            if isinstance(payload, dict) and set(payload) <= set(FILTER_FIELDS):
+                payload = canonical_filters(payload)
+            body = json.dumps(payload, sort_keys=True).encode()
+        except ValueError:
+            pass
+    h.update(body or b"")
+    return h.hexdigest()
+
+def estimate_size(value):
+    """Rough byte size used for the cache budget."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=False))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 1024
+
+class LRUCache:
+    """Thread-safe LRU cache with a byte budget and hit/miss counters."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, nbytes: int = None):
+        nbytes = estimate_size(value) if nbytes is None else nbytes
+        if nbytes > self.max_bytes:
+            return value # Too large to cache at all
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._items:
+                _, (_, size) = self._items.popitem(last=False)
+                self.current_bytes -= size
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+# Shared by data_manager (filtered row sets) and the API handlers (derived results)
+result_cache = LRUCache(int(float(os.environ.get("CCTI_CACHE_MB", "256")) * 1024 * 1024))
@@ -0,0 +1,338 @@
+import pandas as pd
+import numpy as np
+from .data_manager import DECILE_SUFFIX, filing_dates, scan_frame
+from .partitions import ROW_COL
+from .trend import compute_trend, bin_sums, fit_bins, exact_trend
+
+# Pure computations behind the chart/metric endpoints. They take an already
+# filtered frame, never mutate it (it may be shared through the result cache)
+# and return JSON-ready structures. The scan_* variants return the same
+# structures from a partitioned-mode scan (data_manager.filtered_scan),
+# merging per-chunk partial sums (or per-chunk samples) instead of
+# materializing the filtered rows.
+
+def metrics_from_kpis(kpis: dict):
+    # Same payload as compute_metrics, answered from the KPI cube summary
+    m = kpis["measures"]
+    empty = kpis["count"] == 0
+    return {
+        "total_filings": kpis["count"],
+        "avg_ccti": m["CCTI"]["mean"] if not empty else 0,
+        "avg_excess_ret": m["ExcessRet"]["mean"] if not empty else 0,
+        "avg_vol": (m["Vol_30d"]["mean"] / 100) if not empty else 0
+    }
+
+def compute_metrics(df_f: pd.DataFrame):
+    return {
+        "total_filings": len(df_f),
+        "avg_ccti": float(df_f['CCTI'].mean()) if not df_f.empty else 0,
+        "avg_excess_ret": float(df_f['ExcessRet'].mean()) if not df_f.empty else 0,
+        "avg_vol": (float(df_f['Vol_30d'].mean()) / 100) if not df_f.empty else 0
+    }
+
+def compute_ccti_hist(df_f: pd.DataFrame, bins: int = 50):
+    if df_f.empty:
+        return []
+
+    # Histogram calculation using numpy for speed
+    counts, bin_edges = np.histogram(df_f['CCTI'].dropna(), bins=bins)
+    return _hist_rows(counts, bin_edges)
+
+def _hist_rows(counts: np.ndarray, bin_edges: np.ndarray):
+    # Format for Recharts: [{range: "-2.0 to -1.9", count: 50}, ...]
+    result = []
+    for i in range(len(counts)):
+        label = f"{bin_edges[i]:.2f}"
+        result.append({
+            "bin": label,
+            "count": int(counts[i])
+        })
+    return result
+
+HEATMAP_BINS = 10
+
+def _ccti_bins(ccti: np.ndarray, bins: int = HEATMAP_BINS, lo: float = None, hi: float = None):
+    # Equal-width bins over the filtered range (what pd.cut(bins=10) produces)
+    # (-1 marks missing values); lo/hi pass the range of a whole scan
+    missing = np.isnan(ccti)
+    if missing.all():
+        return np.full(len(ccti), -1, dtype=np.intp)
+    if lo is None:
+        lo, hi = np.nanmin(ccti), np.nanmax(ccti)
+    if hi == lo:
+        idx = np.full(len(ccti), bins // 2, dtype=np.intp)
+    else:
+        scaled = np.where(missing, 0, (ccti - lo) / (hi - lo) * bins)
+        idx = np.clip(np.floor(scaled).astype(np.intp), 0, bins - 1)
+    idx[missing] = -1
+    return idx
+
+def _sentiment_bins(df_f: pd.DataFrame, sentiment_col: str):
+    # Deciles are precomputed over the full sample at load time (data_manager);
+    # frames without them fall back to ranking the filtered rows.
+    decile_col = sentiment_col + DECILE_SUFFIX
+    if decile_col in df_f.columns:
+        return df_f[decile_col].to_numpy().astype(np.intp)
+    codes = pd.qcut(df_f[sentiment_col], q=HEATMAP_BINS, labels=False, duplicates='drop')
+    return codes.fillna(-1).to_numpy().astype(np.intp)
+
+def _grid_sums(sent_bin: np.ndarray, ccti_bin: np.ndarray, y: np.ndarray, bins: int = HEATMAP_BINS):
+    # Count, sum and sum of squares of y per cell (mergeable across chunks)
+    valid = (sent_bin >= 0) & (sent_bin < bins) & (ccti_bin >= 0) & ~np.isnan(y)
+    flat = sent_bin[valid] * bins + ccti_bin[valid]
+    y = y[valid]
+    size = bins * bins
+    counts = np.bincount(flat, minlength=size).astype(float)
+    sums = np.bincount(flat, weights=y, minlength=size)
+    sumsq = np.bincount(flat, weights=y * y, minlength=size)
+    return counts, sums, sumsq
+
+def heatmap_grid(sent_bin: np.ndarray, ccti_bin: np.ndarray, y: np.ndarray, bins: int = HEATMAP_BINS):
+    """Mean, count and standard error of y per (sentiment, CCTI) cell via bincount."""
+    return _grid_stats(*_grid_sums(sent_bin, ccti_bin, y, bins), bins)
+
+def _grid_stats(counts: np.ndarray, sums: np.ndarray, sumsq: np.ndarray, bins: int = HEATMAP_BINS):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums / counts
+        var = (sumsq - counts * mean ** 2) / (counts - 1)
+        se = np.sqrt(np.clip(var, 0, None) / counts)
+    se[counts < 2] = np.nan
+
+    shape = (bins, bins)
+    return mean.reshape(shape), counts.reshape(shape), se.reshape(shape)
+
+def compute_heatmaps(df_f: pd.DataFrame, sentiment_cols: list):
+    """One 10x10 grid per sentiment column, sharing the CCTI binning."""
+    labels = [f"Decile {i+1}" for i in range(HEATMAP_BINS)]
+    if df_f.empty:
+        return {"x": labels, "y": labels, "panels": {}}
+
+    ccti_bin = _ccti_bins(df_f['CCTI'].to_numpy(dtype=float))
+    y = df_f['ExcessRet'].to_numpy(dtype=float)
+    panels = {}
+    for col in sentiment_cols:
+        if col not in df_f.columns:
+            continue
+        panels[col] = _panel(*heatmap_grid(_sentiment_bins(df_f, col), ccti_bin, y))
+    return {
+        "x": labels, # CCTI
+        "y": labels, # Sentiment
+        "panels": panels
+    }
+
+def _panel(mean: np.ndarray, counts: np.ndarray, se: np.ndarray):
+    return {
+        # Replace NaNs (empty cells); counts tell them apart from a true 0
+        "z": np.nan_to_num(mean, nan=0).tolist(),
+        "counts": counts.astype(int).tolist(),
+        "se": np.nan_to_num(se, nan=0).tolist(),
+    }
+
+def compute_heatmap(df_f: pd.DataFrame, sentiment_col: str):
+    if df_f.empty:
+        return []
+
+    # 10x10 Grid: CCTI Bins (X) vs Sentiment Deciles (Y)
+    return _single_heatmap(compute_heatmaps(df_f, [sentiment_col]), sentiment_col)
+
+def _single_heatmap(result: dict, sentiment_col: str):
+    if sentiment_col not in result["panels"]:
+        print(f"Heatmap Error: unknown sentiment column {sentiment_col}")
+        return {"z": [], "x": [], "y": []}
+    return {"x": result["x"], "y": result["y"], **result["panels"][sentiment_col]}
+
+# --- Partitioned-mode scans ---
+
+def _ccti_range(chunk: dict):
+    ccti = chunk['CCTI']
+    ccti = ccti[~np.isnan(ccti)]
+    if not len(ccti):
+        return len(chunk['CCTI']), np.inf, -np.inf
+    return len(chunk['CCTI']), float(ccti.min()), float(ccti.max())
+
+def _scan_range(scan):
+    """(rows, min, max) of CCTI over the scanned rows (min > max when all are missing)."""
+    parts = scan(_ccti_range, ['CCTI'])
+    return (sum(p[0] for p in parts),
+            min((p[1] for p in parts), default=np.inf),
+            max((p[2] for p in parts), default=-np.inf))
+
+def scan_ccti_hist(scan, bins: int = 50):
+    rows, lo, hi = _scan_range(scan)
+    if rows == 0:
+        return []
+    if lo > hi:
+        lo, hi = 0.0, 1.0 # np.histogram's range for no values
+    # Fixed global range, so per-chunk counts add up to the one-shot histogram
+    def partial(chunk):
+        ccti = chunk['CCTI']
+        return np.histogram(ccti[~np.isnan(ccti)], bins=bins, range=(lo, hi))[0]
+    counts = np.sum(scan(partial, ['CCTI']), axis=0)
+    return _hist_rows(counts, np.histogram_bin_edges([], bins=bins, range=(lo, hi)))
+
+def _scan_heatmaps(scan, sentiment_cols: list):
+    labels = [f"Decile {i+1}" for i in range(HEATMAP_BINS)]
+    rows, lo, hi = _scan_range(scan)
+    if rows == 0:
+        return 0, {"x": labels, "y": labels, "panels": {}}
+
+    def partial(chunk):
+        # Bins over the whole scan's CCTI range, deciles are precomputed in the store
+        ccti_bin = _ccti_bins(chunk['CCTI'], lo=lo, hi=hi)
+        y = chunk['ExcessRet'].astype(float)
+        return {
+            col: _grid_sums(chunk[col + DECILE_SUFFIX].astype(np.intp), ccti_bin, y)
+            for col in sentiment_cols if col + DECILE_SUFFIX in chunk
+        }
+    parts = scan(partial, ['CCTI', 'ExcessRet'] + [c + DECILE_SUFFIX for c in sentiment_cols])
+    panels = {}
+    for col in sentiment_cols:
+        if col not in parts[0]:
+            continue
+        sums = [np.sum([p[col][k] for p in parts], axis=0) for k in range(3)]
+        panels[col] = _panel(*_grid_stats(*sums))
+    return rows, {"x": labels, "y": labels, "panels": panels}
+
+def scan_heatmaps(scan, sentiment_cols: list):
+    return _scan_heatmaps(scan, sentiment_cols)[1]
+
+def scan_heatmap(scan, sentiment_col: str):
+    rows, result = _scan_heatmaps(scan, [sentiment_col])
+    if rows == 0:
+        return []
+    return _single_heatmap(result, sentiment_col)
+
+SCATTER_SAMPLE = 2000
+# Returned per point for the "Filing Details Card"
+SCATTER_COLUMNS = [
+    'CCTI', 'ExcessRet', 'CoName', 'FILING_DATE', 'ACC_NUM',
+    'Vol_30d', 'Momentum_12_1', 'BM_w', 'Size_w', 'Negative', 'Positive',
+    'FORM_TYPE'
+]
+
+def compute_scatter(df_f: pd.DataFrame, vol_cutoff: float = 100.0,
+                    trend: str = 'exact', trend_on: str = 'sample'):
+    """
+    Display sample plus trend line. trend='binned' uses the grid approximation
+    (cost independent of row count); trend_on='full' fits the trend on every
+    filtered row instead of only the 2000-point display sample.
+    """
+    # Filter by Volatility
+    df_full = df_f[df_f['Vol_30d'] <= vol_cutoff]
+
+    # Sample down to 2000 points for frontend rendering performance
+    df_f = df_full
+    if len(df_f) > SCATTER_SAMPLE:
+        df_f = df_f.sample(SCATTER_SAMPLE, random_state=42)
+
+    # Sort by CCTI for plotting
+    df_sorted = df_f.sort_values(by='CCTI')
+
+    trend_src = df_full if trend_on == 'full' else df_sorted
+    tx, ty = compute_trend(trend_src['CCTI'], trend_src['ExcessRet'], mode=trend, max_points=SCATTER_SAMPLE)
+    return _scatter_payload(df_sorted, tx, ty)
+
+def _scatter_payload(df_sorted: pd.DataFrame, tx, ty):
+    # Stringify date for JSON safety
+    df_sorted['FILING_DATE'] = filing_dates(df_sorted['FILING_DATE']).dt.strftime('%Y-%m-%d')
+
+    # Ensure they exist (handle missing columns gracefully if dataset changes)
+    cols_to_return = [c for c in SCATTER_COLUMNS if c in df_sorted.columns]
+
+    data_points = df_sorted[cols_to_return].to_dict(orient='records')
+    trend_points = [{"CCTI": float(x), "Trend": float(y)} for x, y in zip(tx, ty)]
+
+    return {
+        "points": data_points,
+        "trend": trend_points
+    }
+
+def compute_trend_line(df_f: pd.DataFrame, vol_cutoff: float = 100.0,
+                       trend: str = 'binned', trend_on: str = 'full'):
+    """Just the trend line of compute_scatter, for clients that refresh it separately."""
+    df_full = df_f[df_f['Vol_30d'] <= vol_cutoff]
+    src = df_full
+    if trend_on != 'full' and len(src) > SCATTER_SAMPLE:
+        src = src.sample(SCATTER_SAMPLE, random_state=42)
+    tx, ty = compute_trend(src['CCTI'], src['ExcessRet'], mode=trend, max_points=SCATTER_SAMPLE)
+    return _trend_rows(tx, ty)
+
+def _trend_rows(tx, ty):
+    return [{"CCTI": float(x), "Trend": float(y)} for x, y in zip(tx, ty)]
+
+# Partitioned-mode scatter: the display sample is the SCATTER_SAMPLE rows with
+# the smallest pseudo-random key (a hash of the source row number), so each
+# chunk only keeps its own smallest keys and the merge is exact whatever the
+# chunking. Full-data trends stream bin sums (binned) or just the CCTI and
+# ExcessRet pairs (exact LOWESS, which needs every point at once).
+
+def _sample_keys(rows: np.ndarray, seed: int = 42):
+    # splitmix64 of (row + seed); uint64 arithmetic wraps around
+    z = rows.astype(np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % 2 ** 64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+def _scan_sample(scan, vol_cutoff: float, size: int = SCATTER_SAMPLE):
+    """Up to size rows with Vol_30d <= vol_cutoff as a frame, in no particular order."""
+    def partial(chunk):
+        keep = chunk['Vol_30d'] <= vol_cutoff
+        part = {c: v[keep] for c, v in chunk.items()}
+        keys = _sample_keys(part.pop(ROW_COL))
+        if len(keys) > size:
+            top = np.argpartition(keys, size)[:size]
+            part, keys = {c: v[top] for c, v in part.items()}, keys[top]
+        return part, keys
+
+    parts = scan(partial, SCATTER_COLUMNS + ['Vol_30d', ROW_COL])
+    if not parts:
+        return pd.DataFrame(columns=SCATTER_COLUMNS)
+    keys = np.concatenate([k for _, k in parts])
+    top = np.argsort(keys, kind='stable')[:size]
+    return scan_frame({c: np.concatenate([p[c] for p, _ in parts])[top] for c in parts[0][0]})
+
+def _pairs(chunk, vol_cutoff: float):
+    x, y = chunk['CCTI'], chunk['ExcessRet']
+    keep = (chunk['Vol_30d'] <= vol_cutoff) & np.isfinite(x) & np.isfinite(y)
+    return x[keep], y[keep]
+
+def _scan_trend(scan, vol_cutoff: float, trend: str):
+    """The trend line over every filtered row (trend_on='full') from a scan."""
+    columns = ['CCTI', 'ExcessRet', 'Vol_30d']
+    if trend != 'binned':
+        pairs = scan(lambda chunk: _pairs(chunk, vol_cutoff), columns)
+        if not pairs:
+            return np.empty(0), np.empty(0)
+        x = np.concatenate([p[0] for p in pairs])
+        y = np.concatenate([p[1] for p in pairs])
+        return exact_trend(x, y, max_points=SCATTER_SAMPLE)
+
+    def extent(chunk):
+        x, y = _pairs(chunk, vol_cutoff)
+        if not len(x):
+            return 0, np.inf, -np.inf, 0.0
+        return len(x), float(x.min()), float(x.max()), float(y.sum())
+    stats = scan(extent, columns)
+    n = sum(s[0] for s in stats)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    lo, hi = min(s[1] for s in stats), max(s[2] for s in stats)
+    if hi == lo:
+        return np.array([lo]), np.array([sum(s[3] for s in stats) / n])
+    sums = np.sum(scan(lambda chunk: bin_sums(*_pairs(chunk, vol_cutoff), lo, hi), columns), axis=0)
+    return fit_bins(sums, lo, hi)
+
+def scan_scatter(scan, vol_cutoff: float = 100.0, trend: str = 'exact', trend_on: str = 'sample'):
+    """compute_scatter from a scan: the rows held at once are a chunk plus the sample."""
+    df_sorted = _scan_sample(scan, vol_cutoff).sort_values(by='CCTI')
+    if trend_on == 'full':
+        tx, ty = _scan_trend(scan, vol_cutoff, trend)
+    else:
+        tx, ty = compute_trend(df_sorted['CCTI'], df_sorted['ExcessRet'], mode=trend, max_points=SCATTER_SAMPLE)
+    return _scatter_payload(df_sorted, tx, ty)
+
+def scan_trend_line(scan, vol_cutoff: float = 100.0, trend: str = 'binned', trend_on: str = 'full'):
+    if trend_on == 'full':
+        return _trend_rows(*_scan_trend(scan, vol_cutoff, trend))
+    src = _scan_sample(scan, vol_cutoff)
+    return _trend_rows(*compute_trend(src['CCTI'], src['ExcessRet'], mode=trend, max_points=SCATTER_SAMPLE))
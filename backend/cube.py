@@ -0,0 +1,256 @@
+import pandas as pd
+import numpy as np
+
+# Pre-aggregated KPI cube: one cell per (ym, SIC, FORM_TYPE, MarketCondition)
+# combination holding count, sum and sum of squares of the key measures, so
+# KPI requests cost O(cells) instead of O(rows).
+CUBE_DIMS = ['ym', 'SIC', 'FORM_TYPE', 'MarketCondition']
+CUBE_MEASURES = ['CCTI', 'ExcessRet', 'Vol_30d']
+
+# FilterRequest field -> cube dimension
+FILTER_DIMS = {'sics': 'SIC', 'forms': 'FORM_TYPE', 'market_conditions': 'MarketCondition'}
+
+class KPICube:
+    def __init__(self, df: pd.DataFrame = None, dims: list = None, measures: list = None):
+        dims = dims or CUBE_DIMS
+        measures = measures or CUBE_MEASURES
+        if df is not None:
+            dims = [d for d in dims if d in df.columns]
+            measures = [m for m in measures if m in df.columns]
+        self.dims = dims
+        self.measures = measures
+
+        # Per-dimension dictionaries (value list + value -> code)
+        self.values = {d: [] for d in dims}
+        self._lookup = {d: {} for d in dims}
+
+        k = len(measures)
+        self.cell_codes = np.empty((0, len(dims)), dtype=np.int32)
+        self.count = np.empty(0, dtype=np.int64)       # rows per cell
+        self.n = np.empty((0, k), dtype=np.int64)      # non-null rows per measure
+        self.sums = np.empty((0, k), dtype=np.float64)
+        self.sumsq = np.empty((0, k), dtype=np.float64)
+        self._cells = {}
+
+        if df is not None:
+            self.append(df)
+
+    @property
+    def n_cells(self):
+        return len(self.count)
+
+    def _encode(self, dim: str, series: pd.Series):
+        # Factorize locally, then map the (few) uniques onto the global dictionary
+        codes, uniques = pd.factorize(series)
+        lookup = self._lookup[dim]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            if value not in lookup:
+                lookup[value] = len(self.values[dim])
+                self.values[dim].append(value)
+            mapping[i] = lookup[value]
+        # Missing values (-1) get their own reserved code
+        out = np.full(len(codes), -1, dtype=np.int32)
+        valid = codes >= 0
+        out[valid] = mapping[codes[valid]]
+        return out
+
+    def append(self, rows: pd.DataFrame):
+        """Folds new rows into the cube; existing cells are updated in place."""
+        if len(rows) == 0:
+            return
+        codes = np.column_stack([self._encode(d, rows[d]) for d in self.dims])
+        keys, inverse = np.unique(codes, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        n_keys = len(keys)
+
+        k = len(self.measures)
+        count = np.bincount(inverse, minlength=n_keys)
+        n = np.zeros((n_keys, k), dtype=np.int64)
+        sums = np.zeros((n_keys, k))
+        sumsq = np.zeros((n_keys, k))
+        for j, m in enumerate(self.measures):
+            x = rows[m].to_numpy(dtype=float)
+            ok = ~np.isnan(x)
+            x = np.where(ok, x, 0.0)
+            n[:, j] = np.bincount(inverse, weights=ok, minlength=n_keys)
+            sums[:, j] = np.bincount(inverse, weights=x, minlength=n_keys)
+            sumsq[:, j] = np.bincount(inverse, weights=x * x, minlength=n_keys)
+
+        # Map each key to an existing cell or allocate a new one
+        targets = np.empty(n_keys, dtype=np.int64)
+        new_keys = []
+        for i, key in enumerate(map(tuple, keys)):
+            cell = self._cells.get(key)
+            if cell is None:
+                cell = self.n_cells + len(new_keys)
+                self._cells[key] = cell
+                new_keys.append(key)
+            targets[i] = cell
+
+        if new_keys:
+            grow = len(new_keys)
+            self.cell_codes = np.vstack([self.cell_codes, np.array(new_keys, dtype=np.int32)])
+            self.count = np.concatenate([self.count, np.zeros(grow, dtype=np.int64)])
+            self.n = np.vstack([self.n, np.zeros((grow, k), dtype=np.int64)])
+            self.sums = np.vstack([self.sums, np.zeros((grow, k))])
+            self.sumsq = np.vstack([self.sumsq, np.zeros((grow, k))])
+
+        np.add.at(self.count, targets, count)
+        np.add.at(self.n, targets, n)
+        np.add.at(self.sums, targets, sums)
+        np.add.at(self.sumsq, targets, sumsq)
+
+    def _allowed(self, dim: str, selected):
+        # Boolean table over the dimension dictionary (+1 slot for missing, code -1)
+        table = np.zeros(len(self.values[dim]) + 1, dtype=bool)
+        lookup = self._lookup[dim]
+        for value in selected:
+            # Equal ints and floats hash alike, so 3571 finds the 3571.0 code
+            code = lookup.get(value)
+            if code is not None:
+                table[code] = True
+        return table
+
+    def cell_mask(self, ym_from: str = None, ym_to: str = None, **sets):
+        """Cells inside [ym_from, ym_to] (inclusive 'YYYY-MM') matching the set filters."""
+        mask = np.ones(self.n_cells, dtype=bool)
+        if 'ym' in self.dims and (ym_from or ym_to):
+            months = np.array(self.values['ym'], dtype=object).astype(str)
+            ok = np.ones(len(months), dtype=bool)
+            if ym_from:
+                ok &= months >= ym_from
+            if ym_to:
+                ok &= months <= ym_to
+            table = np.append(ok, False)
+            mask &= table[self.cell_codes[:, self.dims.index('ym')]]
+        for key, selected in sets.items():
+            dim = FILTER_DIMS.get(key, key)
+            if not selected or dim not in self.dims:
+                continue
+            mask &= self._allowed(dim, selected)[self.cell_codes[:, self.dims.index(dim)]]
+        return mask
+
+    def totals(self, mask: np.ndarray):
+        return {
+            "count": int(self.count[mask].sum()),
+            "n": self.n[mask].sum(axis=0),
+            "sums": self.sums[mask].sum(axis=0),
+            "sumsq": self.sumsq[mask].sum(axis=0),
+        }
+
+    def totals_by(self, mask: np.ndarray, dim: str):
+        """Per-value totals of one dimension: {value: totals}."""
+        codes = self.cell_codes[mask, self.dims.index(dim)]
+        groups, inverse = np.unique(codes, return_inverse=True)
+        inverse = inverse.ravel()
+        g = len(groups)
+        count = np.bincount(inverse, weights=self.count[mask], minlength=g)
+        n = np.zeros((g, len(self.measures)))
+        sums = np.zeros_like(n)
+        sumsq = np.zeros_like(n)
+        np.add.at(n, inverse, self.n[mask])
+        np.add.at(sums, inverse, self.sums[mask])
+        np.add.at(sumsq, inverse, self.sumsq[mask])
+        out = {}
+        for i, code in enumerate(groups):
+            value = self.values[dim][code] if code >= 0 else None
+            out[value] = {"count": int(count[i]), "n": n[i], "sums": sums[i], "sumsq": sumsq[i]}
+        return out
+
+def row_totals(df: pd.DataFrame, measures: list):
+    """Same statistics as KPICube.totals, computed directly from rows."""
+    x = df[measures].to_numpy(dtype=float) if measures else np.empty((len(df), 0))
+    ok = ~np.isnan(x)
+    x = np.where(ok, x, 0.0)
+    return {"count": len(df), "n": ok.sum(axis=0), "sums": x.sum(axis=0), "sumsq": (x * x).sum(axis=0)}
+
+def merge_totals(a: dict, b: dict):
+    return {key: a[key] + b[key] for key in ("count", "n", "sums", "sumsq")}
+
+def describe_totals(totals: dict, measures: list):
+    """Turns count/sum/sumsq into mean, variance (ddof=1) and std per measure."""
+    out = {}
+    for j, m in enumerate(measures):
+        n = float(totals["n"][j])
+        s = float(totals["sums"][j])
+        ss = float(totals["sumsq"][j])
+        mean = s / n if n else 0.0
+        var = max(ss - n * mean * mean, 0.0) / (n - 1) if n > 1 else 0.0
+        out[m] = {"n": int(n), "mean": mean, "var": var, "std": var ** 0.5}
+    return out
+
+def _month_split(start_date, end_date):
+    """
+    Splits a [start, end] date filter into a range of whole months (answered by
+    the cube) and up to two partial edge ranges (answered from rows).
+    Returns (months, edges): months is (ym_from, ym_to) with None for an open
+    bound, or None when no whole month is covered; edges are (lo, hi) timestamps.
+    """
+    start = pd.to_datetime(start_date) if start_date else None
+    end = pd.to_datetime(end_date) if end_date else None
+    if start is not None and end is not None and start > end:
+        return None, []
+
+    edges = []
+    first_full = None
+    last_full = None
+    if start is not None:
+        month = start.to_period('M')
+        if start == month.start_time:
+            first_full = month
+        else:
+            first_full = month + 1
+            month_end = month.end_time
+            edges.append((start, min(month_end, end) if end is not None else month_end))
+    if end is not None:
+        month = end.to_period('M')
+        if end >= month.end_time.floor('D'):
+            # Filing dates are calendar days, so the last day covers the month
+            last_full = month
+        else:
+            last_full = month - 1
+            lo = max(month.start_time, start) if start is not None else month.start_time
+            if not edges or edges[0][0] != lo:
+                edges.append((lo, end))
+
+    if first_full is not None and last_full is not None and first_full > last_full:
+        return None, edges
+    months = (
+        str(first_full) if first_full is not None else None,
+        str(last_full) if last_full is not None else None,
+    )
+    return months, edges
+
+def kpi_totals(cube: KPICube, df: pd.DataFrame, index, start_date=None, end_date=None,
+               sics=None, forms=None, market_conditions=None, by_month: bool = False):
+    """
+    Aggregates for a FilterRequest: whole months from the cube, partial boundary
+    months from the (date-indexed) rows. With by_month, returns {ym: totals}.
+    """
+    sets = dict(sics=sics, forms=forms, market_conditions=market_conditions)
+    months, edges = _month_split(start_date, end_date)
+
+    empty = row_totals(df.iloc[0:0], cube.measures)
+    if months is None:
+        mask = np.zeros(cube.n_cells, dtype=bool)
+    else:
+        mask = cube.cell_mask(months[0], months[1], **sets)
+
+    edge_frames = []
+    for lo, hi in edges:
+        pos = index.row_positions(start_date=lo, end_date=hi, **sets)
+        edge_frames.append(df.iloc[pos])
+
+    if not by_month:
+        totals = cube.totals(mask) if mask.any() else empty
+        for frame in edge_frames:
+            totals = merge_totals(totals, row_totals(frame, cube.measures))
+        return totals
+
+    series = cube.totals_by(mask, 'ym') if mask.any() else {}
+    for frame in edge_frames:
+        for ym, rows in frame.groupby('ym', sort=False, observed=True):
+            t = row_totals(rows, cube.measures)
+            series[ym] = merge_totals(series[ym], t) if ym in series else t
+    return dict(sorted(series.items(), key=lambda item: str(item[0])))
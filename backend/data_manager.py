@@ -1,20 +1,98 @@
 import pandas as pd
 import numpy as np
 from sklearn.impute import SimpleImputer
+from .filter_index import FilterIndex
+from .cache import result_cache, filter_key
+from .cube import KPICube, kpi_totals, describe_totals
+from .partitions import PartitionedStore, PARTITION_VERSION, ROW_COL, build_store
+import hashlib
+import json
+import mmap
 import os
+import shutil
+import sys
+import threading
 
-# Global dataset cache
-_df = None
+class DatasetState:
+    """
+    One loaded dataset version: the frame plus everything derived from it.
+    Readers take the whole object once, so a reload that swaps it in never
+    mixes a new frame with an old index, and in-flight requests finish on the
+    version they started with.
+    """
 
-def load_data(file_path: str = "final_with_CCTI.csv"):
-    global _df
-    if _df is not None:
-        return _df
-    
+    def __init__(self, df: pd.DataFrame, path: str, version: str, cube: KPICube = None,
+                 index=None, store=None):
+        self.df = df
+        self.path = path
+        self.version = version
+        self.store = store # PartitionedStore in partitioned mode, else None
+        self.index = index if index is not None else FilterIndex(df)
+        self._cube = cube
+        self._cube_lock = threading.Lock()
+        self.loaded_at = pd.Timestamp.now()
+
+    @property
+    def cube(self):
+        # Built on first use: only the API process answers KPI queries, pool
+        # workers never pay for it
+        if self._cube is None:
+            with self._cube_lock:
+                if self._cube is None:
+                    self._cube = self.store.kpi_cube() if self.store is not None else KPICube(self.df)
+        return self._cube
+
+# Global dataset cache (replaced as a whole on reload)
+_state = None
+_load_lock = threading.Lock()
+
+# Numeric Columns to Impute
+NUMERIC_COLS = [
+    'CCTI', 'Return_30D_new', 'ExcessRet', 'Vol_30d', 'Momentum_12_1',
+    'BM_w', 'Size_w', 'Negative', 'Positive', 'Uncertainty',
+    'Litigious', 'StrongModal', 'WeakModal', 'Constraining', 'CCTI_sq'
+]
+
+# Loughran-McDonald categories; each gets a precomputed decile code column
+SENTIMENT_COLS = [
+    'Negative', 'Positive', 'Uncertainty', 'Litigious',
+    'StrongModal', 'WeakModal', 'Constraining'
+]
+DECILE_SUFFIX = '_Decile'
+
+# Bump whenever the preparation steps below change so old snapshots are rebuilt
+SNAPSHOT_VERSION = 4
+SNAPSHOT_DIR = os.environ.get(
+    "CCTI_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+)
+
+# Compact mode (CCTI_COMPACT=1) stores the prepared frame at its smallest
+# faithful width: float32 where every value survives the cast within
+# COMPACT_RTOL (integral columns as the smallest int, or exact float32 when
+# they hold NaN), categoricals for strings (CoName, ACC_NUM, FORM_TYPE, ym)
+# and int32 day numbers (days since 1970-01-01) for FILING_DATE. It has its
+# own snapshot, so workers map the narrow columns directly. Aggregations
+# upcast to float64 as they read, and the forest already splits on float32.
+COMPACT = os.environ.get("CCTI_COMPACT", "0") == "1"
+COMPACT_RTOL = 1e-6
+DATE_COL = 'FILING_DATE'
+
+# Partitioned mode (CCTI_STORAGE=partitioned) keeps the dataset out of core,
+# see partitions.py: the frame is backed by per-column maps partitioned by
+# filing year and SIC, the store doubles as the filter index, and the
+# histogram/heatmap tasks stream pruned chunks instead of the filtered frame.
+STORAGE = os.environ.get("CCTI_STORAGE", "memory")
+PARTITION_DIR = os.environ.get(
+    "CCTI_PARTITION_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".partitions")
+)
+
+def resolve_path(file_path: str = "final_with_CCTI.csv"):
     # Resolve file path relative to this script (data_manager.py)
     # This ensures it works whether run from root, backend/, or inside Docker
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    
+
     # If file_path is just a filename (default), prepend base_dir
     # If it's absolute, this might be redundant but safe if we assume strict project structure
     if not os.path.isabs(file_path):
@@ -31,47 +109,380 @@ def load_data(file_path: str = "final_with_CCTI.csv"):
              # Last ditch: check if it's in the root but we are in backend
              # (handled by parent check above mostly)
              raise FileNotFoundError(f"Dataset {file_path} not found. Searched in {base_dir} and parents.")
+    elif not os.path.exists(file_path):
+        raise FileNotFoundError(f"Dataset {file_path} not found.")
+    return os.path.abspath(file_path)
 
-    print(f"Loading dataset from: {file_path}")
-    df = pd.read_csv(file_path)
-    
+def parse_frame(df: pd.DataFrame):
+    """Parses dates and coerces numeric columns, in filing order; missing values stay NaN."""
     # Date Conversion
     if 'FILING_DATE' in df.columns:
         df['FILING_DATE'] = pd.to_datetime(df['FILING_DATE'])
         df['ym'] = df['FILING_DATE'].dt.to_period('M').astype(str) # String for JSON serialization
-    
-    # Numeric Columns to Impute
-    numeric_cols = [
-        'CCTI', 'Return_30D_new', 'ExcessRet', 'Vol_30d', 'Momentum_12_1', 
-        'BM_w', 'Size_w', 'Negative', 'Positive', 'Uncertainty', 
-        'Litigious', 'StrongModal', 'WeakModal', 'Constraining', 'CCTI_sq'
-    ]
-    
+        # Keep rows in filing order so date filters are contiguous slices
+        df = df.sort_values('FILING_DATE', kind='stable').reset_index(drop=True)
+
     # Ensure numeric
-    for col in numeric_cols:
+    for col in NUMERIC_COLS:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
-    
+    return df
+
+def prepare_frame(df: pd.DataFrame):
+    """Parses dates, coerces numeric columns and median-imputes them."""
+    df = parse_frame(df)
+
     # Median Imputation
     imputer = SimpleImputer(strategy='median')
     # Filter only columns that exist
-    valid_cols = [c for c in numeric_cols if c in df.columns]
+    valid_cols = [c for c in NUMERIC_COLS if c in df.columns]
     if valid_cols:
         df[valid_cols] = imputer.fit_transform(df[valid_cols])
-    
-    # Pre-calculate binning for heatmaps to save time on request
-    # df['CCTI_Bin'] = pd.cut(df['CCTI'], bins=20, labels=False)
 
-    _df = df
-    print(f"Dataset loaded: {len(df)} rows.")
+    # Sentiment deciles for the heatmap (-1 where a column cannot be ranked)
+    for col in SENTIMENT_COLS:
+        if col in df.columns:
+            codes = pd.qcut(df[col], q=10, labels=False, duplicates='drop')
+            df[col + DECILE_SUFFIX] = codes.fillna(-1).astype(np.int8)
+    return df
+
+def _smallest_int(lo: int, hi: int):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return dtype
+    return np.int64
+
+def _compact_numeric(values: np.ndarray):
+    if values.dtype.kind in 'iu':
+        if not len(values):
+            return values
+        return values.astype(_smallest_int(int(values.min()), int(values.max())), copy=False)
+    finite = np.isfinite(values)
+    v = values[finite]
+    if not len(v):
+        return values.astype(np.float32)
+    if np.array_equal(v, np.round(v)):
+        # Integral (codes, SIC, flags): ints when complete, else float32 while exact
+        if finite.all():
+            return values.astype(_smallest_int(int(v.min()), int(v.max())))
+        return values.astype(np.float32) if np.abs(v).max() <= 2 ** 24 else values
+    if np.abs(v).max() > np.finfo(np.float32).max:
+        return values
+    narrow = values.astype(np.float32)
+    if np.all(np.abs(narrow[finite].astype(np.float64) - v) <= COMPACT_RTOL * np.abs(v)):
+        return narrow
+    return values
+
+def compact_frame(df: pd.DataFrame):
+    """The compact representation of a prepared frame (see COMPACT); compact input is returned as is."""
+    data = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(s):
+            data[col] = s.to_numpy() if pd.api.types.is_bool_dtype(s) else s.array
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            values = s.to_numpy()
+            # Day numbers only when lossless: no NaT and midnight timestamps
+            days = values.astype('datetime64[D]')
+            if col == DATE_COL and not np.isnat(values).any() and (days == values).all():
+                data[col] = days.astype(np.int64).astype(np.int32)
+            else:
+                data[col] = values
+        elif col == DATE_COL and pd.api.types.is_integer_dtype(s):
+            data[col] = s.to_numpy().astype(np.int32, copy=False) # already day numbers
+        elif pd.api.types.is_numeric_dtype(s):
+            data[col] = _compact_numeric(s.to_numpy())
+        else:
+            data[col] = pd.Categorical(s)
+    return pd.DataFrame(data, index=df.index, copy=False)
+
+def is_compact(df: pd.DataFrame):
+    return DATE_COL in df.columns and pd.api.types.is_integer_dtype(df[DATE_COL])
+
+def filing_dates(s: pd.Series):
+    """FILING_DATE values as datetimes, whether stored as timestamps or compact day numbers."""
+    if pd.api.types.is_integer_dtype(s):
+        return pd.to_datetime(s.astype(np.int64), unit='D')
+    return pd.to_datetime(s, errors='coerce')
+
+# --- Snapshot cache ---
+# The prepared frame is persisted as one .npy file per column so later starts can
+# memory-map it instead of re-parsing the CSV. Strings are dictionary-encoded
+# (codes + a categories array) because object arrays cannot be mapped, and come
+# back as pd.Categorical over the mapped codes; the codes are written at the
+# width pandas uses for the category count, so nothing is decoded or copied.
+# Booleans are stored as bool arrays.
+
+def _content_hash(file_path: str):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def csv_fingerprint(file_path: str):
+    """Content hash of the source CSV, memoized on (size, mtime) to skip rehashing."""
+    st = os.stat(file_path)
+    stat_key = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    index_path = os.path.join(SNAPSHOT_DIR, os.path.basename(file_path) + ".stat.json")
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+        if index.get("path") == file_path and index.get("stat") == stat_key:
+            return index["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = _content_hash(file_path)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump({"path": file_path, "stat": stat_key, "sha256": digest}, f)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"Snapshot index not written: {e}")
+    return digest
+
+def snapshot_path(file_path: str, fingerprint: str, compact: bool = False):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    mode = "c" if compact else ""
+    return os.path.join(SNAPSHOT_DIR, f"{name}-v{SNAPSHOT_VERSION}{mode}-{fingerprint[:16]}")
+
+def write_snapshot(df: pd.DataFrame, snap_dir: str, compact: bool = False):
+    """Writes df column by column into snap_dir (atomically, via a temp directory)."""
+    tmp_dir = f"{snap_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        entry = {"name": col, "file": f"c{i}.npy"}
+        if pd.api.types.is_datetime64_any_dtype(s):
+            entry["kind"] = "datetime"
+            np.save(os.path.join(tmp_dir, entry["file"]), s.to_numpy())
+        elif pd.api.types.is_bool_dtype(s):
+            entry["kind"] = "bool"
+            np.save(os.path.join(tmp_dir, entry["file"]), s.to_numpy(dtype=bool))
+        elif pd.api.types.is_numeric_dtype(s):
+            entry["kind"] = "numeric"
+            np.save(os.path.join(tmp_dir, entry["file"]), s.to_numpy())
+        else:
+            entry["kind"] = "category"
+            entry["categories"] = f"c{i}_cats.npy"
+            codes, uniques = pd.factorize(s.astype(object), sort=True)
+            # The width Categorical.from_codes picks itself (int8 below 127 categories, ...)
+            codes = codes.astype(_smallest_int(-1, len(uniques) + 1))
+            np.save(os.path.join(tmp_dir, entry["file"]), codes)
+            np.save(os.path.join(tmp_dir, entry["categories"]), np.asarray(uniques, dtype=str))
+        columns.append(entry)
+
+    with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+        json.dump({"version": SNAPSHOT_VERSION, "rows": len(df), "compact": compact, "columns": columns}, f)
+
+    try:
+        os.replace(tmp_dir, snap_dir)
+    except OSError:
+        # Another worker published the same snapshot first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def read_snapshot(snap_dir: str):
+    """Memory-maps a snapshot written by write_snapshot back into a DataFrame."""
+    with open(os.path.join(snap_dir, "meta.json")) as f:
+        meta = json.load(f)
+
+    data = {}
+    for entry in meta["columns"]:
+        # Copy-on-write mapping: pages are shared between workers until written
+        arr = np.load(os.path.join(snap_dir, entry["file"]), mmap_mode='c')
+        if entry["kind"] == "category":
+            # Stays dictionary-encoded, over the mapped codes
+            cats = np.load(os.path.join(snap_dir, entry["categories"]))
+            data[entry["name"]] = pd.Categorical.from_codes(arr, pd.Index(cats.astype(object)))
+        else:
+            data[entry["name"]] = arr
+    return pd.DataFrame(data, copy=False)
+
+def _prune_snapshots(file_path: str, keep: str):
+    name = os.path.splitext(os.path.basename(file_path))[0] + "-v"
+
+    def mode(entry):
+        # "3c-<fingerprint>" -> "c": full and compact snapshots are pruned separately
+        return entry[len(name):].split("-")[0].lstrip("0123456789")
+
+    for entry in os.listdir(SNAPSHOT_DIR):
+        full = os.path.join(SNAPSHOT_DIR, entry)
+        if (entry.startswith(name) and full != keep and os.path.isdir(full) and ".tmp-" not in entry
+                and mode(entry) == mode(os.path.basename(keep))):
+            shutil.rmtree(full, ignore_errors=True)
+
+def read_dataset(file_path: str = "final_with_CCTI.csv", use_snapshot: bool = True, compact: bool = None):
+    """
+    Returns the prepared dataset, served from a memory-mapped snapshot when
+    possible; compact (default CCTI_COMPACT) returns the compact representation.
+    """
+    file_path = resolve_path(file_path)
+    compact = COMPACT if compact is None else compact
+    if not use_snapshot:
+        df = prepare_frame(pd.read_csv(file_path))
+        return compact_frame(df) if compact else df
+
+    fingerprint = csv_fingerprint(file_path)
+    snap_dir = snapshot_path(file_path, fingerprint, compact)
+    if os.path.exists(os.path.join(snap_dir, "meta.json")):
+        try:
+            df = read_snapshot(snap_dir)
+            print(f"Loaded snapshot: {snap_dir}")
+            return df
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Snapshot unreadable, rebuilding: {e}")
+            shutil.rmtree(snap_dir, ignore_errors=True)
+
+    print(f"Loading dataset from: {file_path}")
+    df = prepare_frame(pd.read_csv(file_path))
+    if compact:
+        df = compact_frame(df)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        write_snapshot(df, snap_dir, compact)
+        _prune_snapshots(file_path, keep=snap_dir)
+        print(f"Snapshot written: {snap_dir}")
+    except OSError as e:
+        # Read-only deployments still work, they just pay the parse cost
+        print(f"Snapshot not written: {e}")
     return df
 
+def partition_path(file_path: str, fingerprint: str):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(PARTITION_DIR, f"{name}-p{PARTITION_VERSION}-{fingerprint[:16]}")
+
+def open_store(file_path: str):
+    """The partitioned store of a CSV, built on first use (streaming, never whole in memory)."""
+    file_path = resolve_path(file_path)
+    store_dir = partition_path(file_path, csv_fingerprint(file_path))
+    if os.path.exists(os.path.join(store_dir, "meta.json")):
+        try:
+            store = PartitionedStore(store_dir)
+            print(f"Opened partitioned store: {store_dir}")
+            return store
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Partitioned store unreadable, rebuilding: {e}")
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    build_store(file_path, store_dir)
+    # Older versions of the same source are no longer needed
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    for entry in os.listdir(PARTITION_DIR):
+        full = os.path.join(PARTITION_DIR, entry)
+        if entry.startswith(f"{name}-p") and full != store_dir and ".tmp-" not in entry:
+            shutil.rmtree(full, ignore_errors=True)
+    return PartitionedStore(store_dir)
+
+def build_dataset(file_path: str = "final_with_CCTI.csv"):
+    """Reads and indexes a dataset without publishing it."""
+    path = resolve_path(file_path)
+    version = source_version(path)
+    if STORAGE == "partitioned":
+        store = open_store(path)
+        return DatasetState(store.frame(), path, version, index=store, store=store)
+    df = read_dataset(path)
+    return DatasetState(df, path, version)
+
+def publish_dataset(state: DatasetState):
+    """Makes state the current dataset (a single reference swap)."""
+    global _state
+    _state = state
+    # Cache keys carry the version, clearing just frees the old entries early
+    result_cache.clear()
+
+def source_version(file_path: str):
+    # Same id build_dataset would assign; memoized on (size, mtime), so cheap to poll
+    return csv_fingerprint(resolve_path(file_path))[:16]
+
+def load_data(file_path: str = "final_with_CCTI.csv"):
+    state = _state
+    if state is not None:
+        return state.df
+    with _load_lock:
+        if _state is None:
+            publish_dataset(build_dataset(file_path))
+            print(f"Dataset loaded: {len(_state.df)} rows (version {_state.version}).")
+    return _state.df
+
+def unimputed_columns(state: DatasetState, columns: list):
+    """
+    The source CSV's values of numeric columns before median imputation,
+    aligned with state.df's rows (NaN where the source has none). None when
+    the file no longer matches the state's version (a reload is pending).
+    """
+    if source_version(state.path) != state.version:
+        return None
+    wanted = set(columns) | {'FILING_DATE'}
+    raw = pd.read_csv(state.path, usecols=lambda c: c in wanted)
+    if state.store is not None:
+        if ROW_COL not in state.store.columns:
+            return None
+        order = np.asarray(state.store.columns[ROW_COL])
+    elif 'FILING_DATE' in raw.columns:
+        # Same stable date sort as parse_frame
+        order = np.argsort(pd.to_datetime(raw['FILING_DATE']).to_numpy(), kind='stable')
+    else:
+        order = np.arange(len(raw))
+    return {c: pd.to_numeric(raw[c], errors='coerce').to_numpy(dtype=float)[order]
+            for c in columns if c in raw.columns}
+
+def current_dataset():
+    if _state is None:
+        load_data()
+    return _state
+
+def dataset_version():
+    return current_dataset().version
+
 def get_unique_values(col_name: str):
     df = load_data()
     if col_name not in df.columns:
         return []
     return sorted(df[col_name].dropna().unique().tolist())
 
+def get_data_path():
+    return _state.path if _state is not None else None
+
+def get_filter_index():
+    return current_dataset().index
+
+def get_cube():
+    return current_dataset().cube
+
+def kpi_summary(
+    start_date: str = None,
+    end_date: str = None,
+    sics: list = None,
+    forms: list = None,
+    market_conditions: list = None,
+    by_month: bool = False
+):
+    """
+    Count, mean, variance and std of the cube measures for a filter, summed
+    from cube cells (plus rows of partially covered boundary months).
+    """
+    state = current_dataset()
+    cube = state.cube
+    filters = dict(
+        start_date=start_date, end_date=end_date,
+        sics=sics, forms=forms, market_conditions=market_conditions,
+    )
+    totals = kpi_totals(cube, state.df, state.index, **filters)
+    summary = {"count": totals["count"], "measures": describe_totals(totals, cube.measures)}
+    if by_month:
+        monthly = kpi_totals(cube, state.df, state.index, by_month=True, **filters)
+        summary["by_month"] = [
+            {"ym": ym, "count": t["count"], "measures": describe_totals(t, cube.measures)}
+            for ym, t in monthly.items()
+        ]
+    return summary
+
 def filter_data(
     start_date: str = None, 
     end_date: str = None, 
@@ -79,23 +490,152 @@ def filter_data(
     forms: list = None,
     market_conditions: list = None
 ):
-    df = load_data()
-    mask = pd.Series(True, index=df.index)
-    
-    if start_date:
-        mask &= (df['FILING_DATE'] >= pd.to_datetime(start_date))
-    if end_date:
-        mask &= (df['FILING_DATE'] <= pd.to_datetime(end_date))
-    
-    if sics:
-        mask &= (df['SIC'].isin(sics))
-        
-    if forms:
-        mask &= (df['FORM_TYPE'].isin(forms))
-        
-    if market_conditions and 'MarketCondition' in df.columns:
-        # 0=Expansion, 1=Recession. Input might be strings or ints.
-        # Let's handle generic matching if frontend sends [0, 1]
-        mask &= (df['MarketCondition'].isin(market_conditions))
-
-    return df[mask]
+    """
+    Returns the matching rows. The frame is shared through the result cache,
+    so callers must treat it as read-only (derive new frames/series instead).
+    """
+    state = current_dataset()
+    filters = dict(
+        start_date=start_date,
+        end_date=end_date,
+        sics=sics,
+        forms=forms,
+        market_conditions=market_conditions,
+    )
+    # Binary search on filing date + code lookups, see filter_index.py
+    return result_cache.get_or_compute(
+        ("rows", state.version, filter_key(filters)),
+        lambda: state.index.select(state.df, **filters)
+    )
+
+def filtered_scan(filters: dict):
+    """
+    In partitioned mode, scan(fn, columns) streaming the filter's rows chunk
+    by chunk (fn gets {column: values}, categories as codes) and returning
+    the partial results; None in memory mode, where callers use filter_data.
+    """
+    store = current_dataset().store
+    if store is None:
+        return None
+    return lambda fn, columns: store.scan(fn, columns, **filters)
+
+def scan_frame(values: dict):
+    """
+    A DataFrame of values gathered by a scan (a sample or a column subset,
+    never the whole store), category codes decoded.
+    """
+    return _decoded(current_dataset().store, values)
+
+def _decoded(store, values: dict):
+    categories = store.categories
+    return pd.DataFrame({
+        name: pd.Categorical.from_codes(v, categories[name]) if name in categories else v
+        for name, v in values.items()
+    })
+
+def filtered_columns(filters: dict, columns: list, state: DatasetState = None):
+    """
+    The filter's rows of state (the current dataset by default), only the
+    given columns. Partitioned mode gathers them chunk by chunk from the
+    store (rows in the in-memory frame's order), so the other columns are
+    never read.
+    """
+    state = state or current_dataset()
+    if state.store is None:
+        df = state.index.select(state.df, **filters)
+        return df[[c for c in columns if c in df.columns]]
+    store = state.store
+    columns = [c for c in dict.fromkeys(columns) if c in store.columns]
+    order_cols = [c for c in ('FILING_DATE', ROW_COL) if c in store.columns]
+    parts = store.scan(lambda chunk: chunk, columns + order_cols, **filters)
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    values = {c: np.concatenate([p[c] for p in parts]) for c in columns + order_cols}
+    if len(order_cols) == 2:
+        # Same order as the date-sorted in-memory frame: (date, source row)
+        order = np.lexsort((values[ROW_COL], values['FILING_DATE']))
+        values = {c: v[order] for c, v in values.items()}
+    return _decoded(store, {c: values[c] for c in columns})
+
+def result_key(name: str, filters: dict, version: str = None, **params):
+    version = version or dataset_version()
+    return (name, version, filter_key(filters), tuple(sorted(params.items())))
+
+def cached_result(name: str, filters: dict, compute, **params):
+    """Caches a derived (endpoint) result under the canonical filter hash plus params."""
+    return result_cache.get_or_compute(result_key(name, filters, **params), compute)
+
+def _mapped(values):
+    # True when the array's buffer is a file mapping (shared page cache, not private memory)
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+def _array_bytes(obj):
+    # Bytes of the arrays an object owns (views are counted where they are owned)
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes if obj.base is None else 0
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, dict):
+        return sum(_array_bytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_array_bytes(v) for v in obj)
+    return 0
+
+def _process_memory():
+    # VmRSS / VmHWM from /proc (Linux); ru_maxrss elsewhere
+    out = {"rss_bytes": None, "peak_rss_bytes": None}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    field = "rss_bytes" if key == "VmRSS" else "peak_rss_bytes"
+                    out[field] = int(value.split()[0]) * 1024
+    except OSError:
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            out["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            pass
+    return out
+
+def memory_report(state: DatasetState = None, derived: dict = None):
+    """
+    Per-column bytes of the loaded frame (and whether they are file-mapped),
+    the sizes of the structures derived from it (filter index, KPI cube, plus
+    any objects passed in derived) and the process RSS.
+    """
+    state = state or current_dataset()
+    df = state.df
+    columns = []
+    for col in df.columns:
+        s = df[col]
+        values = s.array.codes if isinstance(s.dtype, pd.CategoricalDtype) else s.to_numpy()
+        columns.append({
+            "name": col,
+            "dtype": str(s.dtype),
+            "bytes": int(s.memory_usage(index=False, deep=True)),
+            "mapped": _mapped(values),
+        })
+    frame_bytes = sum(c["bytes"] for c in columns)
+    sizes = {"filter_index": _array_bytes(vars(state.index)), "kpi_cube": _array_bytes(vars(state.cube))}
+    for name, obj in (derived or {}).items():
+        sizes[name] = _array_bytes(vars(obj)) if obj is not None else 0
+    return {
+        "version": state.version,
+        "compact": is_compact(df),
+        "storage": "partitioned" if state.store is not None else "memory",
+        "rows": len(df),
+        "frame_bytes": frame_bytes,
+        "mapped_bytes": sum(c["bytes"] for c in columns if c["mapped"]),
+        "bytes_per_row": frame_bytes / len(df) if len(df) else 0.0,
+        "columns": columns,
+        "derived_bytes": sizes,
+        "cache_bytes": result_cache.stats()["bytes"],
+        **_process_memory(),
+    }
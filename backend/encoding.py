@@ -0,0 +1,159 @@
+import gzip
+import json
+import os
+import struct
+
+import numpy as np
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+# Response encodings for the chart endpoints (content negotiation).
+#
+# The cached results keep the original layout ("records": lists of objects),
+# which stays the default. Clients opt into a leaner representation with
+# ?format= or the Accept header:
+#
+#   records  application/json                         unchanged payload
+#   columns  application/vnd.ccti.columns+json        every list of objects becomes
+#                                                     {field: [values...]} (one key per field,
+#                                                     not per point)
+#   binary   application/octet-stream                 columns, numeric arrays as raw
+#                                                     little-endian typed arrays (see encode_binary)
+#
+# Any of them is gzip-compressed when the client sends Accept-Encoding: gzip
+# and the body is at least COMPRESS_MIN_BYTES. Streamed (NDJSON) responses are
+# never compressed here, a buffering compressor would hold back their lines.
+
+FORMATS = {
+    "records": "application/json",
+    "columns": "application/vnd.ccti.columns+json",
+    "binary": "application/octet-stream",
+}
+BINARY_MAGIC = b"CCTI"
+BINARY_VERSION = 1
+COMPRESS_MIN_BYTES = int(os.environ.get("CCTI_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.environ.get("CCTI_COMPRESS_LEVEL", "5"))
+
+def requested_format(request: Request):
+    """The format asked for by ?format= (wins) or the Accept header; records by default."""
+    fmt = request.query_params.get("format")
+    if fmt:
+        return fmt
+    accept = request.headers.get("accept", "")
+    for name in ("columns", "binary"):
+        if FORMATS[name] in accept:
+            return name
+    return "records"
+
+def wants_gzip(request: Request):
+    encodings = [e.split(";")[0].strip() for e in request.headers.get("accept-encoding", "").split(",")]
+    return "gzip" in encodings
+
+def representation(request: Request):
+    # ETag suffix: each encoding of a result is a different representation
+    parts = [requested_format(request)]
+    if wants_gzip(request):
+        parts.append("gzip")
+    return "" if parts == ["records"] else "+".join(parts)
+
+def to_columns(value):
+    """Replaces every list of objects with an object of lists (recursively)."""
+    if isinstance(value, dict):
+        return {k: to_columns(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(v, dict) for v in value):
+            fields = list(dict.fromkeys(k for v in value for k in v))
+            return {f: to_columns([v.get(f) for v in value]) for f in fields}
+        return [to_columns(v) for v in value]
+    return value
+
+def _typed(value: list):
+    # Numeric (possibly nested) lists as arrays; strings, None and ragged lists stay JSON
+    if not value:
+        return None
+    try:
+        arr = np.asarray(value)
+    except ValueError:
+        return None
+    if arr.dtype.kind == 'f':
+        return arr.astype('<f8')
+    if arr.dtype.kind in 'iu':
+        if len(arr) and (arr.min() < -2 ** 31 or arr.max() >= 2 ** 31):
+            return arr.astype('<f8')
+        return arr.astype('<i4')
+    return None
+
+def encode_binary(result):
+    """
+    Binary layout: b"CCTI", uint32 header length, a JSON header padded to a
+    multiple of 8 bytes, then the data section with every array starting on
+    an 8-byte boundary (so a client can view them in place, e.g.
+    new Float64Array(buffer, 8 + headerLength + offset, length)). The header
+    is {"version", "body", "arrays"}: body is the columnar result with every
+    numeric array replaced by {"$array": i}, and arrays[i] gives its dtype
+    (float64 or int32, little-endian), shape, offset in the data section and
+    byteLength.
+    """
+    arrays = []
+
+    def extract(value):
+        if isinstance(value, dict):
+            return {k: extract(v) for k, v in value.items()}
+        if isinstance(value, list):
+            arr = _typed(value)
+            if arr is None:
+                return [extract(v) for v in value]
+            arrays.append(arr)
+            return {"$array": len(arrays) - 1}
+        return value
+
+    body = extract(to_columns(result))
+    specs, offset = [], 0
+    for arr in arrays:
+        specs.append({"dtype": "float64" if arr.dtype.kind == 'f' else "int32",
+                      "shape": list(arr.shape), "offset": offset, "byteLength": arr.nbytes})
+        offset += -(-arr.nbytes // 8) * 8
+    raw = json.dumps({"version": BINARY_VERSION, "body": body, "arrays": specs},
+                     separators=(",", ":")).encode()
+    raw += b" " * (-len(raw) % 8) # 8 + header is then 8-aligned too
+    parts = [BINARY_MAGIC, struct.pack("<I", len(raw)), raw]
+    for arr in arrays:
+        data = arr.tobytes()
+        parts.append(data + b"\0" * (-len(data) % 8))
+    return b"".join(parts)
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _render_json(content):
+    # Same output as FastAPI's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":"), default=_json_default).encode("utf-8")
+
+def encode_result(request: Request, result):
+    """
+    The response for a chart result in the negotiated format. The plain
+    records request returns the result itself, so FastAPI renders it as before.
+    """
+    fmt = requested_format(request)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {list(FORMATS)}")
+    compress = wants_gzip(request)
+    if fmt == "records" and not compress:
+        return result
+
+    if fmt == "binary":
+        body = encode_binary(result)
+    elif fmt == "columns":
+        body = _render_json(to_columns(result))
+    else:
+        body = _render_json(result)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if compress and len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type=FORMATS[fmt], headers=headers)
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+# Execution layer for CPU-heavy endpoints.
+#
+# Work runs on a bounded pool instead of uvicorn's unbounded default thread
+# pool: "process" (default) sidesteps the GIL, and every worker maps the same
+# read-only dataset snapshot (category codes included, and the filter index
+# reuses them); the KPI cube is never built there and the per-worker result
+# cache is small. "thread" keeps everything in-process.
+# Each endpoint has a concurrency limit and a queue depth. Requests beyond
+# the queue get an immediate 429, a saturated pool answers 503, and work whose
+# client has gone away is cancelled (queued) or abandoned (running).
+#
+# Configuration (environment):
+#   CCTI_EXECUTOR=process|thread   CCTI_WORKERS=<n>   CCTI_MAX_PENDING=<n>
+#   CCTI_WORKER_CACHE_MB=<n>       result cache budget of each process worker
+#   CCTI_LIMIT_<ENDPOINT>=<concurrency>:<queue>   e.g. CCTI_LIMIT_SCATTER=2:8
+#                                  (DASHBOARD admits whole /api/dashboard requests)
+
+DEFAULT_LIMITS = {
+    "scatter": (4, 16),
+    "trend": (4, 16),
+    "heatmap": (4, 16),
+    "ccti_distribution": (8, 32),
+    "dashboard": (4, 16),
+}
+FALLBACK_LIMIT = (4, 16)
+DISCONNECT_POLL = 0.1 # seconds
+WORKER_CACHE_BYTES = int(float(os.environ.get("CCTI_WORKER_CACHE_MB", "16")) * 1024 * 1024)
+
+class ClientDisconnected(Exception):
+    pass
+
+def _limit_from_env(name: str):
+    raw = os.environ.get(f"CCTI_LIMIT_{name.upper()}")
+    if not raw:
+        return DEFAULT_LIMITS.get(name, FALLBACK_LIMIT)
+    concurrency, _, queue = raw.partition(":")
+    return int(concurrency), int(queue or 0)
+
+def _init_worker(data_path, version=None):
+    # Runs once per pool process: map the snapshot (cheap, pages are shared)
+    from .cache import result_cache
+    from .data_manager import load_data, get_data_path, dataset_version, build_dataset, publish_dataset
+    # Results are cached by the API process; a worker only reuses row sets
+    # within its own tasks, so its cache is kept small
+    result_cache.clear()
+    result_cache.max_bytes = WORKER_CACHE_BYTES
+    if version and get_data_path() is not None and dataset_version() != version:
+        # Forked before the reload was published: drop the inherited dataset
+        publish_dataset(build_dataset(data_path))
+    elif data_path:
+        load_data(data_path)
+    else:
+        load_data()
+
+def _worker_version():
+    # Runs after the initializer, so the worker has its dataset loaded
+    from .data_manager import dataset_version
+    return dataset_version()
+
+class EndpointLimiter:
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._sem = None
+
+    async def acquire(self, request=None):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        # Admission is decided on counters that update synchronously, so a
+        # burst arriving within one loop tick is limited too
+        if self.active + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent '{self.name}' requests, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.waiting += 1
+        acquiring = asyncio.ensure_future(self._sem.acquire())
+        try:
+            while True:
+                done, _ = await asyncio.wait({acquiring}, timeout=DISCONNECT_POLL)
+                if done:
+                    break
+                if request is not None and await request.is_disconnected():
+                    if not acquiring.cancel():
+                        # Acquired in the meantime: hand the slot straight back
+                        self._sem.release()
+                    raise ClientDisconnected()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._sem.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+class ExecutionLayer:
+    def __init__(self, mode: str = None, workers: int = None, max_pending: int = None):
+        self.mode = mode or os.environ.get("CCTI_EXECUTOR", "process")
+        self.workers = workers or int(os.environ.get("CCTI_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.max_pending = max_pending or int(os.environ.get("CCTI_MAX_PENDING", "64"))
+        self.pending = 0
+        self.cancelled = 0
+        self._pool = None
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _new_pool(self, data_path: str = None, version: str = None):
+        if self.mode == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(data_path, version)
+            )
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="heavy")
+
+    def start(self, data_path: str = None):
+        if self._pool is not None:
+            return
+        self._pool = self._new_pool(data_path)
+        print(f"Execution layer: {self.workers} {self.mode} workers")
+
+    def prepare(self, data_path: str, version: str):
+        """
+        Workers for a reloaded dataset, started and loaded before it is
+        published (so no request is answered by a half-started pool). Returns
+        the pool for swap(), or None when there is nothing to replace.
+        """
+        if self.mode != "process" or self._pool is None:
+            return None # threads share the published dataset
+        pool = self._new_pool(data_path, version)
+        try:
+            # One call per worker: each blocks until that worker's initializer is done
+            loaded = {f.result() for f in [pool.submit(_worker_version) for _ in range(self.workers)]}
+        except Exception:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        if loaded != {version}:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise RuntimeError(f"New workers loaded {sorted(loaded)}, expected {version}")
+        return pool
+
+    def swap(self, pool):
+        """
+        Installs a prepared pool. The old one is shut down without cancelling,
+        so its queued and running tasks finish on the old version.
+        """
+        if pool is None:
+            return
+        old, self._pool = self._pool, pool
+        old.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def limiter(self, name: str):
+        with self._lock:
+            if name not in self._limiters:
+                self._limiters[name] = EndpointLimiter(name, *_limit_from_env(name))
+            return self._limiters[name]
+
+    async def run(self, name: str, fn, *args, request=None):
+        """Runs fn(*args) on the pool under the endpoint's limits."""
+        if self._pool is None:
+            self.start()
+        limiter = self.limiter(name)
+        await limiter.acquire(request)
+        try:
+            if self.pending >= self.max_pending:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Server busy, retry shortly",
+                    headers={"Retry-After": "2"}
+                )
+            self.pending += 1
+            try:
+                future = self._pool.submit(fn, *args)
+                waiter = asyncio.wrap_future(future)
+                while True:
+                    done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL)
+                    if done:
+                        return waiter.result()
+                    if request is not None and await request.is_disconnected():
+                        # Queued work is dropped; running work finishes unobserved
+                        future.cancel()
+                        self.cancelled += 1
+                        raise ClientDisconnected()
+            finally:
+                self.pending -= 1
+        finally:
+            limiter.release()
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "cancelled": self.cancelled,
+            "endpoints": {name: lim.stats() for name, lim in self._limiters.items()},
+        }
+
+executor = ExecutionLayer()
@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+
+# Columns that the dashboard filters on with set membership (FilterRequest fields)
+SET_FILTER_COLS = {
+    'sics': 'SIC',
+    'forms': 'FORM_TYPE',
+    'market_conditions': 'MarketCondition',
+}
+
+class FilterIndex:
+    """
+    Filter structure built once per dataset load.
+
+    Rows are addressed in FILING_DATE order so a date range is a binary-search
+    slice, and every set-filter column is dictionary-encoded into a small int
+    code array so `isin` becomes a lookup into a small boolean table over the
+    slice. Categorical columns reuse their own codes, which for a mapped
+    snapshot means the index adds no per-row memory of its own.
+    When the frame itself is stored in date order (the snapshot is), date-only
+    selections are returned as zero-copy slices. Dates may be datetime64 or
+    compact int day numbers (see data_manager.COMPACT).
+    """
+
+    def __init__(self, df: pd.DataFrame, date_col: str = 'FILING_DATE'):
+        self.n_rows = len(df)
+        self.has_dates = date_col in df.columns
+
+        if self.has_dates:
+            dates = df[date_col].to_numpy()
+            # Rows without a date sort last (NaT, as in the snapshot) and match no date bound
+            missing = np.isnat(dates) if dates.dtype.kind == 'M' else np.zeros(self.n_rows, dtype=bool)
+            self.n_dated = self.n_rows - int(missing.sum())
+            if not missing[:self.n_dated].any() and pd.Index(dates[:self.n_dated]).is_monotonic_increasing:
+                self.order = None
+                self.dates = dates
+            else:
+                self.order = np.argsort(dates, kind='stable')
+                self.dates = dates[self.order]
+        else:
+            self.order = None
+            self.dates = None
+            self.n_dated = self.n_rows
+
+        self.codes = {}
+        self.values = {}
+        for key, col in SET_FILTER_COLS.items():
+            if col not in df.columns:
+                continue
+            s = df[col]
+            if isinstance(s.dtype, pd.CategoricalDtype) and self.order is None:
+                # Snapshot strings: the (file-mapped) category codes are the index as is
+                self.codes[key] = s.array.codes
+                self.values[key] = pd.Index(s.cat.categories)
+                continue
+            codes, uniques = pd.factorize(s, sort=True)
+            codes = codes.astype(np.int8 if len(uniques) < 127 else np.int16 if len(uniques) < 32767 else np.int32)
+            self.codes[key] = codes if self.order is None else codes[self.order]
+            self.values[key] = pd.Index(uniques)
+
+    def _date_bounds(self, start_date, end_date):
+        lo, hi = 0, self.n_rows
+        if self.dates is None:
+            return lo, hi
+        if start_date or end_date:
+            hi = self.n_dated
+        if start_date:
+            lo = int(np.searchsorted(self.dates, self._date_key(start_date), side='left'))
+        if end_date:
+            hi = int(np.searchsorted(self.dates, self._date_key(end_date), side='right'))
+        return lo, max(lo, hi)
+
+    def _date_key(self, value):
+        ts = np.datetime64(pd.to_datetime(value))
+        if self.dates.dtype.kind in 'iu':
+            # Compact frames store day numbers; a bound covers its whole day
+            return ts.astype('datetime64[D]').astype(np.int64)
+        return ts.astype(self.dates.dtype)
+
+    def _set_mask(self, key, selected, lo, hi):
+        # Unknown values get code -1, which never matches a row
+        lookup = np.zeros(len(self.values[key]) + 1, dtype=bool)
+        found = self.values[key].get_indexer(list(selected))
+        lookup[found[found >= 0]] = True
+        # Slot -1 (the extra last entry) stays False for missing values in the column
+        return lookup[self.codes[key][lo:hi]]
+
+    def positions(self, start_date=None, end_date=None, sics=None, forms=None, market_conditions=None):
+        """Returns (lo, hi, mask) in date order; mask is None when every row in lo:hi matches."""
+        lo, hi = self._date_bounds(start_date, end_date)
+        mask = None
+        for key, selected in (('sics', sics), ('forms', forms), ('market_conditions', market_conditions)):
+            if not selected or key not in self.codes:
+                continue
+            m = self._set_mask(key, selected, lo, hi)
+            mask = m if mask is None else (mask & m)
+        return lo, hi, mask
+
+    def row_positions(self, **filters):
+        """Integer row positions into the indexed frame (ascending date order)."""
+        lo, hi, mask = self.positions(**filters)
+        pos = np.arange(lo, hi) if self.order is None else self.order[lo:hi]
+        return pos if mask is None else pos[mask]
+
+    def select(self, df: pd.DataFrame, **filters):
+        lo, hi, mask = self.positions(**filters)
+        if self.order is None:
+            # Contiguous date slice: a view on the stored frame, no copy
+            view = df.iloc[lo:hi]
+            return view if mask is None else view[mask]
+        pos = self.order[lo:hi]
+        return df.iloc[pos if mask is None else pos[mask]]
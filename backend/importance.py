@@ -0,0 +1,187 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+# Feature importance for an arbitrary filtered subset, computed in the
+# background. Queued and running jobs live in the service's own map, which
+# nothing evicts or clears; a finished (or failed) job moves into an LRU store
+# (the shared result cache in the backend), so repeat requests return the
+# result and a reload drops stale ones with the cache. Job ids carry the
+# dataset version and the filter hash.
+#
+#   impurity    - the forest's mean decrease in impurity (available after the fit)
+#   permutation - drop in held-out R^2 when a feature is shuffled; repeats run
+#                 in parallel and partial means are published as they finish
+IMPORTANCE_FEATURES = [
+    'CCTI', 'CCTI_sq', 'Momentum_12_1', 'Vol_30d', 'BM_w', 'Size_w',
+    'Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining'
+]
+IMPORTANCE_TARGET = 'ExcessRet'
+IMPORTANCE_METHODS = ('impurity', 'permutation')
+EVAL_FRACTION = 0.25 # held-out share used for permutation scoring
+MAX_EVAL_ROWS = 20000
+JOB_NBYTES = 64 * 1024 # budget charged per job in the store
+
+def importance_job_id(version: str, filter_hash: str, method: str, n_repeats: int):
+    return f"{method}-{n_repeats}-{version}-{filter_hash[:16]}"
+
+def _r2(y, pred):
+    ss_tot = ((y - y.mean()) ** 2).sum()
+    return 1 - ((y - pred) ** 2).sum() / ss_tot if ss_tot > 0 else 0.0
+
+def _permutation_repeat(model, X, y, baseline, seed):
+    # One repeat: shuffle each column in turn (on a private copy) and rescore
+    rng = np.random.default_rng(seed)
+    X = X.copy()
+    drops = np.empty(X.shape[1])
+    for j in range(X.shape[1]):
+        original = X[:, j].copy()
+        X[:, j] = original[rng.permutation(len(X))]
+        drops[j] = baseline - _r2(y, model.predict(X))
+        X[:, j] = original
+    return drops
+
+class ImportanceJob:
+    def __init__(self, job_id: str, method: str, n_repeats: int, features: list):
+        self.job_id = job_id
+        self.method = method
+        self.n_repeats = n_repeats
+        self.features = features
+        self.status = "queued"
+        self.progress = 0.0
+        self.rows = None
+        self.impurity = None
+        self.permutation = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def update(self, **fields):
+        with self._lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+
+    def to_dict(self):
+        with self._lock:
+            result = {}
+            if self.impurity is not None:
+                result["impurity"] = [
+                    {"feature": f, "importance": float(v)} for f, v in zip(self.features, self.impurity)
+                ]
+            if self.permutation is not None:
+                result["permutation"] = self.permutation
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "progress": self.progress,
+                "method": self.method,
+                "n_repeats": self.n_repeats,
+                "rows": self.rows,
+                "result": result,
+                "error": self.error,
+                "elapsed": (self.finished or time.time()) - self.created,
+            }
+
+class ImportanceService:
+    def __init__(self, store, max_jobs: int = None, threads: int = None):
+        self.store = store
+        self.threads = threads or int(os.environ.get("CCTI_IMPORTANCE_THREADS", str(os.cpu_count() or 1)))
+        self._jobs = ThreadPoolExecutor(
+            max_workers=max_jobs or int(os.environ.get("CCTI_IMPORTANCE_JOBS", "1")),
+            thread_name_prefix="importance"
+        )
+        self._lock = threading.Lock()
+        self._active = {} # job_id -> queued or running job
+
+    def _find(self, job_id: str):
+        job = self._active.get(job_id)
+        return job if job is not None else self.store.get(("importance", job_id))
+
+    def get(self, job_id: str):
+        job = self._find(job_id)
+        return job.to_dict() if job is not None else None
+
+    def submit(self, job_id: str, frame_fn, method: str = 'permutation', n_repeats: int = 5,
+               features: list = None):
+        """
+        Starts (or joins) the job for job_id; frame_fn returns the filtered rows
+        and is only called on the background thread.
+        """
+        with self._lock:
+            job = self._find(job_id)
+            if job is None or job.status == "failed":
+                job = ImportanceJob(job_id, method, n_repeats, list(features or IMPORTANCE_FEATURES))
+                self._active[job_id] = job
+                self._jobs.submit(self._run, job, frame_fn)
+        return job.to_dict()
+
+    def _finish(self, job: ImportanceJob):
+        # Into the store before leaving the map, so get() always finds the job
+        with self._lock:
+            self.store.put(("importance", job.job_id), job, nbytes=JOB_NBYTES)
+            self._active.pop(job.job_id, None)
+
+    def _run(self, job: ImportanceJob, frame_fn):
+        try:
+            job.update(status="running")
+            df = frame_fn()
+            cols = [c for c in job.features if c in df.columns]
+            data = df[cols + [IMPORTANCE_TARGET]].dropna()
+            if len(data) < 20:
+                raise ValueError(f"Not enough rows to fit a model ({len(data)})")
+            job.update(features=cols, rows=len(data))
+
+            X = data[cols].to_numpy(dtype=float)
+            y = data[IMPORTANCE_TARGET].to_numpy(dtype=float)
+            steps = 1 + (job.n_repeats if job.method == 'permutation' else 0)
+
+            # Permutation scores need rows the forest has not seen
+            rng = np.random.default_rng(42)
+            if job.method == 'permutation':
+                order = rng.permutation(len(X))
+                n_eval = min(MAX_EVAL_ROWS, max(int(len(X) * EVAL_FRACTION), 1))
+                eval_idx, train_idx = order[:n_eval], order[n_eval:]
+            else:
+                train_idx = np.arange(len(X))
+
+            rf = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=-1)
+            rf.fit(X[train_idx], y[train_idx])
+            job.update(impurity=rf.feature_importances_, progress=1 / steps)
+
+            if job.method == 'permutation':
+                X_eval, y_eval = X[eval_idx], y[eval_idx]
+                baseline = _r2(y_eval, rf.predict(X_eval))
+                drops = []
+                # Tree prediction releases the GIL, so repeats run in parallel threads
+                with ThreadPoolExecutor(max_workers=min(self.threads, job.n_repeats)) as pool:
+                    futures = [
+                        pool.submit(_permutation_repeat, rf, X_eval, y_eval, baseline, seed)
+                        for seed in range(job.n_repeats)
+                    ]
+                    for future in as_completed(futures):
+                        drops.append(future.result())
+                        done = np.array(drops)
+                        job.update(
+                            progress=(1 + len(drops)) / steps,
+                            permutation={
+                                "baseline_r2": float(baseline),
+                                "repeats_done": len(drops),
+                                "features": [
+                                    {"feature": f, "mean": float(m), "std": float(s)}
+                                    for f, m, s in zip(cols, done.mean(axis=0), done.std(axis=0))
+                                ],
+                            }
+                        )
+            job.update(status="done", progress=1.0, finished=time.time())
+        except Exception as e:
+            print(f"Feature importance job {job.job_id} failed: {e}")
+            job.update(status="failed", error=str(e), finished=time.time())
+        self._finish(job)
+
+    def shutdown(self):
+        self._jobs.shutdown(wait=False, cancel_futures=True)
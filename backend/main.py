@@ -1,15 +1,43 @@
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.responses import StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
+import asyncio
+from typing import Dict, List, Optional
+import os
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
+import json
 
-from .data_manager import load_data, filter_data, get_unique_values
-from .ml_engine import predict_excess_return, get_feature_importance, initialize_model
+from .data_manager import (
+    load_data, get_unique_values, get_data_path,
+    cached_result, result_key, kpi_summary, dataset_version, current_dataset, SENTIMENT_COLS,
+    filing_dates, memory_report, filtered_columns
+)
+from .cache import result_cache, filter_key, request_key
+from .trend import TREND_MODES
+from .charts import metrics_from_kpis
+from .executor import executor, ClientDisconnected
+from .reloader import reloader
+from . import tasks
+from starlette.concurrency import run_in_threadpool
+from .importance import (
+    ImportanceService, IMPORTANCE_METHODS, IMPORTANCE_FEATURES, IMPORTANCE_TARGET, importance_job_id
+)
+from .regression import run_regression, built_regression_cube, SPECS, COV_TYPES, MAX_BOOTSTRAP
+from .backtest import latest_results
+from .encoding import encode_result, representation, requested_format, to_columns
+from .ml_engine import (
+    predict_excess_return, get_feature_importance, initialize_model,
+    predict_batch, feature_matrix, current_model, INPUT_COLS
+)
 
 app = FastAPI(title="CCTI Dashboard API")
 
+# Background feature-importance jobs, kept in the shared result cache
+importance_service = ImportanceService(result_cache)
+
 # Allow CORS for React Frontend (usually runs on port 5173 for Vite)
 origins = [
     "http://localhost:5173",
@@ -22,13 +50,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Responses that depend only on the request and the dataset version (the
+# model is trained from the dataset, so it is covered too); their ETag is the
+# version plus a hash of the request
+ETAG_PATHS = {
+    "/api/init_filters", "/api/metrics", "/api/kpis", "/api/dashboard",
+    "/api/feature_importance", "/api/predict", "/api/predict/batch", "/api/regression",
+}
+
+def _etag_matches(header: str, etag: str):
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+@app.middleware("http")
+async def dataset_etag(request: Request, call_next):
+    path = request.url.path
+    if path not in ETAG_PATHS and not path.startswith("/api/charts/"):
+        return await call_next(request)
+    # The tag covers the request itself (filters, parameters) and the encoding:
+    # columnar/binary/gzip are separate representations (see encoding.py)
+    body = await request.body() if request.method == "POST" else b""
+    key = request_key(request.method, path, list(request.query_params.multi_items()), body)[:16]
+    rep = representation(request)
+    version = dataset_version()
+    etag = f'"{version}-{key}-{rep}"' if rep else f'"{version}-{key}"'
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        # Client already has this version's answer to the same request
+        return Response(status_code=304, headers={"ETag": etag})
+    response = await call_next(request)
+    # A reload that landed mid-request may have produced either version: no tag then
+    if response.status_code == 200 and dataset_version() == version:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
 # Initialize Logic on Startup
 @app.on_event("startup")
 async def startup_event():
     load_data()
     initialize_model()
+    # Heavy chart work runs on a bounded pool (see executor.py)
+    executor.start(get_data_path())
+    current_dataset().cube # lazy so pool workers skip it; built here before the first request
+    reloader.watch()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    reloader.shutdown()
+    executor.shutdown()
+    importance_service.shutdown()
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening any more; 499 just keeps the access log honest
+    return Response(status_code=499)
 
 # --- Schemas ---
 class FilterRequest(BaseModel):
@@ -46,144 +124,406 @@ class PredictionRequest(BaseModel):
     Size_w: float
     Negative: float
     Positive: float
+    filters: Optional[FilterRequest] = None # restricts the similar filings
+
+class BatchPredictionRequest(BaseModel):
+    columns: Dict[str, List[float]] # feature name -> one value per row
+    neighbors: bool = False
+    n_neighbors: int = 5
+    filters: Optional[FilterRequest] = None
+
+MAX_BATCH_ROWS = int(os.environ.get("CCTI_MAX_BATCH_ROWS", "1000000"))
+MAX_NEIGHBOR_ROWS = int(os.environ.get("CCTI_MAX_NEIGHBOR_ROWS", "10000"))
+BINARY_TYPE = "application/octet-stream"
 
 # --- Routes ---
 
 @app.get("/api/init_filters")
 def get_init_filters():
     df = load_data()
+    bounds = filing_dates(pd.Series([df['FILING_DATE'].min(), df['FILING_DATE'].max()]))
     return {
-        "min_date": df['FILING_DATE'].min().strftime('%Y-%m-%d'),
-        "max_date": df['FILING_DATE'].max().strftime('%Y-%m-%d'),
+        "min_date": bounds.iloc[0].strftime('%Y-%m-%d'),
+        "max_date": bounds.iloc[1].strftime('%Y-%m-%d'),
         "sics": get_unique_values('SIC'),
         "forms": get_unique_values('FORM_TYPE'),
         "market_conditions": [0, 1] if 'MarketCondition' in df.columns else []
     }
 
+# Results are cached per canonical filter (see cache.py), so one dashboard
+# refresh and every other user with the same filters share a single computation.
+
 @app.post("/api/metrics")
 def get_metrics(filters: FilterRequest):
-    df_f = filter_data(
-        filters.start_date, filters.end_date, 
-        filters.sics, filters.forms, filters.market_conditions
+    # Answered from the KPI cube, no row scan
+    return cached_result(
+        "metrics", filters.dict(),
+        lambda: metrics_from_kpis(kpi_summary(**filters.dict()))
     )
-    
-    return {
-        "total_filings": len(df_f),
-        "avg_ccti": float(df_f['CCTI'].mean()) if not df_f.empty else 0,
-        "avg_excess_ret": float(df_f['ExcessRet'].mean()) if not df_f.empty else 0,
-        "avg_vol": (float(df_f['Vol_30d'].mean()) / 100) if not df_f.empty else 0
-    }
 
-@app.post("/api/charts/ccti_distribution")
-def get_ccti_hist(filters: FilterRequest, bins: int = 50):
-    df_f = filter_data(
-        filters.start_date, filters.end_date, 
-        filters.sics, filters.forms, filters.market_conditions
+@app.post("/api/kpis")
+def get_kpis(filters: FilterRequest, by_month: bool = False):
+    return cached_result(
+        "kpis", filters.dict(),
+        lambda: kpi_summary(by_month=by_month, **filters.dict()),
+        by_month=by_month
     )
-    if df_f.empty:
-        return []
-        
-    # Histogram calculation using numpy for speed
-    counts, bin_edges = np.histogram(df_f['CCTI'].dropna(), bins=bins)
-    
-    # Format for Recharts: [{range: "-2.0 to -1.9", count: 50}, ...]
-    result = []
-    for i in range(len(counts)):
-        label = f"{bin_edges[i]:.2f}"
-        result.append({
-            "bin": label,
-            "count": int(counts[i])
-        })
-    return result
+
+_MISS = object()
+
+HEAVY_ATTEMPTS = 3
+
+async def _heavy(request: Request, name: str, filters: FilterRequest, task, *args, **params):
+    """Cache lookup, then task(filters, *args) on the execution layer under name's limits."""
+    for _ in range(HEAVY_ATTEMPTS):
+        version = dataset_version()
+        key = result_key(name, filters.dict(), version, **params)
+        hit = result_cache.get(key, _MISS)
+        if hit is not _MISS:
+            return hit
+        ran_on, value = await executor.run(name, tasks.versioned, task, filters.dict(), *args, request=request)
+        # Only cache what was computed on the version in the key; a worker on
+        # the other side of a reload means another try on the current version
+        if ran_on == version:
+            return result_cache.put(key, value)
+    return value # reloads kept landing; serve it uncached (the ETag middleware skips the tag)
+
+# Chart endpoints answer in the format the client negotiated (?format= or
+# Accept, plus gzip), see encoding.py; the cached results stay in records form.
+
+@app.post("/api/charts/ccti_distribution")
+async def get_ccti_hist(request: Request, filters: FilterRequest, bins: int = 50):
+    return encode_result(request, await _heavy(
+        request, "ccti_distribution", filters,
+        tasks.ccti_hist_task, bins,
+        bins=bins
+    ))
 
 @app.post("/api/charts/heatmap")
-def get_heatmap(filters: FilterRequest, sentiment_col: str):
-    df_f = filter_data(
-        filters.start_date, filters.end_date, 
-        filters.sics, filters.forms, filters.market_conditions
-    )
-    if df_f.empty:
-        return []
-    
-    # 10x10 Grid: CCTI Bins (X) vs Sentiment Quantiles (Y)
-    try:
-        df_f['CCTI_Bin'] = pd.cut(df_f['CCTI'], bins=10, labels=False)
-        df_f['Sent_Bin'] = pd.qcut(df_f[sentiment_col], q=10, labels=False, duplicates='drop')
-        
-        heatmap_data = df_f.groupby(['Sent_Bin', 'CCTI_Bin'])['ExcessRet'].mean().reset_index()
-        
-        # Convert to matrix format for Plotly Heatmap
-        # Z values (ExcessRet)
-        z = np.zeros((10, 10))
-        z[:] = np.nan
-        
-        for _, row in heatmap_data.iterrows():
-            r = int(row['Sent_Bin'])
-            c = int(row['CCTI_Bin'])
-            if 0 <= r < 10 and 0 <= c < 10:
-                z[r][c] = row['ExcessRet']
-        
-        # Replace NaNs
-        z = np.nan_to_num(z, nan=0)
-        
-        return {
-            "z": z.tolist(),
-            "x": [f"Decile {i+1}" for i in range(10)], # CCTI
-            "y": [f"Decile {i+1}" for i in range(10)]  # Sentiment
-        }
-        
-    except Exception as e:
-        print(f"Heatmap Error: {e}")
-        return {"z": [], "x": [], "y": []}
+async def get_heatmap(
+    request: Request,
+    filters: FilterRequest,
+    sentiment_col: Optional[str] = None,
+    sentiment_cols: Optional[List[str]] = Query(None)
+):
+    # sentiment_col=X keeps the single-grid response; sentiment_cols=A&sentiment_cols=B
+    # (or sentiment_col=all) returns {"x", "y", "panels": {col: {z, counts, se}}}
+    if sentiment_cols or sentiment_col == 'all':
+        cols = SENTIMENT_COLS if sentiment_col == 'all' else sentiment_cols
+        cols = list(dict.fromkeys(cols))
+        return encode_result(request, await _heavy(
+            request, "heatmaps", filters,
+            tasks.heatmaps_task, cols,
+            sentiment_cols=tuple(cols)
+        ))
+    if not sentiment_col:
+        raise HTTPException(status_code=422, detail="sentiment_col or sentiment_cols is required")
+    return encode_result(request, await _heavy(
+        request, "heatmap", filters,
+        tasks.heatmap_task, sentiment_col,
+        sentiment_col=sentiment_col
+    ))
+
+def _check_trend(trend: str, trend_on: str):
+    if trend not in TREND_MODES:
+        raise HTTPException(status_code=422, detail=f"trend must be one of {list(TREND_MODES)}")
+    if trend_on not in ('sample', 'full'):
+        raise HTTPException(status_code=422, detail="trend_on must be 'sample' or 'full'")
 
 @app.post("/api/charts/scatter")
-def get_scatter(filters: FilterRequest, vol_cutoff: float = 100.0):
-    df_f = filter_data(
-        filters.start_date, filters.end_date, 
-        filters.sics, filters.forms, filters.market_conditions
-    )
-    
-    # Filter by Volatility
-    df_f = df_f[df_f['Vol_30d'] <= vol_cutoff]
-    
-    # Sample down to 2000 points for frontend rendering performance
-    if len(df_f) > 2000:
-        df_f = df_f.sample(2000, random_state=42)
-        
-    # Statsmodels Lowess
-    import statsmodels.api as sm
-    
-    lowess = sm.nonparametric.lowess
-    # Sort by CCTI for plotting
-    df_sorted = df_f.sort_values(by='CCTI')
-    
-    # Calculate Trendline (using subsample for speed if needed, but 2000 is fine)
-    z = lowess(df_sorted['ExcessRet'], df_sorted['CCTI'], frac=0.1)
-    
-    # Stringify date for JSON safety
-    df_sorted['FILING_DATE'] = df_sorted['FILING_DATE'].dt.strftime('%Y-%m-%d')
-    
-    # Return more details for the "Filing Details Card"
-    cols_to_return = [
-        'CCTI', 'ExcessRet', 'CoName', 'FILING_DATE', 'ACC_NUM',
-        'Vol_30d', 'Momentum_12_1', 'BM_w', 'Size_w', 'Negative', 'Positive',
-        'FORM_TYPE'
-    ]
-    # Ensure they exist (handle missing columns gracefully if dataset changes)
-    cols_to_return = [c for c in cols_to_return if c in df_sorted.columns]
-    
-    data_points = df_sorted[cols_to_return].to_dict(orient='records')
-    trend_points = [{"CCTI": x, "Trend": y} for x, y in z]
-    
-    return {
-        "points": data_points,
-        "trend": trend_points
+async def get_scatter(
+    request: Request,
+    filters: FilterRequest,
+    vol_cutoff: float = 100.0,
+    trend: str = 'exact',
+    trend_on: str = 'sample'
+):
+    _check_trend(trend, trend_on)
+    return encode_result(request, await _heavy(
+        request, "scatter", filters,
+        tasks.scatter_task, vol_cutoff, trend, trend_on,
+        vol_cutoff=vol_cutoff, trend=trend, trend_on=trend_on
+    ))
+
+@app.post("/api/charts/trend")
+async def get_trend(
+    request: Request,
+    filters: FilterRequest,
+    vol_cutoff: float = 100.0,
+    trend: str = 'binned',
+    trend_on: str = 'full'
+):
+    _check_trend(trend, trend_on)
+    return encode_result(request, await _heavy(
+        request, "trend", filters,
+        tasks.trend_task, vol_cutoff, trend, trend_on,
+        vol_cutoff=vol_cutoff, trend=trend, trend_on=trend_on
+    ))
+
+@app.post("/api/dashboard")
+async def get_dashboard(
+    request: Request,
+    filters: FilterRequest,
+    bins: int = 50,
+    sentiment_col: str = 'Negative',
+    vol_cutoff: float = 100.0,
+    trend: str = 'exact',
+    trend_on: str = 'sample',
+    stream: bool = False
+):
+    """
+    Every dashboard panel for one filter in a single round trip, admitted under
+    the "dashboard" limits. Panels run concurrently on the execution layer
+    (each under its own endpoint limits as well);
+    with stream=true each panel is sent as an NDJSON line
+    ({"panel": ..., "data": ...}) as soon as it is ready. Formats as for the
+    chart endpoints; streamed lines can be records or columns.
+    """
+    _check_trend(trend, trend_on)
+    fmt = requested_format(request)
+    if stream and fmt not in ("records", "columns"):
+        raise HTTPException(status_code=422, detail="stream=true supports the records or columns format")
+    key = filters.dict()
+    limiter = executor.limiter("dashboard")
+    await limiter.acquire(request)
+
+    async def metrics_panel():
+        # Cube lookup, cheap enough for the default thread pool
+        return await asyncio.to_thread(
+            cached_result, "metrics", key, lambda: metrics_from_kpis(kpi_summary(**key))
+        )
+
+    panels = {
+        "metrics": metrics_panel(),
+        "ccti_distribution": _heavy(
+            request, "ccti_distribution", filters, tasks.ccti_hist_task, bins, bins=bins),
+        "heatmap": _heavy(
+            request, "heatmap", filters, tasks.heatmap_task, sentiment_col, sentiment_col=sentiment_col),
+        "scatter": _heavy(
+            request, "scatter", filters, tasks.scatter_task, vol_cutoff, trend, trend_on,
+            vol_cutoff=vol_cutoff, trend=trend, trend_on=trend_on),
     }
+    async def named(name, coro):
+        return name, await coro
+
+    jobs = [asyncio.ensure_future(named(name, coro)) for name, coro in panels.items()]
+    # The dashboard slot is held until every panel has finished or been
+    # cancelled, however the response ends (streamed, failed or abandoned)
+    asyncio.gather(*jobs, return_exceptions=True).add_done_callback(lambda _: limiter.release())
+
+    if not stream:
+        try:
+            result = dict(await asyncio.gather(*jobs))
+        except BaseException:
+            for job in jobs:
+                job.cancel()
+            raise
+        return encode_result(request, {name: result[name] for name in panels})
+
+    async def ndjson():
+        try:
+            for done in asyncio.as_completed(jobs):
+                name, data = await done
+                line = {"panel": name, "data": to_columns(data) if fmt == "columns" else data}
+                yield json.dumps(jsonable_encoder(line), default=str) + "\n"
+        finally:
+            for job in jobs:
+                job.cancel()
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    return result_cache.stats()
+
+@app.get("/api/executor/stats")
+def get_executor_stats():
+    return executor.stats()
+
+@app.get("/api/memory")
+def get_memory(columns: bool = True):
+    """
+    Memory held by the served dataset: bytes per column (and whether they are
+    memory-mapped), derived structures, the result cache and process RSS.
+    """
+    state = current_dataset()
+    engine = current_model()
+    report = memory_report(state, derived={
+        "model": engine if engine.version == state.version else None,
+        "regression_cube": built_regression_cube(state),
+    })
+    if not columns:
+        report.pop("columns")
+    return report
+
+@app.get("/api/version")
+def get_version():
+    return reloader.stats()
+
+@app.post("/api/admin/reload", status_code=202)
+def reload_dataset():
+    """
+    Rebuilds the dataset and model from the source file in the background and
+    swaps them in; poll /api/version. An unchanged source is a no-op.
+    """
+    return reloader.start()
 
 @app.get("/api/feature_importance")
 def get_features():
     return get_feature_importance()
 
+@app.post("/api/feature_importance/jobs")
+def start_feature_importance(
+    filters: FilterRequest,
+    method: str = 'permutation',
+    n_repeats: int = Query(5, ge=1, le=50)
+):
+    """
+    Starts a background importance job for the filtered rows (or returns the
+    existing/finished one for the same filters). Poll the returned job_id.
+    """
+    if method not in IMPORTANCE_METHODS:
+        raise HTTPException(status_code=422, detail=f"method must be one of {list(IMPORTANCE_METHODS)}")
+    if method == 'impurity':
+        n_repeats = 1 # no repeats involved, share one job
+    f = filters.dict()
+    # The job reads the dataset version its id names, even if a reload lands first
+    state = current_dataset()
+    job_id = importance_job_id(state.version, filter_key(f), method, n_repeats)
+    columns = IMPORTANCE_FEATURES + [IMPORTANCE_TARGET]
+    return importance_service.submit(job_id, lambda: filtered_columns(f, columns, state),
+                                     method=method, n_repeats=n_repeats)
+
+@app.get("/api/feature_importance/jobs/{job_id}")
+def get_feature_importance_job(job_id: str):
+    job = importance_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job, submit it again")
+    return job
+
+@app.get("/api/regression/specs")
+def get_regression_specs():
+    return {name: {"target": target, "variables": variables} for name, (target, variables) in SPECS.items()}
+
+@app.post("/api/regression")
+def regression(
+    filters: FilterRequest,
+    spec: Optional[str] = None,
+    target: Optional[str] = None,
+    variables: Optional[List[str]] = Query(None),
+    cov_type: str = 'HC3',
+    bootstrap: int = Query(0, ge=0, le=MAX_BOOTSTRAP),
+    seed: int = 0
+):
+    """
+    OLS of target on a constant plus variables for the filtered rows, from
+    precomputed cross-product blocks (see regression.py). spec=<name> selects
+    one of the notebook's specifications; target/variables override it.
+    bootstrap=B adds partition-bootstrap standard errors and percentile CIs.
+    """
+    if spec is not None and spec not in SPECS:
+        raise HTTPException(status_code=422, detail=f"spec must be one of {list(SPECS)}")
+    default_target, default_vars = SPECS[spec or 'ccti_sq']
+    target = target or default_target
+    variables = list(dict.fromkeys(variables or default_vars))
+    if cov_type not in COV_TYPES:
+        raise HTTPException(status_code=422, detail=f"cov_type must be one of {list(COV_TYPES)}")
+
+    state = current_dataset()
+    f = filters.dict()
+
+    def compute():
+        try:
+            return run_regression(state, f, target, variables, cov_type, bootstrap, seed)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    return cached_result(
+        "regression", f, compute, version=state.version,
+        target=target, variables=tuple(variables), cov_type=cov_type, bootstrap=bootstrap, seed=seed
+    )
+
+@app.get("/api/backtest")
+def get_backtest(folds: bool = True):
+    """
+    The latest walk-forward backtest (python -m backend.backtest): pooled
+    out-of-sample metrics per model and, unless folds=false, the fold table.
+    current tells whether it was run on the dataset version being served.
+    """
+    doc = latest_results()
+    if doc is None:
+        raise HTTPException(status_code=404, detail="No backtest has been run yet")
+    result = {k: v for k, v in doc.items() if folds or k != "folds"}
+    result["current"] = doc["dataset_version"] == dataset_version()
+    return result
+
 @app.post("/api/predict")
 def predict(request: PredictionRequest):
     return predict_excess_return(request.dict())
+
+def _batch_matrix(body: bytes, content_type: str, columns: Optional[str], dtype: str):
+    """Decodes a batch payload into (X, neighbors, n_neighbors, filters)."""
+    if content_type.startswith(BINARY_TYPE):
+        # Raw little-endian matrix, row-major, one column per name in `columns`
+        names = columns.split(",") if columns else INPUT_COLS
+        if dtype not in ("float64", "float32"):
+            raise HTTPException(status_code=422, detail="dtype must be float64 or float32")
+        values = np.frombuffer(body, dtype=np.dtype(dtype).newbyteorder("<"))
+        if values.size % len(names):
+            raise HTTPException(status_code=422, detail=f"Payload is not a multiple of {len(names)} columns")
+        values = values.reshape(-1, len(names))
+        return feature_matrix({name: values[:, j] for j, name in enumerate(names)}), False, 5, None
+
+    try:
+        req = BatchPredictionRequest.parse_raw(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    filters = req.filters.dict() if req.filters else None
+    return feature_matrix(req.columns), req.neighbors, req.n_neighbors, filters
+
+@app.post("/api/predict/batch")
+async def predict_many(
+    request: Request,
+    columns: Optional[str] = None,
+    dtype: str = "float64",
+    neighbors: Optional[bool] = None
+):
+    """
+    Scores many rows in one call. Body is either JSON column arrays
+    ({"columns": {"CCTI": [...], ...}, "neighbors": false}) or a raw
+    application/octet-stream matrix (see _batch_matrix). Clients sending
+    Accept: application/octet-stream get the predictions back as raw float64.
+    """
+    body = await request.body()
+    try:
+        X, want_neighbors, n_neighbors, filters = _batch_matrix(
+            body, request.headers.get("content-type", ""), columns, dtype
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if neighbors is not None:
+        want_neighbors = neighbors
+    if len(X) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ROWS} rows per batch")
+    if want_neighbors and len(X) > MAX_NEIGHBOR_ROWS:
+        raise HTTPException(status_code=413, detail=f"Neighbour lookups are limited to {MAX_NEIGHBOR_ROWS} rows")
+    if not 1 <= n_neighbors <= 50:
+        raise HTTPException(status_code=422, detail="n_neighbors must be between 1 and 50")
+
+    result = await run_in_threadpool(predict_batch, X, want_neighbors, n_neighbors, filters)
+    preds = result["predicted_excess_return"]
+
+    if BINARY_TYPE in request.headers.get("accept", "") and not want_neighbors:
+        return Response(
+            content=np.ascontiguousarray(preds, dtype="<f8").tobytes(),
+            media_type=BINARY_TYPE,
+            headers={"X-Rows": str(len(preds))}
+        )
+
+    payload = {"n": len(preds), "predicted_excess_return": preds.tolist()}
+    if want_neighbors:
+        # Column-wise: every field is an (n, n_neighbors) nested list
+        payload["similar_filings"] = {
+            col: values.tolist() for col, values in result["similar_filings"].items()
+        }
+    return payload
@@ -1,47 +1,60 @@
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.neighbors import NearestNeighbors
+import threading
 import pandas as pd
 import numpy as np
-from .data_manager import load_data
+from .data_manager import current_dataset, DatasetState, filing_dates
+from .cache import result_cache, filter_key, canonical_filters
+from .model_store import load_or_train
 
-_model = None
-_knn = None
-_training_data = None
+_engine = None
+_engine_lock = threading.Lock()
 _feature_cols = [
     'CCTI', 'CCTI_sq', 'Momentum_12_1', 'Vol_30d', 'BM_w', 'Size_w',
     'Negative', 'Positive'
 ]
+# Raw columns a client sends (CCTI_sq is derived when absent)
+INPUT_COLS = [c for c in _feature_cols if c != 'CCTI_sq']
+NEIGHBOR_COLS = ['CoName', 'FILING_DATE', 'ACC_NUM', 'ExcessRet', 'CCTI']
+
+class ModelState:
+    """The forest and neighbour index trained on one dataset version, swapped in as a unit."""
+
+    def __init__(self, dataset: DatasetState, model, knn, train_rows: np.ndarray):
+        self.dataset = dataset
+        self.version = dataset.version
+        self.model = model
+        self.knn = knn
+        self.train_rows = train_rows
+        # Payload columns of the training rows only; no copy of the training frame
+        self.neighbor_cols = _neighbor_cols(dataset.df, train_rows)
+
+def build_model(dataset: DatasetState):
+    """Loads (or trains) the model for dataset without publishing it."""
+    # Trained once per dataset/configuration and shared through the model store
+    rf, knn, rows = load_or_train(
+        "backend_rf", dataset.df, _feature_cols, 'ExcessRet',
+        n_estimators=50, max_depth=10, random_state=42
+    )
+    return ModelState(dataset, rf, knn, rows)
+
+def publish_model(engine: ModelState):
+    global _engine
+    _engine = engine
 
 def initialize_model():
-    global _model, _knn, _training_data
-    if _model is not None:
+    if _engine is not None:
         return
+    with _engine_lock:
+        if _engine is None:
+            publish_model(build_model(current_dataset()))
+            print("ML Models Ready.")
 
-    print("Training ML Models...")
-    df = load_data()
-    
-    # Drop rows missing target or features
-    df_clean = df.dropna(subset=_feature_cols + ['ExcessRet']).copy()
-    
-    X = df_clean[_feature_cols]
-    y = df_clean['ExcessRet']
-    
-    # Train RF
-    rf = RandomForestRegressor(n_estimators=50, max_depth=10, random_state=42, n_jobs=-1)
-    rf.fit(X, y)
-    
-    # Train KNN
-    knn = NearestNeighbors(n_neighbors=5)
-    knn.fit(X)
-    
-    _model = rf
-    _knn = knn
-    _training_data = df_clean
-    print("ML Models Ready.")
+def current_model():
+    if _engine is None:
+        initialize_model()
+    return _engine
 
 def predict_excess_return(inputs: dict):
-    if _model is None:
-        initialize_model()
+    engine = current_model()
     
     # inputs: {CCTI: val, Vol_30d: val, ...}
     # Ensure order matches internal feature_cols
@@ -64,31 +77,98 @@ def predict_excess_return(inputs: dict):
     
     # Convert to DataFrame with feature names to avoid warnings
     X_in = pd.DataFrame([row], columns=_feature_cols)
-    prediction = _model.predict(X_in)[0]
+    prediction = engine.model.predict(X_in)[0]
     
-    # Neighbors
-    distances, indices = _knn.kneighbors(X_in)
+    # Neighbors (standardized features, optionally within the dashboard filters)
+    distances, indices = engine.knn.kneighbors(X_in, allowed=neighbor_mask(inputs.get('filters'), engine))
     similar_indices = indices[0]
     
-    similar_filings = _training_data.iloc[similar_indices].copy()
-    
-    # Convert dates to string for JSON
-    similar_filings['FILING_DATE'] = similar_filings['FILING_DATE'].dt.strftime('%Y-%m-%d')
-    
-    # Recalculate CCTI_sq just in case we need it? No, just return relevant columns
+    # Read from the prepared neighbour columns (dates already strings for JSON)
     result_cols = ['CoName', 'FILING_DATE', 'ACC_NUM', 'ExcessRet', 'CCTI']
-    neighbors_list = similar_filings[result_cols].to_dict(orient='records')
+    neighbors_list = [
+        {col: engine.neighbor_cols[col][i] for col in result_cols}
+        for i in similar_indices
+    ]
     
     return {
         "predicted_excess_return": float(prediction),
         "similar_filings": neighbors_list
     }
 
+def neighbor_mask(filters: dict = None, engine: ModelState = None):
+    """Training rows matching a FilterRequest dict, or None when unfiltered."""
+    if not filters or not any(canonical_filters(filters).values()):
+        return None
+    engine = engine or current_model()
+
+    def build():
+        # Filtered on the dataset the model was trained on, not whatever is current
+        selected = np.zeros(len(engine.dataset.df), dtype=bool)
+        selected[engine.dataset.index.row_positions(**filters)] = True
+        return selected[engine.train_rows]
+
+    return result_cache.get_or_compute(("neighbor_mask", engine.version, filter_key(filters)), build)
+
+def _neighbor_cols(df: pd.DataFrame, rows: np.ndarray):
+    # Neighbour payload columns as plain object arrays (dates pre-formatted),
+    # so batch lookups are a fancy-index instead of iloc + to_dict per row
+    cols = {}
+    for col in NEIGHBOR_COLS:
+        s = df[col].iloc[rows]
+        if col == 'FILING_DATE':
+            s = filing_dates(s).dt.strftime('%Y-%m-%d')
+        cols[col] = s.to_numpy(dtype=object)
+    return cols
+
+def feature_matrix(columns: dict, n_rows: int = None):
+    """
+    Builds the (n, features) float matrix from column arrays. Missing features
+    default to 0 (CCTI_sq to CCTI**2), as in the single-row predictor.
+    """
+    unknown = [c for c in columns if c not in _feature_cols]
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {unknown}")
+    arrays = {c: np.asarray(v, dtype=float).ravel() for c, v in columns.items()}
+    lengths = {len(a) for a in arrays.values()}
+    if n_rows is not None:
+        lengths.add(n_rows)
+    if len(lengths) > 1:
+        raise ValueError("All feature columns must have the same length")
+    n = lengths.pop() if lengths else 0
+
+    X = np.zeros((n, len(_feature_cols)))
+    for j, col in enumerate(_feature_cols):
+        if col in arrays:
+            X[:, j] = arrays[col]
+        elif col == 'CCTI_sq' and 'CCTI' in arrays:
+            X[:, j] = arrays['CCTI'] ** 2
+    return X
+
+def predict_batch(X: np.ndarray, neighbors: bool = False, n_neighbors: int = 5,
+                  filters: dict = None):
+    """
+    Scores a whole (n, features) matrix in one model call. With neighbors,
+    also returns the n_neighbors most similar historical filings per row
+    (restricted to the rows matching filters, if given).
+    """
+    engine = current_model()
+
+    X_in = pd.DataFrame(X, columns=_feature_cols)
+    result = {"predicted_excess_return": engine.model.predict(X_in) if len(X) else np.empty(0)}
+    if neighbors:
+        if len(X):
+            _, indices = engine.knn.kneighbors(
+                X_in, n_neighbors=n_neighbors, allowed=neighbor_mask(filters, engine)
+            )
+        else:
+            indices = np.empty((0, n_neighbors), dtype=int)
+        result["neighbor_index"] = indices
+        result["similar_filings"] = {col: values[indices] for col, values in engine.neighbor_cols.items()}
+    return result
+
 def get_feature_importance():
-    if _model is None:
-        initialize_model()
-        
+    engine = current_model()
     return [
         {"feature": name, "importance": float(imp)}
-        for name, imp in zip(_feature_cols, _model.feature_importances_)
+        for name, imp in zip(_feature_cols, engine.model.feature_importances_)
     ]
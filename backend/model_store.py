@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import weakref
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from .similarity import SimilarityIndex
+
+try:
+    import fcntl
+except ImportError: # Windows: no cross-process training lock
+    fcntl = None
+
+# On-disk store for trained simulator models.
+#
+# An artifact is keyed by a fingerprint of the training matrix plus the
+# hyperparameters, so a model is only retrained when the data or configuration
+# changes. The forest is stored as flat node arrays (.npy) and predicted from
+# memory-mapped copies: every worker process shares one copy of the trees
+# (and of the similarity index arrays) through the page cache. sklearn's own
+# unpickling copies tree nodes into private buffers, so a pickled forest could
+# not be shared this way.
+#
+# A process holds a shared lock on every artifact it has mapped for as long as
+# the loaded forest lives. Training prunes older artifacts of the same name
+# beyond the MODEL_KEEP most recently used, and never one another process (a
+# Streamlit server, the API during a hot reload) still holds.
+MODEL_STORE_VERSION = 2
+MODEL_DIR = os.environ.get(
+    "CCTI_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".models")
+)
+MODEL_KEEP = int(os.environ.get("CCTI_MODEL_KEEP", "3")) # artifacts kept per name, the new one included
+IN_USE_LOCK = "in_use.lock"
+NODE_ARRAYS = ("left", "right", "feature", "threshold", "value", "roots", "feature_importances")
+
+class FlatForest:
+    """RandomForestRegressor.predict over flat (memory-mappable) node arrays."""
+    CHUNK = 8192
+
+    def __init__(self, left, right, feature, threshold, value, roots, feature_importances):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.feature_importances_ = feature_importances
+
+    @classmethod
+    def from_sklearn(cls, forest: RandomForestRegressor):
+        trees = [est.tree_ for est in forest.estimators_]
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]]).astype(np.int64)
+
+        def children(attr):
+            # Leaves (-1) stay -1, inner nodes are shifted to global node ids
+            return np.concatenate([
+                np.where(getattr(t, attr) < 0, -1, getattr(t, attr) + off)
+                for t, off in zip(trees, offsets)
+            ]).astype(np.int64)
+
+        return cls(
+            left=children("children_left"),
+            right=children("children_right"),
+            feature=np.concatenate([t.feature for t in trees]).astype(np.int64),
+            threshold=np.concatenate([t.threshold for t in trees]).astype(np.float64),
+            value=np.concatenate([t.value[:, 0, 0] for t in trees]).astype(np.float64),
+            roots=offsets,
+            feature_importances=np.asarray(forest.feature_importances_, dtype=np.float64),
+        )
+
+    def predict(self, X):
+        # Same decision rule as sklearn: float32 inputs, go left when x <= threshold
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty(len(X))
+        for start in range(0, len(X), self.CHUNK):
+            Xc = X[start:start + self.CHUNK]
+            rows = np.arange(len(Xc))[:, None]
+            node = np.broadcast_to(self.roots, (len(Xc), len(self.roots))).copy()
+            while True:
+                inner = self.left[node] >= 0
+                if not inner.any():
+                    break
+                go_left = Xc[rows, self.feature[node]] <= self.threshold[node]
+                node = np.where(inner, np.where(go_left, self.left[node], self.right[node]), node)
+            out[start:start + len(Xc)] = self.value[node].mean(axis=1)
+        return out
+
+    def save(self, directory: str):
+        for name in NODE_ARRAYS:
+            attr = "feature_importances_" if name == "feature_importances" else name
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, attr))
+
+    @classmethod
+    def load(cls, directory: str):
+        return cls(**{
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in NODE_ARRAYS
+        })
+
+def training_fingerprint(X: np.ndarray, y: np.ndarray):
+    h = hashlib.sha256()
+    for a in (X, y):
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+def model_key(fingerprint: str, params: dict):
+    config = {
+        "store": MODEL_STORE_VERSION,
+        "sklearn": sklearn.__version__,
+        "data": fingerprint,
+        **params,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+def _artifact_dir(name: str, key: str):
+    return os.path.join(MODEL_DIR, f"{name}-{key[:16]}")
+
+def _hold(path: str, owner):
+    # Shared lock on the artifact until owner is garbage collected
+    if fcntl is None:
+        return
+    f = open(os.path.join(path, IN_USE_LOCK), "a")
+    fcntl.flock(f, fcntl.LOCK_SH)
+    weakref.finalize(owner, f.close) # closing the file releases the lock
+
+def _in_use(path: str):
+    if fcntl is None:
+        return False
+    try:
+        f = open(os.path.join(path, IN_USE_LOCK), "a")
+    except OSError:
+        return False
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except OSError:
+        return True
+    finally:
+        f.close()
+
+def _load(path: str):
+    forest = FlatForest.load(path)
+    knn = joblib.load(os.path.join(path, "knn.joblib"), mmap_mode="r")
+    rows = np.load(os.path.join(path, "train_rows.npy"), mmap_mode="r")
+    _hold(path, forest)
+    os.utime(os.path.join(path, "meta.json")) # most recently used, for _prune
+    return forest, knn, rows
+
+def _train(path: str, X: pd.DataFrame, y: pd.Series, rows: np.ndarray, params: dict, meta: dict):
+    rf = RandomForestRegressor(
+        n_estimators=params["n_estimators"],
+        max_depth=params["max_depth"],
+        random_state=params["random_state"],
+        n_jobs=-1
+    )
+    rf.fit(X, y)
+    knn = SimilarityIndex(X)
+
+    # Written into a temp directory and renamed, so readers never see half an artifact
+    tmp = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    FlatForest.from_sklearn(rf).save(tmp)
+    joblib.dump(knn, os.path.join(tmp, "knn.joblib"))
+    np.save(os.path.join(tmp, "train_rows.npy"), rows)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=1)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+def _prune(name: str, keep: str):
+    """Deletes artifacts of name beyond the MODEL_KEEP most recently used, unless a process holds them."""
+    old = []
+    for entry in os.listdir(MODEL_DIR):
+        full = os.path.join(MODEL_DIR, entry)
+        if entry.startswith(name + "-") and full != keep and os.path.isdir(full) and ".tmp-" not in entry:
+            meta = os.path.join(full, "meta.json")
+            old.append((os.path.getmtime(meta) if os.path.exists(meta) else 0.0, full))
+    for _, full in sorted(old, reverse=True)[max(MODEL_KEEP - 1, 0):]:
+        if not _in_use(full):
+            shutil.rmtree(full, ignore_errors=True)
+
+def load_or_train(name: str, df: pd.DataFrame, feature_cols: list, target: str = "ExcessRet",
+                  n_estimators: int = 50, max_depth: int = 10, random_state: int = 42):
+    """
+    Returns (forest, similarity index, train_rows) for the rows of df with
+    complete features and target; train_rows are their positions in df. Loads the stored artifact
+    when data and parameters match, otherwise trains and stores a new one.
+    """
+    clean = df[feature_cols + [target]].notna().all(axis=1).to_numpy()
+    rows = np.flatnonzero(clean)
+    X = df[feature_cols].iloc[rows]
+    y = df[target].iloc[rows]
+
+    params = {
+        "feature_cols": list(feature_cols), "target": target,
+        "n_estimators": n_estimators, "max_depth": max_depth,
+        "random_state": random_state,
+    }
+    fingerprint = training_fingerprint(X.to_numpy(dtype=float), y.to_numpy(dtype=float))
+    key = model_key(fingerprint, params)
+    path = _artifact_dir(name, key)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    lock = open(os.path.join(MODEL_DIR, f"{name}.lock"), "w")
+    try:
+        # One process trains; the others wait here and then load its artifact
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            print(f"Training {name} ({len(rows)} rows)...")
+            meta = {
+                "name": name, "key": key, "data_fingerprint": fingerprint,
+                "rows": int(len(rows)), "params": params,
+                "sklearn": sklearn.__version__, "created": time.time(),
+            }
+            _train(path, X, y, rows, params, meta)
+            _prune(name, path)
+        else:
+            print(f"Loaded model artifact: {path}")
+        # Mapped (and held) under the lock, so a concurrent prune cannot slip in between
+        return _load(path)
+    finally:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .cube import KPICube, CUBE_DIMS, CUBE_MEASURES
+
+# Out-of-core storage for datasets larger than RAM (CCTI_STORAGE=partitioned).
+#
+# The prepared dataset lives on disk as one memory-mapped .npy file per
+# column, its rows ordered by (filing year, SIC, FILING_DATE) so every
+# (year, SIC) partition is a contiguous row range. meta.json lists the
+# partitions with their date span, and queries prune on it: a filter only
+# touches the partitions whose year/SIC can match, and binary-searches the
+# dates inside the partially covered ones. The surviving row ranges are
+# coalesced into chunks of at most CHUNK_ROWS rows and scanned (optionally on
+# SCAN_WORKERS threads; numpy releases the GIL) into partial aggregates that
+# the caller merges, so memory per query is bounded by the chunk size.
+#
+# The store is built by streaming the CSV in chunks: rows are spilled per
+# filing year, each year is sorted and appended to the column files, then the
+# numeric columns are median-imputed and the sentiment deciles computed from
+# exact whole-column statistics (one column in memory at a time), matching
+# data_manager.prepare_frame. Strings are dictionary-encoded.
+#
+# The store is also the dataset's filter index (row_positions / select have
+# FilterIndex's signatures), and the frame it exposes is backed by the maps,
+# so pages are only read when a query or the model touches them. Chart and
+# importance tasks only go through scan; what still reads whole columns is
+# the model, and the regression cube, whose Z matrix (n x its variables) and
+# unimputed source values are held in memory.
+
+PARTITION_VERSION = 1
+CHUNK_ROWS = int(os.environ.get("CCTI_CHUNK_ROWS", "500000"))
+SCAN_WORKERS = int(os.environ.get("CCTI_SCAN_WORKERS", str(min(4, os.cpu_count() or 1))))
+ROW_COL = "__row" # source CSV row number: ties in date keep the in-memory (stable sort) order
+NO_YEAR = 9999    # partition year of rows without a filing date (sorted last, like NaT)
+
+def _instant(value):
+    return np.datetime64(pd.to_datetime(value), 'ns')
+
+def _day(instant: np.datetime64):
+    return int(instant.astype('datetime64[D]').astype(np.int64))
+
+class PartitionedStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.n_rows = self.meta["rows"]
+        self.sic_partitioned = self.meta.get("sic_partitioned", False)
+        self.columns = {}
+        self.categories = {}
+        for entry in self.meta["columns"]:
+            self.columns[entry["name"]] = np.load(os.path.join(directory, entry["file"]), mmap_mode="r")
+            if entry["kind"] == "category":
+                cats = np.load(os.path.join(directory, entry["categories"]))
+                self.categories[entry["name"]] = pd.Index(cats.astype(object))
+        parts = self.meta["partitions"]
+        self.part_year = np.array([p["year"] for p in parts], dtype=np.int64)
+        self.part_sic = np.array([np.nan if p["sic"] is None else p["sic"] for p in parts], dtype=float)
+        self.part_lo = np.array([p["lo"] for p in parts], dtype=np.int64)
+        self.part_hi = np.array([p["hi"] for p in parts], dtype=np.int64)
+        self.part_min_day = np.array([p["min_day"] for p in parts], dtype=np.int64)
+        self.part_max_day = np.array([p["max_day"] for p in parts], dtype=np.int64)
+
+    @property
+    def n_partitions(self):
+        return len(self.part_lo)
+
+    def column(self, name: str, lo: int = 0, hi: int = None):
+        """Values of one column over rows lo:hi (category columns decoded)."""
+        values = self.columns[name][lo:hi]
+        if name in self.categories:
+            return pd.Categorical.from_codes(values, self.categories[name])
+        return values
+
+    def frame(self):
+        """The whole dataset as a DataFrame over the maps (nothing is read until used)."""
+        data = {}
+        for entry in self.meta["columns"]:
+            if entry["name"] != ROW_COL:
+                data[entry["name"]] = self.column(entry["name"])
+        return pd.DataFrame(data, copy=False)
+
+    # --- Filtering (FilterIndex interface) ---
+
+    def _ranges(self, start_date=None, end_date=None, sics=None):
+        """Row ranges of the partitions (narrowed to the date filter) that can match."""
+        keep = np.ones(self.n_partitions, dtype=bool)
+        start = _instant(start_date) if start_date else None
+        end = _instant(end_date) if end_date else None
+        # Pruning on whole days; the boundary partitions are then searched to the instant
+        if start is not None:
+            keep &= self.part_max_day >= _day(start)
+        if end is not None:
+            keep &= self.part_min_day <= _day(end)
+        if sics and self.sic_partitioned:
+            keep &= np.isin(self.part_sic, np.asarray(list(sics), dtype=float))
+
+        lo, hi = self.part_lo[keep].copy(), self.part_hi[keep].copy()
+        dates = self.columns['FILING_DATE']
+        edge = np.zeros(len(lo), dtype=bool)
+        if start is not None:
+            edge |= self.part_min_day[keep] <= _day(start)
+        if end is not None:
+            edge |= self.part_max_day[keep] >= _day(end)
+        for i in np.flatnonzero(edge):
+            days = dates[lo[i]:hi[i]]
+            a = np.searchsorted(days, start, 'left') if start is not None else 0
+            b = np.searchsorted(days, end, 'right') if end is not None else len(days)
+            lo[i], hi[i] = lo[i] + a, lo[i] + max(a, b)
+        nonempty = hi > lo
+        return lo[nonempty], hi[nonempty]
+
+    def _set_mask(self, lo: int, hi: int, sics=None, forms=None, market_conditions=None):
+        mask = None
+        if sics and not self.sic_partitioned and 'SIC' in self.columns:
+            # String SIC codes: matched per row instead of by partition
+            found = self.categories['SIC'].get_indexer(list(sics)) if 'SIC' in self.categories else []
+            mask = np.isin(self.columns['SIC'][lo:hi], [f for f in found if f >= 0])
+        if forms and 'FORM_TYPE' in self.columns:
+            found = self.categories['FORM_TYPE'].get_indexer(list(forms))
+            m = np.isin(self.columns['FORM_TYPE'][lo:hi], found[found >= 0])
+            mask = m if mask is None else (mask & m)
+        if market_conditions and 'MarketCondition' in self.columns:
+            m = np.isin(self.columns['MarketCondition'][lo:hi], list(market_conditions))
+            mask = m if mask is None else (mask & m)
+        return mask
+
+    def chunks(self, start_date=None, end_date=None, sics=None, forms=None, market_conditions=None):
+        """
+        The filter's rows as chunks of at most CHUNK_ROWS: lists of
+        (lo, hi, mask) pieces, mask None when every row of lo:hi matches.
+        """
+        lo, hi = self._ranges(start_date, end_date, sics)
+        if len(lo):
+            # Coalesce adjacent partitions into longer runs
+            breaks = np.flatnonzero(lo[1:] != hi[:-1]) + 1
+            lo = lo[np.r_[0, breaks]]
+            hi = hi[np.r_[breaks - 1, len(hi) - 1]]
+        chunk, size = [], 0
+        for a, b in zip(lo.tolist(), hi.tolist()):
+            while a < b:
+                take = min(b - a, CHUNK_ROWS - size)
+                chunk.append((a, a + take, self._set_mask(a, a + take, sics, forms, market_conditions)))
+                size += take
+                a += take
+                if size >= CHUNK_ROWS:
+                    yield chunk
+                    chunk, size = [], 0
+        if chunk:
+            yield chunk
+
+    def _positions(self, chunk):
+        parts = []
+        for lo, hi, mask in chunk:
+            pos = np.arange(lo, hi)
+            parts.append(pos if mask is None else pos[mask])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def row_positions(self, **filters):
+        """Positions of the matching rows, in filing-date order (as FilterIndex returns them)."""
+        pos = np.concatenate([self._positions(c) for c in self.chunks(**filters)] or [np.empty(0, dtype=np.int64)])
+        if ROW_COL in self.columns and len(pos):
+            # Same order as the date-sorted in-memory frame: (date, source row)
+            order = np.lexsort((self.columns[ROW_COL][pos], self.columns['FILING_DATE'][pos]))
+            pos = pos[order]
+        return pos
+
+    def select(self, df: pd.DataFrame, **filters):
+        return df.iloc[self.row_positions(**filters)]
+
+    # --- Scans ---
+
+    def read_chunk(self, chunk, columns: list):
+        """{column: values of the chunk's matching rows} (categories as codes)."""
+        out = {}
+        for name in columns:
+            values = self.columns[name]
+            pieces = [values[lo:hi] if mask is None else values[lo:hi][mask] for lo, hi, mask in chunk]
+            out[name] = np.concatenate(pieces) if len(pieces) > 1 else np.asarray(pieces[0])
+        return out
+
+    def scan(self, fn, columns: list, workers: int = None, **filters):
+        """
+        fn({column: values}) for every chunk of the filter's rows, chunks in
+        parallel on up to workers threads. Returns the list of partial results.
+        """
+        columns = [c for c in columns if c in self.columns]
+        chunks = list(self.chunks(**filters))
+        workers = workers or SCAN_WORKERS
+        if workers <= 1 or len(chunks) <= 1:
+            return [fn(self.read_chunk(c, columns)) for c in chunks]
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            return list(pool.map(lambda c: fn(self.read_chunk(c, columns)), chunks))
+
+    def kpi_cube(self, dims: list = None, measures: list = None):
+        """The KPI cube, folded in chunk by chunk (cell count, not row count, stays in memory)."""
+        df = self.frame()
+        dims = [d for d in (dims or CUBE_DIMS) if d in df.columns]
+        measures = [m for m in (measures or CUBE_MEASURES) if m in df.columns]
+        cube = KPICube(dims=dims, measures=measures)
+        for lo in range(0, self.n_rows, CHUNK_ROWS):
+            cube.append(df.iloc[lo:lo + CHUNK_ROWS])
+        return cube
+
+# --- Building ---
+
+def _column_kind(s: pd.Series, name: str, numeric_cols: list):
+    if name == 'FILING_DATE':
+        return "datetime"
+    if name in numeric_cols or pd.api.types.is_float_dtype(s):
+        return "float"
+    if pd.api.types.is_integer_dtype(s) or pd.api.types.is_bool_dtype(s):
+        return "int"
+    return "category"
+
+def build_store(csv_path: str, out_dir: str, chunk_rows: int = None):
+    """Streams csv_path into a partitioned store at out_dir (atomically, via a temp directory)."""
+    from .data_manager import NUMERIC_COLS, SENTIMENT_COLS, DECILE_SUFFIX
+    chunk_rows = chunk_rows or CHUNK_ROWS
+    t0 = time.time()
+    tmp = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    spill = os.path.join(tmp, "spill")
+    os.makedirs(spill)
+
+    # Pass 1: parse chunks, encode strings, spill columns per filing year
+    names, kinds = None, {}
+    lookups, categories = {}, {}
+    year_rows = {}
+    offset = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        if names is None:
+            names = list(chunk.columns)
+            if 'FILING_DATE' not in names:
+                raise ValueError("Partitioned storage needs a FILING_DATE column")
+            kinds = {c: _column_kind(chunk[c], c, NUMERIC_COLS) for c in names}
+        chunk['FILING_DATE'] = pd.to_datetime(chunk['FILING_DATE'])
+        chunk['ym'] = chunk['FILING_DATE'].dt.to_period('M').astype(str)
+        kinds.setdefault('ym', "category")
+        chunk[ROW_COL] = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        offset += len(chunk)
+
+        columns = {}
+        for name in names + ['ym']:
+            s = chunk[name]
+            kind = kinds[name]
+            if kind == "datetime":
+                columns[name] = s.to_numpy(dtype='datetime64[ns]').view(np.int64)
+            elif kind == "category":
+                codes, uniques = pd.factorize(s.astype(object))
+                lookup = lookups.setdefault(name, {})
+                cats = categories.setdefault(name, [])
+                mapping = np.empty(len(uniques), dtype=np.int32)
+                for i, value in enumerate(uniques):
+                    if value not in lookup:
+                        lookup[value] = len(cats)
+                        cats.append(value)
+                    mapping[i] = lookup[value]
+                out = np.full(len(codes), -1, dtype=np.int32)
+                out[codes >= 0] = mapping[codes[codes >= 0]]
+                columns[name] = out
+            else:
+                values = pd.to_numeric(s, errors='coerce')
+                if kind == "int" and (values.isna().any() or not pd.api.types.is_integer_dtype(values)):
+                    kinds[name] = kind = "float" # demoted for the whole column
+                columns[name] = values.to_numpy(dtype=float)
+        columns[ROW_COL] = chunk[ROW_COL].to_numpy()
+
+        years = chunk['FILING_DATE'].dt.year.fillna(NO_YEAR).astype(np.int64).to_numpy()
+        for year in np.unique(years):
+            rows = years == year
+            directory = os.path.join(spill, str(year))
+            os.makedirs(directory, exist_ok=True)
+            for i, name in enumerate(list(columns)):
+                with open(os.path.join(directory, f"c{i}.bin"), "ab") as f:
+                    columns[name][rows].tofile(f)
+            year_rows[int(year)] = year_rows.get(int(year), 0) + int(rows.sum())
+    if names is None:
+        raise ValueError(f"{csv_path} has no rows")
+    spilled = names + ['ym', ROW_COL]
+    kinds[ROW_COL] = "int"
+    spill_dtype = {name: {"datetime": np.int64, "category": np.int32}.get(kinds[name], np.float64)
+                   for name in spilled}
+    spill_dtype[ROW_COL] = np.int64
+
+    # Pass 2: sort each year by (SIC, date, source row) into the final column files
+    total = offset
+    final_dtype = {"datetime": 'datetime64[ns]', "category": np.int32, "int": np.int64, "float": np.float64}
+    outputs = {}
+    entries = []
+    for i, name in enumerate(spilled):
+        entry = {"name": name, "kind": kinds[name], "file": f"c{i}.npy"}
+        outputs[name] = np.lib.format.open_memmap(
+            os.path.join(tmp, entry["file"]), mode="w+", dtype=final_dtype[kinds[name]], shape=(total,))
+        if kinds[name] == "category":
+            entry["categories"] = f"c{i}_cats.npy"
+            np.save(os.path.join(tmp, entry["categories"]), np.asarray(categories[name], dtype=str))
+        entries.append(entry)
+
+    partitions = []
+    start = 0
+    has_sic = 'SIC' in names and kinds['SIC'] != "category"
+    for year in sorted(year_rows):
+        n = year_rows[year]
+        directory = os.path.join(spill, str(year))
+        data = {name: np.fromfile(os.path.join(directory, f"c{i}.bin"), dtype=spill_dtype[name])
+                for i, name in enumerate(spilled)}
+        sic = data['SIC'] if has_sic else np.full(n, np.nan)
+        # NaN SICs sort after every code, NaT dates (int64 min) are only in NO_YEAR
+        order = np.lexsort((data[ROW_COL], data['FILING_DATE'], np.nan_to_num(sic, nan=np.inf)))
+        for name in spilled:
+            values = data[name][order]
+            if kinds[name] == "datetime":
+                values = values.view('datetime64[ns]')
+            outputs[name][start:start + n] = values
+        sic = sic[order]
+        days = data['FILING_DATE'][order].view('datetime64[ns]').astype('datetime64[D]').astype(np.int64)
+        key = np.where(np.isnan(sic), np.inf, sic)
+        bounds = np.r_[0, np.flatnonzero(key[1:] != key[:-1]) + 1, n]
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            if b <= a:
+                continue
+            valid = days[a:b][days[a:b] != np.iinfo(np.int64).min] # NaT
+            partitions.append({
+                "year": int(year),
+                "sic": None if np.isnan(sic[a]) else float(sic[a]),
+                "lo": int(start + a), "hi": int(start + b),
+                "min_day": int(valid.min()) if len(valid) else int(np.iinfo(np.int64).max),
+                "max_day": int(valid.max()) if len(valid) else int(np.iinfo(np.int64).min),
+            })
+        start += n
+        shutil.rmtree(directory)
+    shutil.rmtree(spill)
+
+    # Pass 3: median imputation and sentiment deciles from whole-column statistics
+    medians, deciles = {}, {}
+    for name in NUMERIC_COLS:
+        if name not in outputs:
+            continue
+        col = outputs[name]
+        missing = np.isnan(col)
+        if missing.all():
+            continue
+        median = float(np.nanmedian(col))
+        medians[name] = median
+        if missing.any():
+            col[missing] = median
+    for name in SENTIMENT_COLS:
+        if name not in outputs:
+            continue
+        file = f"c{len(entries)}.npy"
+        codes = np.lib.format.open_memmap(os.path.join(tmp, file), mode="w+", dtype=np.int8, shape=(total,))
+        # Breakpoints as in pd.qcut(q=10, duplicates='drop'), then ranked chunk by chunk
+        col = outputs[name]
+        edges = np.unique(np.nanquantile(col, np.linspace(0, 1, 11)))
+        deciles[name] = edges.tolist()
+        for lo in range(0, total, chunk_rows):
+            if len(edges) < 2:
+                codes[lo:lo + chunk_rows] = -1
+            else:
+                values = col[lo:lo + chunk_rows]
+                codes[lo:lo + chunk_rows] = np.where(
+                    np.isnan(values), -1, np.searchsorted(edges[1:-1], values, side='left'))
+        entries.append({"name": name + DECILE_SUFFIX, "kind": "int", "file": file})
+        codes.flush()
+    for col in outputs.values():
+        col.flush()
+    del outputs
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            "version": PARTITION_VERSION, "source": csv_path, "rows": int(total),
+            "columns": entries, "partitions": partitions, "sic_partitioned": has_sic,
+            "medians": medians, "deciles": deciles,
+            "created": time.time(),
+        }, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    try:
+        os.replace(tmp, out_dir)
+    except OSError:
+        # Another worker published the same store first
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"Partitioned store written: {out_dir} ({total} rows, {len(partitions)} partitions) "
+          f"in {time.time() - t0:.1f}s")
+    return out_dir
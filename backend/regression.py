@@ -0,0 +1,340 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .cube import _month_split
+from .data_manager import unimputed_columns
+
+# OLS for any filter and variable subset from sufficient statistics.
+#
+# The rows are grouped into partitions (one per ym x FORM_TYPE x
+# MarketCondition) and each partition stores the cross-product block Z'Z of
+# Z = [1, every regression variable]. Since targets live in Z too, X'X, X'y
+# and y'y of any specification are sub-blocks, and a filter's totals are a
+# sum of partition blocks plus the rows of partially covered boundary months
+# (SIC filters, which cut across partitions, build the blocks from the
+# filtered rows instead). That gives coefficients, R^2 and classical standard
+# errors without touching the rows again.
+#
+# The cube is built from the source values, not the served frame (which is
+# median-imputed): regressors get the notebook's fillna(0), and rows whose
+# target is missing drop out. That is done by zeroing those rows, so each
+# distinct target-missing pattern has its own set of blocks (usually one).
+#
+# HC3 needs every row's leverage under the final (X'X)^-1, which no partition
+# summary can provide, so it is one vectorized pass over the filtered rows.
+# The bootstrap resamples partitions (a cluster bootstrap by month cell) by
+# reweighting blocks, with replicate batches solved on a thread pool.
+REGRESSION_VARS = [
+    'Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining',
+    'BM_w', 'Size_w', 'dAsset_w', 'ROE_w', 'Momentum_12_1', 'Vol_30d',
+    'CCTI', 'CCTI_sq', 'CCTI_MC', 'MarketCondition',
+    'ExcessRet', 'ExcessRet_w', 'Return_30D_new',
+]
+PARTITION_DIMS = ['ym', 'FORM_TYPE', 'MarketCondition']
+CONTROLS = ['BM_w', 'Size_w', 'dAsset_w', 'ROE_w', 'Momentum_12_1', 'Vol_30d']
+SENTIMENT = ['Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining']
+# The replication notebook's specifications: name -> (target, regressors)
+SPECS = {
+    'sentiment': ('ExcessRet_w', SENTIMENT + CONTROLS),
+    'base': ('ExcessRet', SENTIMENT + ['BM_w', 'Size_w', 'dAsset_w', 'ROE_w']),
+    'enhanced': ('ExcessRet', SENTIMENT + CONTROLS + ['CCTI']),
+    'ccti': ('ExcessRet', ['CCTI'] + CONTROLS),
+    'ccti_mc': ('ExcessRet', ['CCTI', 'CCTI_MC'] + CONTROLS),
+    'ccti_sq': ('ExcessRet', ['CCTI', 'CCTI_sq'] + CONTROLS),
+}
+TARGETS = ['ExcessRet', 'ExcessRet_w', 'Return_30D_new']
+COV_TYPES = ('nonrobust', 'HC3')
+MAX_BOOTSTRAP = 2000
+BOOT_BATCH = 250 # replicates per thread-pool task
+BOOT_THREADS = int(os.environ.get("CCTI_BOOTSTRAP_THREADS", str(min(4, os.cpu_count() or 1))))
+
+_cube = None
+_cube_lock = threading.Lock()
+
+def regression_columns(df: pd.DataFrame, raw: dict = None):
+    """
+    The regression variables of df as float arrays (NaN kept), derived ones
+    added; raw (column -> values) replaces df's columns, e.g. with unimputed ones.
+    """
+    cols = {}
+    for col in REGRESSION_VARS:
+        if raw is not None and col in raw:
+            cols[col] = raw[col]
+        elif col in df.columns:
+            cols[col] = df[col].to_numpy(dtype=float)
+    if 'CCTI_MC' not in cols and 'CCTI' in cols and 'MarketCondition' in cols:
+        cols['CCTI_MC'] = cols['CCTI'] * cols['MarketCondition']
+    if 'CCTI_sq' not in cols and 'CCTI' in cols:
+        cols['CCTI_sq'] = cols['CCTI'] ** 2
+    if 'ExcessRet_w' not in cols and 'ExcessRet' in cols:
+        # Winsorized at 1% / 99% over the full sample, as in the notebook
+        y = cols['ExcessRet']
+        low, high = np.nanquantile(y, [0.01, 0.99])
+        cols['ExcessRet_w'] = np.clip(y, low, high)
+    return cols
+
+def regression_frame(df: pd.DataFrame, raw: dict = None):
+    """
+    The regression variables as a float matrix, missing values as 0 (the
+    notebook's fillna(0) for regressors), plus {target: rows where it is
+    present}. Pass the unimputed values as raw, df's own columns are only
+    as missing as the frame they come from.
+    """
+    cols = regression_columns(df, raw)
+    names = [c for c in REGRESSION_VARS if c in cols]
+    Z = np.empty((len(df), len(names) + 1))
+    Z[:, 0] = 1.0
+    for j, name in enumerate(names):
+        Z[:, j + 1] = np.nan_to_num(cols[name], nan=0.0)
+    present = {t: ~np.isnan(cols[t]) for t in TARGETS if t in cols}
+    return ['const'] + names, Z, present
+
+def _segment_grams(Z: np.ndarray, ids: np.ndarray):
+    """Z'Z per distinct id (ids need not be sorted). Returns (unique ids, blocks)."""
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    uniques, starts = np.unique(sorted_ids, return_index=True)
+    ends = np.append(starts[1:], len(order))
+    blocks = np.empty((len(uniques), Z.shape[1], Z.shape[1]))
+    for i, (s, e) in enumerate(zip(starts, ends)):
+        rows = Z[order[s:e]]
+        blocks[i] = rows.T @ rows
+    return uniques, blocks
+
+class RegressionCube:
+    """Partition blocks of Z'Z for one dataset version."""
+
+    def __init__(self, state):
+        df = state.df
+        self.version = state.version
+        raw = unimputed_columns(state, REGRESSION_VARS)
+        if raw is None:
+            print("Regression cube: source changed since load, using the imputed frame")
+        self.names, self.Z, present = regression_frame(df, raw)
+        self.column = {name: j for j, name in enumerate(self.names)}
+        self.index = state.index
+        # Via object: pandas' string dtype truncates every value when NaN is present
+        self.ym = df['ym'].astype(object).to_numpy().astype(str) if 'ym' in df.columns else np.full(len(df), '')
+        # Rows without a filing date have no month ('nan' as a string above)
+        dated = df['ym'].notna().to_numpy() if 'ym' in df.columns else np.ones(len(df), dtype=bool)
+
+        dims = [d for d in PARTITION_DIMS if d in df.columns]
+        codes = np.column_stack([pd.factorize(df[d], sort=True)[0] for d in dims]) if dims \
+            else np.zeros((len(df), 1), dtype=np.int64)
+        keys, self.row_partition = np.unique(codes, axis=0, return_inverse=True)
+        self.row_partition = self.row_partition.ravel()
+
+        # Row weights per target (1 = target present); identical patterns share blocks
+        self.weights, self.blocks, self.target_set = [], [], {}
+        patterns = {}
+        for target, mask in present.items():
+            key = np.packbits(mask).tobytes()
+            if key not in patterns:
+                patterns[key] = len(self.weights)
+                self.weights.append(mask.astype(float))
+                self.blocks.append(_segment_grams(self.Z * self.weights[-1][:, None], self.row_partition)[1])
+            self.target_set[target] = patterns[key]
+        if not self.weights:
+            self.weights.append(np.ones(len(df)))
+            self.blocks.append(_segment_grams(self.Z, self.row_partition)[1])
+
+        # Partition attributes used to select whole partitions for a filter
+        first = np.zeros(len(keys), dtype=np.int64)
+        first[self.row_partition[::-1]] = np.arange(len(df))[::-1]
+        self.part_ym = self.ym[first]
+        self.part_dated = dated[first]
+        self.part_values = {d: df[d].to_numpy()[first] for d in dims}
+
+    def _partition_mask(self, ym_from, ym_to, forms, market_conditions):
+        mask = np.ones(len(self.part_ym), dtype=bool)
+        if ym_from or ym_to:
+            # A date bound excludes undated rows, as in FilterIndex and the KPI cube
+            mask &= self.part_dated
+        if ym_from:
+            mask &= self.part_ym >= ym_from
+        if ym_to:
+            mask &= self.part_ym <= ym_to
+        if forms and 'FORM_TYPE' in self.part_values:
+            mask &= pd.Index(self.part_values['FORM_TYPE']).isin(list(forms))
+        if market_conditions and 'MarketCondition' in self.part_values:
+            mask &= pd.Index(self.part_values['MarketCondition']).isin(list(market_conditions))
+        return mask
+
+    def _grams(self, pos: np.ndarray, weights: np.ndarray):
+        return _segment_grams(self.Z[pos] * weights[pos][:, None], self.row_partition[pos])[1]
+
+    def blocks_for(self, target: str, start_date=None, end_date=None, sics=None, forms=None,
+                   market_conditions=None):
+        """
+        (blocks, row_positions): the cross-product blocks whose sum is the
+        filter's Z'Z over the rows where target is present, one per
+        resampling cluster, and those rows.
+        """
+        s = self.target_set.get(target, 0)
+        weights, all_blocks = self.weights[s], self.blocks[s]
+        filters = dict(start_date=start_date, end_date=end_date, sics=sics, forms=forms,
+                       market_conditions=market_conditions)
+        rows = np.sort(self.index.row_positions(**filters))
+        rows = rows[weights[rows] > 0]
+        if sics:
+            # SIC sets cut across partitions: blocks of the filtered rows, partitioned the same way
+            blocks = self._grams(rows, weights)
+            return blocks[blocks[:, 0, 0] > 0], rows
+
+        months, edges = _month_split(start_date, end_date)
+        if months is None:
+            mask = np.zeros(len(all_blocks), dtype=bool)
+        else:
+            mask = self._partition_mask(months[0], months[1], forms, market_conditions)
+        parts = [all_blocks[mask]]
+        for lo, hi in edges:
+            pos = self.index.row_positions(start_date=lo, end_date=hi, forms=forms,
+                                           market_conditions=market_conditions)
+            if len(pos):
+                parts.append(self._grams(pos, weights))
+        blocks = np.concatenate(parts)
+        # Partitions left without a row (every target missing) are no cluster
+        return blocks[blocks[:, 0, 0] > 0], rows
+
+def get_regression_cube(state):
+    """The cube for the given dataset state, built once per dataset version."""
+    global _cube
+    cube = _cube
+    if cube is not None and cube.version == state.version:
+        return cube
+    with _cube_lock:
+        if _cube is None or _cube.version != state.version:
+            _cube = RegressionCube(state)
+            print(f"Regression cube ready: {len(_cube.part_ym)} partitions x {len(_cube.names)} columns")
+        return _cube
+
+def built_regression_cube(state):
+    """The cube of the given dataset state if it has been built (never builds one)."""
+    cube = _cube
+    return cube if cube is not None and cube.version == state.version else None
+
+def _solve(G: np.ndarray, xi: list, yi: int):
+    """OLS pieces from a Z'Z block: (beta, XtX^-1, ssr, n, tss)."""
+    XtX = G[np.ix_(xi, xi)]
+    Xty = G[xi, yi]
+    n = G[0, 0]
+    XtX_inv = np.linalg.pinv(XtX)
+    beta = XtX_inv @ Xty
+    ssr = G[yi, yi] - 2 * beta @ Xty + beta @ XtX @ beta
+    tss = G[yi, yi] - G[0, yi] ** 2 / n if n else 0.0
+    return beta, XtX_inv, max(ssr, 0.0), n, tss
+
+def _hc3(Z: np.ndarray, rows: np.ndarray, xi: list, yi: int, beta: np.ndarray, XtX_inv: np.ndarray):
+    # Sandwich with e_i^2 / (1 - h_ii)^2; chunked so memory stays O(chunk * k)
+    k = len(xi)
+    meat = np.zeros((k, k))
+    for start in range(0, len(rows), 100000):
+        chunk = Z[rows[start:start + 100000]]
+        X = chunk[:, xi]
+        e = chunk[:, yi] - X @ beta
+        h = np.einsum('ij,jk,ik->i', X, XtX_inv, X)
+        w = (e / np.maximum(1 - h, 1e-12)) ** 2
+        meat += (X * w[:, None]).T @ X
+    return XtX_inv @ meat @ XtX_inv
+
+def _bootstrap_batch(blocks: np.ndarray, xi: list, yi: int, seed: int, size: int):
+    rng = np.random.default_rng(seed)
+    m = len(blocks)
+    # Multinomial cluster weights: each replicate draws m partitions with replacement
+    weights = rng.multinomial(m, np.full(m, 1.0 / m), size=size).astype(float)
+    G = np.tensordot(weights, blocks, axes=(1, 0))
+    XtX = G[:, xi][:, :, xi]
+    Xty = G[:, xi, yi]
+    # Batched pseudo-inverse: collinear draws get the same minimum-norm solution as the point estimate
+    return (np.linalg.pinv(XtX) @ Xty[:, :, None])[:, :, 0]
+
+def bootstrap(blocks: np.ndarray, xi: list, yi: int, n_boot: int, seed: int = 0, threads: int = None):
+    """Coefficient draws from a partition (cluster) bootstrap, batches solved in parallel."""
+    sizes = [min(BOOT_BATCH, n_boot - s) for s in range(0, n_boot, BOOT_BATCH)]
+    threads = threads or BOOT_THREADS
+    if threads <= 1 or len(sizes) == 1:
+        draws = [_bootstrap_batch(blocks, xi, yi, seed + i, size) for i, size in enumerate(sizes)]
+    else:
+        # numpy's tensordot/pinv release the GIL, so threads are enough
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            draws = list(pool.map(lambda a: _bootstrap_batch(blocks, xi, yi, *a),
+                                  [(seed + i, size) for i, size in enumerate(sizes)]))
+    return np.vstack(draws)
+
+def run_regression(state, filters: dict, target: str, variables: list, cov_type: str = 'HC3',
+                   n_boot: int = 0, seed: int = 0, alpha: float = 0.05):
+    """OLS of target on const + variables for the filtered rows. Returns a JSON-ready table."""
+    cube = get_regression_cube(state)
+    unknown = [v for v in [target] + list(variables) if v not in cube.column]
+    if unknown:
+        raise ValueError(f"Unknown regression variables: {unknown}")
+    if target in variables:
+        raise ValueError("The target cannot also be a regressor")
+    if cov_type not in COV_TYPES:
+        raise ValueError(f"cov_type must be one of {list(COV_TYPES)}")
+
+    names = ['const'] + [v for v in dict.fromkeys(variables)]
+    xi = [cube.column[v] for v in names]
+    yi = cube.column[target]
+    blocks, rows = cube.blocks_for(target, **filters)
+    G = blocks.sum(axis=0) if len(blocks) else np.zeros((len(cube.names), len(cube.names)))
+    n = int(round(G[0, 0]))
+    k = len(xi)
+    if n <= k:
+        raise ValueError(f"Not enough rows for {k} coefficients ({n})")
+
+    beta, XtX_inv, ssr, _, tss = _solve(G, xi, yi)
+    # Collinear regressors: pinv solution and rank-based dof, as statsmodels does
+    rank = int(np.linalg.matrix_rank(G[np.ix_(xi, xi)]))
+    df_resid = n - rank
+    if cov_type == 'HC3':
+        cov = _hc3(cube.Z, rows, xi, yi, beta, XtX_inv)
+        dist = stats.norm # statsmodels reports z statistics for robust covariances
+    else:
+        cov = XtX_inv * (ssr / df_resid)
+        dist = stats.t(df_resid)
+    se = np.sqrt(np.maximum(np.diag(cov), 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tvalues = beta / se
+    pvalues = 2 * dist.sf(np.abs(tvalues))
+    crit = dist.ppf(1 - alpha / 2)
+
+    r2 = 1 - ssr / tss if tss > 0 else 0.0
+    result = {
+        "target": target,
+        "n": n,
+        "k": k,
+        "rank": rank,
+        "cov_type": cov_type,
+        "r2": float(r2),
+        "adj_r2": float(1 - (1 - r2) * (n - 1) / df_resid),
+        "coefficients": [],
+    }
+    draws = None
+    if n_boot:
+        draws = bootstrap(blocks, xi, yi, n_boot, seed)
+        result["bootstrap"] = {
+            "replicates": int(n_boot),
+            "clusters": int(len(blocks)),
+        }
+    for j, name in enumerate(names):
+        row = {
+            "variable": name,
+            "coef": float(beta[j]),
+            "se": float(se[j]),
+            "stat": float(tvalues[j]),
+            "p": float(pvalues[j]),
+            "ci_low": float(beta[j] - crit * se[j]),
+            "ci_high": float(beta[j] + crit * se[j]),
+        }
+        if draws is not None:
+            d = draws[:, j]
+            row["boot_se"] = float(d.std(ddof=1)) if len(d) > 1 else 0.0
+            row["boot_ci_low"], row["boot_ci_high"] = map(float, np.quantile(d, [alpha / 2, 1 - alpha / 2]))
+        result["coefficients"].append(row)
+    return result
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+
+from .data_manager import current_dataset, build_dataset, publish_dataset, source_version, resolve_path
+from .ml_engine import build_model, publish_model
+from .executor import executor
+
+# Zero-downtime reload of the dataset and the model.
+#
+# The new dataset (snapshot, filter index, KPI cube) and its model are built on
+# a background thread while the old ones keep serving. Both are then published
+# by reference swaps; requests that already hold the old DatasetState /
+# ModelState finish on it. Process workers for the new version are started
+# and loaded first and swapped in right after the publish (see
+# ExecutionLayer.prepare); pool tasks report the version they ran on, so a
+# result from the other side of the swap is never cached under the wrong
+# version (see _heavy in main.py). Every loaded dataset has a version (content
+# hash of the source CSV) that the API exposes in its ETags.
+#
+# Reloads are triggered by POST /api/admin/reload, or by polling the source
+# file every CCTI_RELOAD_INTERVAL seconds (0 = off).
+
+RELOAD_INTERVAL = float(os.environ.get("CCTI_RELOAD_INTERVAL", "0"))
+
+class Reloader:
+    def __init__(self):
+        self.status = "idle"
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self, file_path: str = None):
+        """Starts a background reload unless one is running. Returns the status."""
+        with self._lock:
+            if self.status != "running":
+                self.status = "running"
+                self.error = None
+                self.started = time.time()
+                self.finished = None
+                threading.Thread(target=self._run, args=(file_path,), name="reload", daemon=True).start()
+        return self.stats()
+
+    def _run(self, file_path: str = None):
+        try:
+            self.reload(file_path)
+            status, error = "idle", None
+        except Exception as e:
+            print(f"Reload failed, still serving version {current_dataset().version}: {e}")
+            status, error = "failed", str(e)
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished = time.time()
+
+    def reload(self, file_path: str = None):
+        """Builds and swaps in the dataset and model; returns False when the source is unchanged."""
+        old = current_dataset()
+        path = resolve_path(file_path) if file_path else old.path
+        if path == old.path and source_version(path) == old.version:
+            return False
+
+        t0 = time.time()
+        dataset = build_dataset(path)
+        dataset.cube # built here rather than on the first KPI request after the swap
+        engine = build_model(dataset)
+        # Process workers are started and loaded before anything is published
+        pool = executor.prepare(dataset.path, dataset.version)
+        # Publish together; the model keeps a reference to its own dataset, so
+        # predictions stay consistent even between these two assignments
+        publish_dataset(dataset)
+        publish_model(engine)
+        executor.swap(pool)
+        self.reloads += 1
+        print(f"Reloaded dataset {old.version} -> {dataset.version} "
+              f"({len(dataset.df)} rows) in {time.time() - t0:.1f}s")
+        return True
+
+    def watch(self, interval: float = RELOAD_INTERVAL):
+        """Polls the source file and reloads when its content changes."""
+        if interval <= 0 or self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    state = current_dataset()
+                    if source_version(state.path) != state.version:
+                        self.start()
+                except OSError as e:
+                    print(f"Reload watch: {e}")
+
+        self._thread = threading.Thread(target=loop, name="reload-watch", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+
+    def stats(self):
+        state = current_dataset()
+        return {
+            "status": self.status,
+            "version": state.version,
+            "rows": len(state.df),
+            "loaded_at": state.loaded_at.isoformat(),
+            "reloads": self.reloads,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+reloader = Reloader()
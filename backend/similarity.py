@@ -0,0 +1,87 @@
+import numpy as np
+from sklearn.neighbors import KDTree
+
+# Similarity index behind "Most Similar Historical Filings".
+#
+# Features are standardized (z-scores over the training rows) so no single
+# column dominates the Euclidean distance, and a KD-tree gives O(log n)
+# lookups. Queries can be restricted to a subset of rows (a boolean mask, e.g.
+# the dashboard filters) without rebuilding: the tree is asked for more
+# candidates than needed and disallowed rows are dropped; subsets too small
+# for that to pay off are searched exhaustively instead.
+BRUTE_FORCE_ROWS = 50000 # subsets up to this size are scanned directly
+OVERFETCH = 2.0          # candidates per wanted neighbour, relative to selectivity
+
+class SimilarityIndex:
+    def __init__(self, X, leaf_size: int = 40):
+        X = np.asarray(X, dtype=np.float64)
+        self.mean = X.mean(axis=0)
+        scale = X.std(axis=0)
+        scale[~(scale > 0)] = 1.0
+        self.scale = scale
+        self.data = self.transform(X)
+        self.tree = KDTree(self.data, leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.data)
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+
+    def kneighbors(self, X, n_neighbors: int = 5, allowed: np.ndarray = None):
+        """
+        Returns (distances, indices) of the n_neighbors nearest training rows
+        per query row, in standardized units. With allowed (bool per training
+        row) only those rows are candidates; k shrinks if fewer are allowed.
+        """
+        Q = self.transform(np.atleast_2d(X))
+        if allowed is None:
+            k = min(n_neighbors, len(self))
+            return self.tree.query(Q, k=k) if k else self._empty(len(Q))
+
+        candidates = np.flatnonzero(allowed)
+        k = min(n_neighbors, len(candidates))
+        if k == 0:
+            return self._empty(len(Q))
+        if len(candidates) <= BRUTE_FORCE_ROWS:
+            return self._brute(Q, candidates, k)
+        return self._overfetch(Q, allowed, k)
+
+    def _empty(self, n_queries: int):
+        return np.empty((n_queries, 0)), np.empty((n_queries, 0), dtype=np.intp)
+
+    def _brute(self, Q, candidates, k, chunk: int = 256):
+        sub = self.data[candidates]
+        sub_sq = (sub * sub).sum(axis=1)
+        dist = np.empty((len(Q), k))
+        idx = np.empty((len(Q), k), dtype=np.intp)
+        for start in range(0, len(Q), chunk):
+            q = Q[start:start + chunk]
+            d2 = (q * q).sum(axis=1)[:, None] - 2 * q @ sub.T + sub_sq[None, :]
+            part = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < len(candidates) else \
+                np.broadcast_to(np.arange(len(candidates)), (len(q), len(candidates)))
+            part_d = np.take_along_axis(d2, part, axis=1)
+            order = np.argsort(part_d, axis=1, kind='stable')
+            dist[start:start + len(q)] = np.sqrt(np.clip(np.take_along_axis(part_d, order, axis=1), 0, None))
+            idx[start:start + len(q)] = candidates[np.take_along_axis(part, order, axis=1)]
+        return dist, idx
+
+    def _overfetch(self, Q, allowed, k):
+        # The tree returns neighbours in distance order, so the first k allowed
+        # ones among the fetched candidates are the exact filtered answer
+        n = len(self)
+        fetch = min(n, int(np.ceil(k * OVERFETCH * n / allowed.sum())))
+        dist = np.empty((len(Q), k))
+        idx = np.empty((len(Q), k), dtype=np.intp)
+        todo = np.arange(len(Q))
+        while len(todo):
+            d, i = self.tree.query(Q[todo], k=fetch)
+            ok = allowed[i]
+            done = ok.sum(axis=1) >= k
+            for row in np.flatnonzero(done):
+                keep = np.flatnonzero(ok[row])[:k]
+                dist[todo[row]] = d[row, keep]
+                idx[todo[row]] = i[row, keep]
+            todo = todo[~done]
+            fetch = min(n, fetch * 4)
+        return dist, idx
@@ -0,0 +1,46 @@
+from .data_manager import filter_data, filtered_scan, dataset_version
+from .charts import (
+    compute_ccti_hist, compute_heatmap, compute_heatmaps, compute_scatter, compute_trend_line,
+    scan_ccti_hist, scan_heatmap, scan_heatmaps, scan_scatter, scan_trend_line,
+)
+
+# Top-level (picklable) entry points for the execution layer. Each takes the
+# plain FilterRequest dict, filters inside the worker (using the worker's own
+# filter index and row cache) and returns a JSON-ready result. In partitioned
+# mode every task streams the filter's chunks instead.
+
+def versioned(task, *args):
+    """(dataset version, task(*args)); the version is None if a reload landed while it ran."""
+    version = dataset_version()
+    value = task(*args)
+    return (version if dataset_version() == version else None), value
+
+def ccti_hist_task(filters: dict, bins: int):
+    scan = filtered_scan(filters)
+    if scan is not None:
+        return scan_ccti_hist(scan, bins)
+    return compute_ccti_hist(filter_data(**filters), bins)
+
+def heatmap_task(filters: dict, sentiment_col: str):
+    scan = filtered_scan(filters)
+    if scan is not None:
+        return scan_heatmap(scan, sentiment_col)
+    return compute_heatmap(filter_data(**filters), sentiment_col)
+
+def heatmaps_task(filters: dict, sentiment_cols: list):
+    scan = filtered_scan(filters)
+    if scan is not None:
+        return scan_heatmaps(scan, sentiment_cols)
+    return compute_heatmaps(filter_data(**filters), sentiment_cols)
+
+def scatter_task(filters: dict, vol_cutoff: float, trend: str, trend_on: str):
+    scan = filtered_scan(filters)
+    if scan is not None:
+        return scan_scatter(scan, vol_cutoff, trend, trend_on)
+    return compute_scatter(filter_data(**filters), vol_cutoff, trend, trend_on)
+
+def trend_task(filters: dict, vol_cutoff: float, trend: str, trend_on: str):
+    scan = filtered_scan(filters)
+    if scan is not None:
+        return scan_trend_line(scan, vol_cutoff, trend, trend_on)
+    return compute_trend_line(filter_data(**filters), vol_cutoff, trend, trend_on)
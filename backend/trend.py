@@ -0,0 +1,93 @@
+import numpy as np
+from statsmodels.nonparametric.smoothers_lowess import lowess
+
+# Trend lines for the CCTI vs ExcessRet scatter.
+#   exact  - statsmodels LOWESS on the given points (cost grows with n log n)
+#   binned - local linear regression with a tricube kernel on a fixed grid of
+#            x bins; each bin contributes its exact sums (n, x, y, xx, xy), so
+#            after one O(n) bincount pass the fit costs O(grid^2) regardless of n
+TREND_MODES = ('exact', 'binned')
+DEFAULT_FRAC = 0.1
+DEFAULT_GRID = 200
+
+def _clean(x, y):
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    return x[ok], y[ok]
+
+def exact_trend(x, y, frac: float = DEFAULT_FRAC, max_points: int = None):
+    """Returns (xs, ys) of a LOWESS fit, sorted by x (thinned to max_points)."""
+    x, y = _clean(x, y)
+    if len(x) == 0:
+        return np.empty(0), np.empty(0)
+    z = lowess(y, x, frac=frac)
+    if max_points and len(z) > max_points:
+        z = z[np.unique(np.linspace(0, len(z) - 1, max_points).round().astype(int))]
+    return z[:, 0], z[:, 1]
+
+def binned_trend(x, y, frac: float = DEFAULT_FRAC, grid: int = DEFAULT_GRID):
+    """Returns (xs, ys) evaluated at the mean x of every non-empty grid bin."""
+    x, y = _clean(x, y)
+    if len(x) == 0:
+        return np.empty(0), np.empty(0)
+    lo, hi = x.min(), x.max()
+    if hi == lo:
+        return np.array([lo]), np.array([y.mean()])
+    return fit_bins(bin_sums(x, y, lo, hi, grid), lo, hi, frac, grid)
+
+def bin_sums(x, y, lo: float, hi: float, grid: int = DEFAULT_GRID):
+    """
+    (n, x, y, xx, xy) sums per grid bin over [lo, hi] for the finite pairs;
+    sums from chunks over the same range add up to those of the whole.
+    """
+    x, y = _clean(x, y)
+    idx = np.clip(((x - lo) / (hi - lo) * grid).astype(np.intp), 0, grid - 1)
+    return np.stack([
+        np.bincount(idx, minlength=grid).astype(float),
+        np.bincount(idx, weights=x, minlength=grid),
+        np.bincount(idx, weights=y, minlength=grid),
+        np.bincount(idx, weights=x * x, minlength=grid),
+        np.bincount(idx, weights=x * y, minlength=grid),
+    ])
+
+def fit_bins(sums: np.ndarray, lo: float, hi: float, frac: float = DEFAULT_FRAC, grid: int = DEFAULT_GRID):
+    """The binned LOWESS fit from bin_sums (lo < hi)."""
+    cnt, sx, sy, sxx, sxy = sums
+    n = int(cnt.sum())
+    keep = cnt > 0
+    cnt, sx, sy, sxx, sxy = cnt[keep], sx[keep], sy[keep], sxx[keep], sxy[keep]
+    centers = sx / cnt
+
+    # Nearest-neighbour bandwidth as in LOWESS: the distance that covers frac * n points
+    dist = np.abs(centers[:, None] - centers[None, :])
+    order = np.argsort(dist, axis=1)
+    sorted_dist = np.take_along_axis(dist, order, axis=1)
+    covered = np.cumsum(cnt[order], axis=1)
+    k = max(int(np.ceil(frac * n)), 2)
+    reach = np.minimum((covered < k).sum(axis=1), len(centers) - 1)
+    h = sorted_dist[np.arange(len(centers)), reach]
+    h = np.maximum(h, (hi - lo) / grid) * 1.000001
+
+    w = np.clip(1 - (dist / h[:, None]) ** 3, 0, None) ** 3
+    s0 = w @ cnt
+    s1 = w @ sx
+    s2 = w @ sxx
+    t0 = w @ sy
+    t1 = w @ sxy
+
+    det = s0 * s2 - s1 * s1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (s0 * t1 - s1 * t0) / det
+        intercept = (t0 - slope * s1) / s0
+        fitted = intercept + slope * centers
+    # Locally flat neighbourhoods fall back to the weighted mean
+    flat = ~np.isfinite(fitted) | (np.abs(det) <= 1e-12 * np.maximum(s0 * s2, 1e-300))
+    fitted[flat] = t0[flat] / s0[flat]
+    return centers, fitted
+
+def compute_trend(x, y, mode: str = 'exact', frac: float = DEFAULT_FRAC,
+                  grid: int = DEFAULT_GRID, max_points: int = None):
+    if mode == 'binned':
+        return binned_trend(x, y, frac=frac, grid=grid)
+    return exact_trend(x, y, frac=frac, max_points=max_points)
@@ -0,0 +1 @@
+# Performance benchmarks for the backend on synthetic datasets (python -m benchmarks.run).
@@ -0,0 +1,448 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+
+from .synthetic import SIZES, parse_size, dataset
+
+try:
+    import resource
+except ImportError: # Windows: no rusage, RSS high-water mark is not reported
+    resource = None
+
+# Benchmark suite for the backend on synthetic datasets.
+#
+# Every size runs in its own process (fresh module state, its own snapshot,
+# model and partition directories under the work directory, and a clean RSS
+# high-water mark). Per size it times:
+#   load_data          cold (CSV parse, snapshot write, index, cube) and warm (snapshot)
+#   filter_data        a handful of representative filters, row cache cleared
+#   initialize_model   cold (forest training) and warm (stored artifact)
+#   predict            predict_excess_return (single) and predict_batch (plain / neighbours)
+#   endpoint           every backend/main.py route through the ASGI test client, cold
+#                      (result cache cleared before each call) and warm
+# Each benchmark reports latency percentiles (ms), throughput (calls/s and rows/s
+# where it processes rows), the peak traced allocation of one extra untimed call
+# (tracemalloc, numpy included) and the process RSS high-water mark after it.
+# Work done in process-executor workers is timed but not in the memory figures.
+#
+#   python -m benchmarks.run run --sizes 10k 100k --save-baseline main
+#   python -m benchmarks.run run --sizes 10k --compare main
+#   python -m benchmarks.run compare benchmarks/baselines/main.json benchmarks/results/<run>.json
+#
+# compare flags a benchmark whose p50 grew by more than --threshold (and by at
+# least --min-ms), or whose peak allocation grew by more than --mem-threshold,
+# and exits with status 1 if anything regressed.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+WORK_DIR = os.environ.get("CCTI_BENCH_DIR", os.path.join(BENCH_DIR, ".work"))
+RESULT_VERSION = 1
+PERCENTILES = (50, 90, 95, 99)
+BATCH_ROWS = 10_000
+NEIGHBOR_BATCH_ROWS = 100
+SINGLE_INPUT = dict(CCTI=0.05, Vol_30d=2.0, Momentum_12_1=0.1, BM_w=0.2, Size_w=-0.1,
+                    Negative=0.015, Positive=0.008)
+DEFAULT_THRESHOLD = 0.2
+DEFAULT_MEM_THRESHOLD = 0.2
+DEFAULT_MIN_MS = 1.0
+
+def _rss_hwm():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024) # bytes on macOS, KiB elsewhere
+
+def summarize(durations: list, rows: int = None):
+    ms = np.asarray(durations) * 1000
+    total = float(np.sum(durations))
+    stats = {
+        "n": len(ms),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "max_ms": float(ms.max()),
+        **{f"p{p}_ms": float(np.percentile(ms, p)) for p in PERCENTILES},
+        "ops_per_s": len(ms) / total if total > 0 else None,
+    }
+    if rows is not None:
+        stats["rows"] = int(rows)
+        stats["rows_per_s"] = rows * len(ms) / total if total > 0 else None
+    return stats
+
+class Bench:
+    """Times named callables and collects their stats (errors are recorded, not raised)."""
+
+    def __init__(self, repeat: int, trace: bool = True, only: list = None):
+        self.repeat = repeat
+        self.trace = trace
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name: str):
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def run(self, name: str, fn, setup=None, repeat: int = None, rows=None, warmup: int = 0):
+        """
+        Times fn() repeat times (setup() runs untimed before each call). rows is
+        a row count, or a callable of fn's last result, for rows/s.
+        """
+        if not self.wanted(name):
+            return None
+        repeat = repeat or self.repeat
+        durations, result = [], None
+        try:
+            for i in range(warmup + repeat):
+                if setup is not None:
+                    setup()
+                t0 = time.perf_counter()
+                result = fn()
+                elapsed = time.perf_counter() - t0
+                if i >= warmup:
+                    durations.append(elapsed)
+            stats = summarize(durations, rows(result) if callable(rows) else rows)
+            if self.trace:
+                if setup is not None:
+                    setup()
+                tracemalloc.start()
+                fn()
+                stats["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            print(f"  {name}: FAILED {type(e).__name__}: {e}")
+            self.results[name] = {"error": f"{type(e).__name__}: {e}"}
+            return None
+        stats["rss_hwm_bytes"] = _rss_hwm()
+        self.results[name] = stats
+        print(f"  {name}: p50 {stats['p50_ms']:.2f} ms, p95 {stats['p95_ms']:.2f} ms"
+              + (f", {stats['rows_per_s']:,.0f} rows/s" if stats.get("rows_per_s") else ""))
+        return result
+
+# --- One dataset size (runs in a child process) ---
+
+def _filters(df):
+    """Representative filters: everything, a date window, two SICs, a form, one market condition."""
+    from backend.data_manager import filing_dates
+    dates = filing_dates(df['FILING_DATE'])
+    lo, hi = dates.min(), dates.max()
+    mid = lo + (hi - lo) / 2
+    sics = df['SIC'].dropna().value_counts().index[:2].tolist() if 'SIC' in df.columns else []
+    forms = df['FORM_TYPE'].dropna().value_counts().index[:1].astype(str).tolist() if 'FORM_TYPE' in df.columns else []
+    window = {"start_date": str((mid - (hi - lo) / 6).date()), "end_date": str((mid + (hi - lo) / 6).date())}
+    return {
+        "all": {},
+        "dates": window,
+        "sics": {"sics": [float(s) for s in sics]},
+        "form_dates": {"forms": forms, **window},
+        "market": {"market_conditions": [1], "start_date": window["start_date"]},
+    }
+
+def _endpoint_cases(filters: dict, batch_columns: dict):
+    # (name, method, url, json body, expected statuses); one per route in backend/main.py
+    f = filters["dates"]
+    return [
+        ("init_filters", "GET", "/api/init_filters", None, (200,)),
+        ("metrics", "POST", "/api/metrics", f, (200,)),
+        ("kpis", "POST", "/api/kpis?by_month=true", f, (200,)),
+        ("ccti_distribution", "POST", "/api/charts/ccti_distribution", f, (200,)),
+        ("heatmap", "POST", "/api/charts/heatmap?sentiment_col=Negative", f, (200,)),
+        ("heatmaps", "POST", "/api/charts/heatmap?sentiment_col=all", f, (200,)),
+        ("scatter", "POST", "/api/charts/scatter", f, (200,)),
+        ("scatter.columns", "POST", "/api/charts/scatter?format=columns", f, (200,)),
+        ("scatter.binary", "POST", "/api/charts/scatter?format=binary", f, (200,)),
+        ("trend", "POST", "/api/charts/trend", f, (200,)),
+        ("dashboard", "POST", "/api/dashboard", f, (200,)),
+        ("dashboard.stream", "POST", "/api/dashboard?stream=true", f, (200,)),
+        ("cache_stats", "GET", "/api/cache/stats", None, (200,)),
+        ("executor_stats", "GET", "/api/executor/stats", None, (200,)),
+        ("memory", "GET", "/api/memory", None, (200,)),
+        ("version", "GET", "/api/version", None, (200,)),
+        ("reload", "POST", "/api/admin/reload", None, (202,)),
+        ("feature_importance", "GET", "/api/feature_importance", None, (200,)),
+        ("regression_specs", "GET", "/api/regression/specs", None, (200,)),
+        ("regression", "POST", "/api/regression", f, (200,)),
+        ("backtest", "GET", "/api/backtest", None, (200, 404)), # 404 until a backtest has been run
+        ("predict", "POST", "/api/predict", SINGLE_INPUT, (200,)),
+        ("predict_batch", "POST", "/api/predict/batch", {"columns": batch_columns}, (200,)),
+    ]
+
+def _call(client, method: str, url: str, body, expected: tuple):
+    response = client.request(method, url, json=body)
+    if response.status_code not in expected:
+        raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.text[:200]}")
+    return response
+
+def _importance_job(client, filters: dict):
+    # Submit a job and poll it to completion (covers both job routes)
+    job = _call(client, "POST", "/api/feature_importance/jobs?method=impurity", filters, (200,)).json()
+    while job.get("status") not in ("done", "failed"):
+        time.sleep(0.005)
+        job = _call(client, "GET", f"/api/feature_importance/jobs/{job['job_id']}", None, (200,)).json()
+    if job["status"] == "failed":
+        raise RuntimeError(f"Importance job failed: {job.get('error')}")
+    return job
+
+def run_size(csv_path: str, repeat: int, heavy_repeat: int, trace: bool = True, only: list = None):
+    """All benchmarks on one dataset; returns {benchmark: stats}. Expects an isolated environment."""
+    from fastapi.testclient import TestClient
+    from backend import data_manager, model_store
+    from backend.data_manager import build_dataset, publish_dataset, filter_data, current_dataset
+    from backend.cache import result_cache
+    from backend.ml_engine import (
+        build_model, publish_model, predict_excess_return, predict_batch, feature_matrix, INPUT_COLS,
+    )
+    from backend.main import app
+
+    bench = Bench(repeat, trace, only)
+
+    def clear_snapshots():
+        shutil.rmtree(data_manager.SNAPSHOT_DIR, ignore_errors=True)
+        shutil.rmtree(data_manager.PARTITION_DIR, ignore_errors=True)
+
+    print(f"Dataset: {csv_path}")
+    bench.run("load_data.cold", lambda: build_dataset(csv_path), setup=clear_snapshots,
+              repeat=heavy_repeat, rows=lambda s: len(s.df))
+    bench.run("load_data.warm", lambda: build_dataset(csv_path), rows=lambda s: len(s.df))
+    state = build_dataset(csv_path)
+    publish_dataset(state)
+    n_rows = len(state.df)
+
+    filters = _filters(state.df)
+    for name, f in filters.items():
+        bench.run(f"filter_data.{name}", lambda f=f: filter_data(**f), setup=result_cache.clear, rows=len)
+
+    def clear_models():
+        shutil.rmtree(model_store.MODEL_DIR, ignore_errors=True)
+
+    bench.run("initialize_model.cold", lambda: build_model(current_dataset()), setup=clear_models,
+              repeat=heavy_repeat, rows=n_rows)
+    bench.run("initialize_model.warm", lambda: build_model(current_dataset()), rows=n_rows)
+    publish_model(build_model(current_dataset()))
+
+    rng = np.random.default_rng(0)
+    sample = rng.integers(0, n_rows, BATCH_ROWS)
+    columns = {c: state.df[c].to_numpy(dtype=float)[sample] for c in INPUT_COLS if c in state.df.columns}
+    X = feature_matrix(columns)
+    bench.run("predict.single", lambda: predict_excess_return(dict(SINGLE_INPUT)), repeat=repeat * 5, rows=1)
+    bench.run("predict.single_filtered",
+              lambda: predict_excess_return({**SINGLE_INPUT, "filters": filters["dates"]}),
+              repeat=repeat * 5, rows=1)
+    bench.run("predict.batch", lambda: predict_batch(X), rows=len(X))
+    bench.run("predict.batch_neighbors", lambda: predict_batch(X[:NEIGHBOR_BATCH_ROWS], neighbors=True),
+              rows=NEIGHBOR_BATCH_ROWS)
+
+    batch_columns = {c: v[:1000].tolist() for c, v in columns.items()}
+    with TestClient(app) as client:
+        covered = set()
+        for name, method, url, body, expected in _endpoint_cases(filters, batch_columns):
+            covered.add((method, url.split("?")[0]))
+            if not bench.wanted(f"endpoint.{name}."):
+                continue
+            call = lambda m=method, u=url, b=body, e=expected: _call(client, m, u, b, e)
+            call() # warms the worker pool and lazily built structures
+            bench.run(f"endpoint.{name}.cold", call, setup=result_cache.clear)
+            bench.run(f"endpoint.{name}.warm", call)
+        covered |= {("POST", "/api/feature_importance/jobs"), ("GET", "/api/feature_importance/jobs/{job_id}")}
+        bench.run("endpoint.feature_importance_job.cold", lambda: _importance_job(client, filters["dates"]),
+                  setup=result_cache.clear, repeat=heavy_repeat)
+
+        routes = {(m, r.path) for r in app.routes if r.path.startswith("/api/") for m in getattr(r, "methods", ())}
+        missing = sorted(routes - covered)
+        if missing:
+            print(f"  Routes without a benchmark: {missing}")
+    return {"rows": n_rows, "uncovered_routes": [list(r) for r in missing], "benchmarks": bench.results}
+
+# --- Runs, baselines and comparison ---
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def environment():
+    import pandas as pd
+    import sklearn
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {k: v for k, v in os.environ.items() if k.startswith("CCTI_")},
+    }
+
+def _isolated_env(n_rows: int):
+    # Snapshots, models, partitions and backtests of this size live under the work directory
+    base = os.path.join(WORK_DIR, f"state-{n_rows}")
+    env = dict(os.environ)
+    env.update({
+        "CCTI_SNAPSHOT_DIR": os.path.join(base, "snapshots"),
+        "CCTI_MODEL_DIR": os.path.join(base, "models"),
+        "CCTI_PARTITION_DIR": os.path.join(base, "partitions"),
+        "CCTI_BACKTEST_DIR": os.path.join(base, "backtest"),
+        "PYTHONPATH": os.pathsep.join(p for p in (ROOT, env.get("PYTHONPATH")) if p),
+    })
+    return env
+
+def run(sizes: list, repeat: int, heavy_repeat: int, trace: bool = True, only: list = None, seed: int = 0):
+    """Benchmarks every size in a child process; returns the result document."""
+    doc = {"version": RESULT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+           "environment": environment(), "repeat": repeat, "heavy_repeat": heavy_repeat, "sizes": {}}
+    for n_rows in sizes:
+        csv_path = dataset(n_rows, os.path.join(WORK_DIR, "data"), seed)
+        out = os.path.join(WORK_DIR, f"size-{n_rows}-{os.getpid()}.json")
+        cmd = [sys.executable, "-m", "benchmarks.run", "size", csv_path, out,
+               "--repeat", str(repeat), "--heavy-repeat", str(heavy_repeat)]
+        if not trace:
+            cmd.append("--no-trace")
+        if only:
+            cmd += ["--only", *only]
+        print(f"=== {n_rows} rows ===")
+        t0 = time.time()
+        proc = subprocess.run(cmd, env=_isolated_env(n_rows), cwd=ROOT)
+        if proc.returncode != 0 or not os.path.exists(out):
+            doc["sizes"][str(n_rows)] = {"error": f"benchmark process exited with {proc.returncode}"}
+            continue
+        with open(out) as f:
+            doc["sizes"][str(n_rows)] = json.load(f)
+        os.remove(out)
+        print(f"=== {n_rows} rows done in {time.time() - t0:.0f}s ===")
+    return doc
+
+def save(doc: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp, path)
+    print(f"Results written: {path}")
+    return path
+
+def baseline_path(name: str):
+    # A name refers to benchmarks/baselines/<name>.json, anything with a separator or .json is a path
+    if os.sep in name or name.endswith(".json"):
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def compare(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD,
+            mem_threshold: float = DEFAULT_MEM_THRESHOLD, min_ms: float = DEFAULT_MIN_MS):
+    """
+    Rows of (size, benchmark, base p50, current p50, ratio, base peak, current
+    peak, verdict) for the benchmarks present in both; verdict is "regression",
+    "improvement", "error" or "".
+    """
+    rows = []
+    for size, cur_size in current.get("sizes", {}).items():
+        base_size = baseline.get("sizes", {}).get(size)
+        if not base_size or "benchmarks" not in base_size or "benchmarks" not in cur_size:
+            continue
+        for name, cur in cur_size["benchmarks"].items():
+            base = base_size["benchmarks"].get(name)
+            if base is None:
+                continue
+            if "error" in cur or "error" in base:
+                verdict = "error" if "error" in cur else ""
+                rows.append((size, name, base.get("p50_ms"), cur.get("p50_ms"), None, None, None, verdict))
+                continue
+            b, c = base["p50_ms"], cur["p50_ms"]
+            ratio = c / b if b > 0 else None
+            verdict = ""
+            if ratio is not None and ratio > 1 + threshold and c - b >= min_ms:
+                verdict = "regression"
+            elif ratio is not None and ratio < 1 / (1 + threshold) and b - c >= min_ms:
+                verdict = "improvement"
+            bm, cm = base.get("peak_traced_bytes"), cur.get("peak_traced_bytes")
+            if bm and cm and cm > bm * (1 + mem_threshold) and cm - bm >= 1 << 20:
+                verdict = "regression"
+            rows.append((size, name, b, c, ratio, bm, cm, verdict))
+    return rows
+
+def _mb(value):
+    return f"{value / 2 ** 20:.1f}" if value else "-"
+
+def print_comparison(rows: list):
+    print(f"{'rows':>9} {'benchmark':<42} {'base p50':>10} {'p50':>10} {'ratio':>6} "
+          f"{'base MB':>8} {'MB':>8}  verdict")
+    for size, name, b, c, ratio, bm, cm, verdict in rows:
+        fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+        print(f"{size:>9} {name:<42} {fmt(b):>10} {fmt(c):>10} "
+              f"{(f'{ratio:.2f}' if ratio else '-'):>6} {_mb(bm):>8} {_mb(cm):>8}  {verdict}")
+    regressions = sum(r[-1] in ("regression", "error") for r in rows)
+    print(f"{len(rows)} benchmarks compared, {regressions} regressed")
+    return regressions
+
+def _load(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend benchmarks on synthetic filings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Run the suite")
+    p_run.add_argument("--sizes", nargs="+", default=["10k", "100k"],
+                       help="Row counts or any of: " + ", ".join(SIZES))
+    p_run.add_argument("--repeat", type=int, default=20, help="Timed calls per benchmark")
+    p_run.add_argument("--heavy-repeat", type=int, default=2, help="Timed calls for cold loads and training")
+    p_run.add_argument("--only", nargs="+", help="Run benchmarks whose name contains any of these")
+    p_run.add_argument("--no-trace", action="store_true", help="Skip the tracemalloc peak-memory pass")
+    p_run.add_argument("--seed", type=int, default=0, help="Synthetic data seed")
+    p_run.add_argument("--out", help="Result file (default benchmarks/results/<timestamp>.json)")
+    p_run.add_argument("--save-baseline", metavar="NAME", help="Also store the results as a baseline")
+    p_run.add_argument("--compare", metavar="BASELINE", help="Compare against a baseline name or file")
+    p_run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p_run.add_argument("--mem-threshold", type=float, default=DEFAULT_MEM_THRESHOLD)
+    p_run.add_argument("--min-ms", type=float, default=DEFAULT_MIN_MS)
+
+    p_cmp = sub.add_parser("compare", help="Compare two result files")
+    p_cmp.add_argument("baseline", help="Baseline name or file")
+    p_cmp.add_argument("current", help="Result file")
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    p_cmp.add_argument("--mem-threshold", type=float, default=DEFAULT_MEM_THRESHOLD)
+    p_cmp.add_argument("--min-ms", type=float, default=DEFAULT_MIN_MS)
+
+    # Internal: one size in an isolated process (see run)
+    p_size = sub.add_parser("size")
+    p_size.add_argument("csv")
+    p_size.add_argument("out")
+    p_size.add_argument("--repeat", type=int, default=20)
+    p_size.add_argument("--heavy-repeat", type=int, default=2)
+    p_size.add_argument("--only", nargs="+")
+    p_size.add_argument("--no-trace", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "size":
+        result = run_size(args.csv, args.repeat, args.heavy_repeat, not args.no_trace, args.only)
+        save(result, args.out)
+        return 0
+
+    if args.command == "compare":
+        rows = compare(_load(baseline_path(args.baseline)), _load(args.current),
+                       args.threshold, args.mem_threshold, args.min_ms)
+        return 1 if print_comparison(rows) else 0
+
+    sizes = [parse_size(s) for s in args.sizes]
+    doc = run(sizes, args.repeat, args.heavy_repeat, not args.no_trace, args.only, args.seed)
+    save(doc, args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json"))
+    if args.save_baseline:
+        save(doc, baseline_path(args.save_baseline))
+    if args.compare:
+        rows = compare(_load(baseline_path(args.compare)), doc, args.threshold, args.mem_threshold, args.min_ms)
+        return 1 if print_comparison(rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
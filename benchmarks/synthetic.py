@@ -0,0 +1,141 @@
+import os
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+# Synthetic filings with the schema of final_with_CCTI.csv, for benchmarking
+# at sizes the real sample does not reach.
+#
+# Rows are drawn per firm (name, CIK and SIC stay fixed for a firm) with
+# filing dates over 1994-2024, a month-level market regime, word-list
+# proportions, winsorized-style controls and an excess return that depends on
+# CCTI and CCTI^2, so the model and the regressions have signal to fit. About
+# 1% of the numeric controls are missing, which exercises the imputation.
+# The CSV is written in chunks, so even 10M rows never sit in memory at once;
+# the output is deterministic for a given (rows, seed).
+#
+#   python -m benchmarks.synthetic --rows 1000000 --out filings_1m.csv
+
+COLUMNS = [
+    'CoName', 'FILING_DATE', 'ACC_NUM', 'FORM_TYPE', 'SIC',
+    'Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining',
+    'BM_w', 'Size_w', 'dAsset_w', 'ROE_w', 'Momentum_12_1', 'Vol_30d', 'Return_30D_new', 'ExcessRet',
+    'MarketCondition', 'CCTI', 'CCTI_MC', 'CCTI_sq',
+]
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+CHUNK_ROWS = 250_000
+FIRST_DAY = np.datetime64('1994-01-01')
+N_DAYS = int((np.datetime64('2024-12-31') - FIRST_DAY).astype(np.int64)) + 1
+FORMS = ['10-K', '10-K405', '10-KSB', '10-K/A']
+FORM_WEIGHTS = [0.72, 0.1, 0.1, 0.08]
+SIC_CODES = [
+    1311, 1381, 2834, 2836, 2860, 3312, 3571, 3572, 3576, 3661, 3674, 3714,
+    3841, 3845, 4813, 4911, 4931, 5311, 5812, 6021, 6022, 6141, 6311, 6798,
+    7370, 7372, 7373, 8062, 8731, 9995,
+]
+# Word-list proportion parameters (gamma shape, scale) per category
+SENTIMENT = {
+    'Negative': (4.0, 0.004), 'Positive': (4.0, 0.002), 'Uncertainty': (4.0, 0.003),
+    'Litigious': (3.0, 0.004), 'StrongModal': (3.0, 0.001), 'WeakModal': (3.0, 0.001),
+    'Constraining': (3.0, 0.002),
+}
+MISSING_RATE = 0.01
+
+def parse_size(value: str):
+    """'100k', '1m' or a plain row count."""
+    return SIZES.get(value.lower()) or int(float(value))
+
+def _firms(n_rows: int, seed: int):
+    rng = np.random.default_rng([seed, 0])
+    n = max(20, n_rows // 40)
+    ciks = rng.choice(np.arange(1_000, 2_000_000), size=n, replace=False)
+    return {
+        "name": np.array([f"SYNTHETIC FIRM {i:07d} INC" for i in range(n)], dtype=object),
+        "cik": ciks,
+        "sic": np.array([f"{c}.0" for c in rng.choice(SIC_CODES, size=n)], dtype=object), # as in the source CSV
+        "size": rng.normal(0, 1, n), # persistent firm characteristics
+        "bm": rng.normal(0, 1, n),
+    }
+
+def _regimes(seed: int):
+    # Bull (1) / bear (0) market per calendar month, as runs of a few months
+    rng = np.random.default_rng([seed, 1])
+    months = N_DAYS // 28 + 2
+    return (np.cumsum(rng.random(months) < 0.15) % 2 == 0).astype(np.int64)
+
+def _chunk(start: int, n: int, firms: dict, regimes: np.ndarray, seed: int):
+    rng = np.random.default_rng([seed, 2, start])
+    firm = rng.integers(0, len(firms["cik"]), n)
+    days = rng.integers(0, N_DAYS, n)
+    dates = FIRST_DAY + days.astype('timedelta64[D]')
+    month = (dates.astype('datetime64[M]') - FIRST_DAY.astype('datetime64[M]')).astype(np.int64)
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+
+    df = pd.DataFrame({
+        'CoName': firms["name"][firm],
+        'FILING_DATE': pd.Series(dates).dt.strftime('%Y-%m-%d'),
+        # CIK-YY-sequence like EDGAR accession numbers, sequence from the row number
+        'ACC_NUM': [f"{c:010d}-{y % 100:02d}-{s:06d}" for c, y, s in
+                    zip(firms["cik"][firm], years, (start + np.arange(n)) % 1_000_000)],
+        'FORM_TYPE': rng.choice(FORMS, size=n, p=FORM_WEIGHTS),
+        'SIC': firms["sic"][firm],
+    })
+    for col, (shape, scale) in SENTIMENT.items():
+        df[col] = rng.gamma(shape, scale, n)
+
+    df['BM_w'] = np.clip(firms["bm"][firm] + rng.normal(0, 0.5, n), -3, 3)
+    df['Size_w'] = np.clip(firms["size"][firm] + rng.normal(0, 0.3, n), -3, 3)
+    df['dAsset_w'] = np.clip(rng.normal(0.05, 0.2, n), -0.5, 1.0)
+    df['ROE_w'] = np.clip(rng.normal(0.08, 0.25, n), -1.0, 1.0)
+    df['Momentum_12_1'] = np.clip(rng.normal(0.1, 0.4, n), -0.9, 2.0)
+    df['Vol_30d'] = rng.gamma(2.0, 1.2, n)
+    market = regimes[month]
+
+    # Text complexity: more uncertain/negative language, plus noise
+    ccti = (df['Uncertainty'] + df['Negative'] - df['Positive']) * 10 - 0.2 + rng.normal(0, 0.15, n)
+    ret = rng.normal(0.005, 0.12, n) + np.where(market == 1, 0.01, -0.01)
+    excess = (ret - 0.004 - 0.02 * ccti + 0.05 * ccti ** 2
+              + 0.003 * df['BM_w'] - 0.002 * df['Size_w'] + rng.normal(0, 0.05, n))
+    df['Return_30D_new'] = ret
+    df['ExcessRet'] = excess
+    df['MarketCondition'] = market
+    df['CCTI'] = ccti
+    df['CCTI_MC'] = ccti * market
+    df['CCTI_sq'] = ccti ** 2
+
+    for col in ('BM_w', 'Momentum_12_1', 'Vol_30d'):
+        df.loc[rng.random(n) < MISSING_RATE, col] = np.nan
+    return df[COLUMNS]
+
+def generate(n_rows: int, out_path: str, seed: int = 0, chunk_rows: int = CHUNK_ROWS):
+    """Writes n_rows synthetic filings to out_path (atomically) and returns the path."""
+    t0 = time.time()
+    firms = _firms(n_rows, seed)
+    regimes = _regimes(seed)
+    tmp = f"{out_path}.tmp-{os.getpid()}"
+    with open(tmp, "w", newline="") as f:
+        for start in range(0, n_rows, chunk_rows):
+            n = min(chunk_rows, n_rows - start)
+            _chunk(start, n, firms, regimes, seed).to_csv(
+                f, header=start == 0, index=False, float_format='%.10g'
+            )
+    os.replace(tmp, out_path)
+    print(f"Generated {n_rows} synthetic filings: {out_path} in {time.time() - t0:.1f}s")
+    return out_path
+
+def dataset(n_rows: int, directory: str, seed: int = 0):
+    """Path of the synthetic CSV for (n_rows, seed) in directory, generated on first use."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic-{n_rows}-s{seed}.csv")
+    if not os.path.exists(path):
+        generate(n_rows, path, seed)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic filings with the final_with_CCTI.csv schema.")
+    parser.add_argument("--rows", default="100k", help="Row count or one of: " + ", ".join(SIZES))
+    parser.add_argument("--out", required=True, help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(parse_size(args.rows), args.out, args.seed)
@@ -42,25 +42,24 @@ function App() {
   const fetchData = async () => {
     setLoading(true);
     try {
-      // Parallel requests for performance
-      const [mRes, hRes, hmRes, sRes] = await Promise.all([
-        axios.post(`${API_URL}/api/metrics`, filters),
-        axios.post(`${API_URL}/api/charts/ccti_distribution`, filters),
-        axios.post(`${API_URL}/api/charts/heatmap?sentiment_col=${sentimentCol}`, filters),
-        axios.post(`${API_URL}/api/charts/scatter`, filters)
-      ]);
+      // One batched request: the backend filters once and computes all panels together
+      const res = await axios.post(
+        `${API_URL}/api/dashboard?sentiment_col=${sentimentCol}`,
+        filters
+      );
+      const { metrics: m, ccti_distribution, heatmap, scatter } = res.data;
 
       setMetrics({
-        total: mRes.data.total_filings,
-        ccti: mRes.data.avg_ccti,
-        ret: mRes.data.avg_excess_ret,
-        vol: mRes.data.avg_vol
+        total: m.total_filings,
+        ccti: m.avg_ccti,
+        ret: m.avg_excess_ret,
+        vol: m.avg_vol
       });
 
       setCharts({
-        hist: hRes.data,
-        heatmap: hmRes.data,
-        scatter: sRes.data
+        hist: ccti_distribution,
+        heatmap: heatmap,
+        scatter: scatter
       });
       setSelectedFiling(null); // Reset selection on new filter
 
@@ -122,7 +121,7 @@ function App() {
         <FilingDetailsCard filing={selectedFiling} />
       </div>
 
-      <PredictionSimulator />
+      <PredictionSimulator filters={filters} />
       <Analytics />
     </DashboardLayout>
   );
@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import { Play, TrendingUp, Search } from 'lucide-react';
 import axios from 'axios';
 
-export default function PredictionSimulator() {
+export default function PredictionSimulator({ filters }) {
   const [inputs, setInputs] = useState({
     CCTI: -1.9,
     Vol_30d: 0.05,
@@ -25,7 +25,8 @@ export default function PredictionSimulator() {
     setLoading(true);
     try {
       const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
-      const res = await axios.post(`${API_URL}/api/predict`, inputs);
+      // Similar filings are searched within the dashboard's current filters
+      const res = await axios.post(`${API_URL}/api/predict`, { ...inputs, filters });
       setResult(res.data);
     } catch (err) {
       console.error(err);
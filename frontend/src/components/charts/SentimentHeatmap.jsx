@@ -18,7 +18,7 @@ export default function SentimentHeatmap({ data, selectedSentiment, onSentimentC
                     value={selectedSentiment}
                     onChange={(e) => onSentimentChange(e.target.value)}
                 >
-                    {['Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal'].map(s => (
+                    {['Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining'].map(s => (
                         <option key={s} value={s}>{s}</option>
                     ))}
                 </select>
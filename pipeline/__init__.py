@@ -0,0 +1 @@
+# Offline text/data pipeline that turns raw EDGAR filings into dataset columns.
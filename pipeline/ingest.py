@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+from backend.data_manager import write_snapshot, read_snapshot
+from .mda import iter_corpus, filing_paths
+
+# Incremental ingestion: raw EDGAR filings -> MD&A -> LM counts -> VADER scores
+# -> CCTI, plus filing metadata -> event returns, appended to a columnar store
+# instead of the aapl_filings_with_*.xlsx round-trips.
+#
+# A manifest records, per filing, its content hash and the version of every
+# stage that produced its current row. A run only pushes through a stage the
+# filings that are new, whose content changed, or whose recorded stage version
+# is stale; unchanged files are recognised by size + mtime without re-hashing,
+# so a daily run costs one stat() per old filing plus the work for new ones.
+#
+# Text stages (lm, vader) score the MD&A text. Row stages work on columns that
+# other stages produced and rerun for a filing whenever one of those did:
+#   ccti     CCTI = Positive - Negative - Uncertainty and CCTI_sq, from the LM
+#            counts (final_replication's definition)
+#   returns  pipeline.returns.event_returns for the filing's Ticker and
+#            FILING_DATE; Return_30D_new, ExcessRet (needs --rf) and Vol_30d
+#            are its 30-trading-day columns
+# Ticker, FILING_DATE and the other identifiers (CoName, ACC_NUM, FORM_TYPE,
+# SIC) are not in the filing bodies; they come from --filings-index, a CSV
+# keyed by file name, and a filing's row is refreshed when its index row
+# changes.
+#
+# Not covered here: the LDA topics (Dominant_Topic_*) are fit on the whole
+# corpus at once and feed none of the backend's columns; the fundamentals
+# (BM_w, Size_w, dAsset_w, ROE_w) come from pipeline.xbrl; Momentum_12_1 and
+# MarketCondition still come from the external panel. --export lists the
+# backend columns a store is still missing.
+#
+# Store layout (CCTI_INGEST_DIR, default pipeline/.cache/ingest):
+#   manifest.json           file -> {sha256, size, mtime_ns, stages, part}
+#   text/<sha[:2]>/<sha>    extracted MD&A per content hash (re-scoring skips extraction)
+#   parts/part-NNNNNN/      one columnar part per run (backend snapshot format)
+# A filing's current row is in the part the manifest names for it, so a run
+# opens only the parts of the filings it touches. Parts left without a current
+# row are deleted after each run, and once more than COMPACT_PARTS remain
+# they are folded back into one (as --compact does on demand).
+#
+#   python -m pipeline.ingest apple_sec_file --lm-dictionary LM_MasterDictionary.csv --vader \
+#       --filings-index filings.csv --prices prices.csv --benchmark SPY --rf F-F_daily.csv
+#   python -m pipeline.ingest --export aapl_filings_ingested.csv
+
+MANIFEST_VERSION = 1
+MDA_VERSION = 1 # bump when pipeline.mda's extraction rules change
+CCTI_VERSION = 1
+RETURNS_VERSION = 1
+RETURN_HORIZON = 30 # trading days behind Return_30D_new / ExcessRet / Vol_30d
+CACHE_DIR = os.environ.get(
+    "CCTI_PIPELINE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+STORE_DIR = os.environ.get("CCTI_INGEST_DIR", os.path.join(CACHE_DIR, "ingest"))
+COMPACT_PARTS = int(os.environ.get("CCTI_INGEST_COMPACT_PARTS", "32")) # live parts before an automatic compact
+MDA_COLUMNS = ['form_type', 'found', 'section', 'chars']
+# Columns backend.data_manager reads from final_with_CCTI.csv
+BACKEND_COLUMNS = [
+    'CoName', 'FILING_DATE', 'ACC_NUM', 'FORM_TYPE', 'SIC',
+    'Negative', 'Positive', 'Uncertainty', 'Litigious', 'StrongModal', 'WeakModal', 'Constraining',
+    'BM_w', 'Size_w', 'dAsset_w', 'ROE_w', 'Momentum_12_1', 'Vol_30d', 'Return_30D_new', 'ExcessRet',
+    'MarketCondition', 'CCTI', 'CCTI_sq',
+]
+
+def file_sha256(path: str):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class LexiconStage:
+    name = 'lm'
+    depends = ('mda',)
+
+    def __init__(self, dictionary: str, stopwords: bool = False):
+        from .lexicon import LEXICON_VERSION, load_lexicon, nltk_stopwords, _file_hash
+        self.lexicon = load_lexicon(dictionary)
+        self.stopwords = nltk_stopwords() if stopwords else None
+        # A different dictionary (or stopword setting) rescoring everything is intended
+        self.version = f"{LEXICON_VERSION}-{_file_hash(dictionary)[:12]}" + ("-sw" if stopwords else "")
+
+    def run(self, texts: list):
+        return self.lexicon.score(texts, self.stopwords)
+
+class VaderStage:
+    name = 'vader'
+    depends = ('mda',)
+
+    def __init__(self, workers: int = None):
+        from .vader import VADER_CACHE_VERSION, analyzer_id
+        # A different analyzer (or lexicon) rescores, as its cache entries differ too
+        self.version = f"{VADER_CACHE_VERSION}-{analyzer_id()}"
+        self.workers = workers
+
+    def run(self, texts: list):
+        from .vader import score_documents
+        return score_documents(texts, self.workers)
+
+class CCTIStage:
+    name = 'ccti'
+    depends = ('lm',)
+    rows = True # works on the row's columns, not the text
+
+    def __init__(self):
+        self.version = str(CCTI_VERSION)
+
+    def run(self, rows: pd.DataFrame):
+        cols = {c: pd.to_numeric(rows[c], errors='coerce') if c in rows.columns else np.nan
+                for c in ('Positive', 'Negative', 'Uncertainty')}
+        ccti = cols['Positive'] - cols['Negative'] - cols['Uncertainty']
+        return pd.DataFrame({'CCTI': ccti, 'CCTI_sq': ccti ** 2}, index=rows.index)
+
+class ReturnsStage:
+    name = 'returns'
+    depends = ('meta',)
+    rows = True
+
+    def __init__(self, prices: str, benchmark: str = None, rf: str = None, horizons=None):
+        from .returns import HORIZONS, load_panel, load_rf, _file_hash
+        self.panel = load_panel(prices)
+        self.rf = load_rf(rf) if rf else None
+        self.benchmark = benchmark
+        self.horizons = sorted(set(horizons or HORIZONS) | {RETURN_HORIZON})
+        # New prices, benchmark or risk-free data recompute every filing (one vectorized pass)
+        inputs = [_file_hash(prices), _file_hash(rf) if rf else "", benchmark or "", self.horizons]
+        digest = hashlib.sha256(json.dumps(inputs).encode()).hexdigest()
+        self.version = f"{RETURNS_VERSION}-{digest[:12]}"
+
+    def run(self, rows: pd.DataFrame):
+        from .returns import event_returns
+        missing = [c for c in ('Ticker', 'FILING_DATE') if c not in rows.columns]
+        if missing:
+            raise ValueError(f"Returns need {missing} from --filings-index")
+        out = event_returns(rows['Ticker'].astype(str), rows['FILING_DATE'], self.panel,
+                            self.horizons, self.benchmark, self.rf)
+        out.index = rows.index
+        out['EventDate'] = out['EventDate'].astype('datetime64[ns]')
+        h = RETURN_HORIZON
+        out['Return_30D_new'] = out[f'Ret_{h}d']
+        if f'ExcessRet_{h}d' in out.columns:
+            out['ExcessRet'] = out[f'ExcessRet_{h}d']
+        return out
+
+class FilingIndex:
+    """Filing metadata (Ticker, FILING_DATE, CoName, ...) from a CSV with a 'file' column."""
+
+    def __init__(self, path: str):
+        df = pd.read_csv(path, dtype=str)
+        if 'file' not in df.columns:
+            raise ValueError(f"{path} needs a 'file' column with the filing file names")
+        df['file'] = df['file'].map(os.path.basename)
+        self.frame = df.drop_duplicates('file', keep='last').set_index('file')
+        # A filing's 'meta' version is the hash of its index row
+        self.versions = {
+            name: hashlib.sha256(json.dumps(values, default=str).encode()).hexdigest()[:12]
+            for name, values in zip(self.frame.index, self.frame.itertuples(index=False, name=None))
+        }
+
+    def version(self, name: str):
+        return self.versions.get(name)
+
+def _decoded(part: pd.DataFrame):
+    # Snapshot strings come back categorical; rows here are edited and merged
+    # across parts, so they are plain values again
+    return part.astype({c: object for c in part.columns if isinstance(part[c].dtype, pd.CategoricalDtype)})
+
+class IngestStore:
+    def __init__(self, root: str = None):
+        self.root = root or STORE_DIR
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        self.parts_dir = os.path.join(self.root, "parts")
+        self.text_dir = os.path.join(self.root, "text")
+        self.filings = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self.filings = manifest["filings"]
+            else:
+                print(f"Manifest version changed, re-ingesting everything: {self.manifest_path}")
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.manifest_path}.tmp-{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "filings": self.filings}, f)
+        os.replace(tmp, self.manifest_path)
+
+    # MD&A text, addressed by the filing's content hash
+    def _text_path(self, sha: str):
+        return os.path.join(self.text_dir, sha[:2], sha)
+
+    def put_text(self, sha: str, text: str):
+        path = self._text_path(sha)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def get_text(self, sha: str):
+        with open(self._text_path(sha), encoding='utf-8') as f:
+            return f.read()
+
+    def part_names(self):
+        if not os.path.isdir(self.parts_dir):
+            return []
+        return sorted(p for p in os.listdir(self.parts_dir) if p.startswith("part-") and ".tmp-" not in p)
+
+    def append(self, rows: pd.DataFrame):
+        parts = self.part_names()
+        number = int(parts[-1].split('-')[1]) + 1 if parts else 0
+        name = f"part-{number:06d}"
+        os.makedirs(self.parts_dir, exist_ok=True)
+        write_snapshot(rows.reset_index(drop=True), os.path.join(self.parts_dir, name))
+        return name
+
+    def live_parts(self, files=None):
+        """{part: files whose current row it holds} for files (every filing by default), per the manifest."""
+        parts = {}
+        for name in (self.filings if files is None else files):
+            entry = self.filings.get(name)
+            if entry is not None:
+                parts.setdefault(entry["part"], []).append(name)
+        return parts
+
+    def read(self, files=None):
+        """
+        Current row per filing. Only the parts the manifest points files at
+        are opened, so a run's lookup does not grow with the number of parts.
+        """
+        existing = set(self.part_names())
+        frames = []
+        for name, wanted in sorted(self.live_parts(files).items()):
+            if name not in existing:
+                continue
+            part = read_snapshot(os.path.join(self.parts_dir, name))
+            frames.append(_decoded(part[part['file'].isin(wanted)]))
+        if not frames:
+            return pd.DataFrame(columns=['file', 'sha256'])
+        df = pd.concat(frames, ignore_index=True)
+        current = df['file'].map(lambda f: self.filings.get(f, {}).get("sha256"))
+        df = df[df['sha256'] == current]
+        return df.drop_duplicates('file', keep='last').sort_values('file').reset_index(drop=True)
+
+    def prune(self):
+        """Deletes parts no filing's current row is in any more (cheap, no part is read)."""
+        live = set(self.live_parts())
+        for part in self.part_names():
+            if part not in live:
+                shutil.rmtree(os.path.join(self.parts_dir, part), ignore_errors=True)
+
+    def compact(self):
+        old = self.part_names()
+        if len(old) <= 1:
+            return
+        df = self.read()
+        name = self.append(df)
+        for entry in self.filings.values():
+            entry["part"] = name
+        self.save()
+        for part in old:
+            shutil.rmtree(os.path.join(self.parts_dir, part), ignore_errors=True)
+        print(f"Compacted {len(old)} parts into {name} ({len(df)} filings)")
+
+def scan(directory: str, store: IngestStore):
+    """(file, path, sha256, stat) for every filing; hashes only new or touched files."""
+    out = []
+    for path in filing_paths(directory):
+        name = os.path.basename(path)
+        st = os.stat(path)
+        entry = store.filings.get(name)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            sha = entry["sha256"]
+        else:
+            sha = file_sha256(path)
+        out.append((name, path, sha, st))
+    return out
+
+def plan(filings: list, store: IngestStore, stages: list, index: FilingIndex = None):
+    """Filing names each stage has to (re)process."""
+    todo = {"mda": [], "meta": [], **{stage.name: [] for stage in stages}}
+    for name, _, sha, _ in filings:
+        entry = store.filings.get(name)
+        done = entry["stages"] if entry and entry["sha256"] == sha else {}
+        redo = set()
+        if done.get("mda") != MDA_VERSION:
+            redo.add("mda")
+        if index is not None and index.version(name) not in (None, done.get("meta")):
+            redo.add("meta")
+        for stage in stages:
+            # Stages run in order, so a rerun upstream (new MD&A text, new LM
+            # counts, a changed index row) reaches everything that depends on it
+            if done.get(stage.name) != stage.version or redo.intersection(stage.depends):
+                redo.add(stage.name)
+        for step in redo:
+            todo[step].append(name)
+    return todo
+
+def ingest(directory: str, stages: list = None, store: IngestStore = None, workers: int = None,
+           index: FilingIndex = None):
+    """Brings the store up to date with directory. Returns the appended rows."""
+    store = store or IngestStore()
+    stages = stages or []
+    t0 = time.time()
+    filings = scan(directory, store)
+    todo = plan(filings, store, stages, index)
+    touched = sorted(set().union(*todo.values()))
+    print(f"Ingest: {len(filings)} filings, {len(touched)} to process "
+          + ", ".join(f"{k}={len(v)}" for k, v in todo.items()))
+    if not touched:
+        return pd.DataFrame()
+
+    by_name = {name: (path, sha, st) for name, path, sha, st in filings}
+    # Start from the current rows: columns of stages that are still up to date carry forward
+    known = [n for n in touched if n in store.filings] # brand-new filings need no lookup
+    previous = (store.read(known) if known else pd.DataFrame(columns=['file', 'sha256'])).set_index('file')
+    shas = pd.Series({n: by_name[n][1] for n in touched})
+    previous = previous[previous['sha256'] == shas.reindex(previous.index)]
+    rows = previous.reindex(pd.Index(touched, name='file'))
+    rows['sha256'] = shas
+
+    if todo["mda"]:
+        for col in MDA_COLUMNS:
+            if col not in rows.columns:
+                rows[col] = None
+            rows[col] = rows[col].astype(object)
+        for record in iter_corpus((by_name[n][0] for n in todo["mda"]), workers):
+            name = record["file"]
+            store.put_text(by_name[name][1], record.get("mda", ""))
+            for col in MDA_COLUMNS:
+                rows.at[name, col] = record.get(col)
+            if not record["found"]:
+                print(f"No MD&A found: {name} {record.get('error', '')}".rstrip())
+
+    if todo["meta"]:
+        meta = index.frame.loc[todo["meta"]]
+        for col in meta.columns:
+            if col not in rows.columns:
+                rows[col] = None
+            rows[col] = rows[col].astype(object)
+            rows.loc[todo["meta"], col] = meta[col].to_numpy(dtype=object)
+
+    for stage in stages:
+        names = todo[stage.name]
+        if not names:
+            continue
+        if getattr(stage, 'rows', False):
+            out = stage.run(rows.loc[names])
+        else:
+            out = stage.run([store.get_text(by_name[n][1]) for n in names])
+            out.index = names
+        for col in out.columns:
+            values = out[col].to_numpy()
+            if values.dtype.kind in 'iub':
+                values = values.astype(float)
+            if col not in rows.columns:
+                rows[col] = pd.Series(index=rows.index, dtype=values.dtype)
+            rows.loc[names, col] = values
+
+    rows['found'] = pd.to_numeric(rows['found']).astype(float) # bools would be stored as strings
+    rows['chars'] = pd.to_numeric(rows['chars']).astype(float)
+    rows['ingested_at'] = pd.Timestamp.now()
+    rows = rows.reset_index()
+    part = store.append(rows)
+
+    for name in touched:
+        _, sha, st = by_name[name]
+        entry = store.filings.get(name)
+        stages_done = dict(entry["stages"]) if entry and entry["sha256"] == sha else {}
+        stages_done["mda"] = MDA_VERSION
+        if index is not None and index.version(name) is not None:
+            stages_done["meta"] = index.version(name)
+        stages_done.update({stage.name: stage.version for stage in stages})
+        store.filings[name] = {
+            "sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "stages": stages_done, "part": part,
+        }
+    store.save()
+    store.prune()
+    print(f"Ingest: {len(touched)} filings -> {part} in {time.time() - t0:.1f}s")
+    if len(store.part_names()) > COMPACT_PARTS:
+        store.compact()
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest EDGAR filings into the columnar store.")
+    parser.add_argument("directory", nargs="?", default=None)
+    parser.add_argument("--store", default=None, help=f"store directory (default {STORE_DIR})")
+    parser.add_argument("--lm-dictionary", default=None, help="LM master dictionary; enables the LM stage")
+    parser.add_argument("--nltk-stopwords", action="store_true")
+    parser.add_argument("--vader", action="store_true", help="enable the VADER stage")
+    parser.add_argument("--filings-index", default=None, help="CSV of filing metadata keyed by a 'file' column")
+    parser.add_argument("--prices", default=None, help="price panel (.csv or .parquet); enables the returns stage")
+    parser.add_argument("--benchmark", default=None, help="benchmark ticker inside the panel, e.g. SPY")
+    parser.add_argument("--rf", default=None, help="daily risk-free file (Fama-French format)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--compact", action="store_true", help="fold all parts into one")
+    parser.add_argument("--export", default=None, help="write the current rows to a CSV")
+    args = parser.parse_args()
+    # Flag combinations are checked before any stage runs
+    if args.prices and not args.filings_index:
+        parser.error("--prices needs --filings-index (the returns stage reads each filing's Ticker and FILING_DATE)")
+    if (args.benchmark or args.rf) and not args.prices:
+        parser.error("--benchmark and --rf only apply to the returns stage, which needs --prices")
+    index = FilingIndex(args.filings_index) if args.filings_index else None
+    if args.prices:
+        missing = [c for c in ('Ticker', 'FILING_DATE') if c not in index.frame.columns]
+        if missing:
+            parser.error(f"--filings-index {args.filings_index} has no {missing} column(s), needed by --prices")
+
+    store = IngestStore(args.store)
+    if args.directory:
+        stages = []
+        if args.lm_dictionary:
+            stages.append(LexiconStage(args.lm_dictionary, args.nltk_stopwords))
+        if args.vader:
+            stages.append(VaderStage(args.workers))
+        stages.append(CCTIStage())
+        if args.prices:
+            stages.append(ReturnsStage(args.prices, args.benchmark, args.rf))
+        ingest(args.directory, stages, store, args.workers, index)
+    if args.compact:
+        store.compact()
+    if args.export:
+        df = store.read()
+        if 'FORM_TYPE' not in df.columns and 'form_type' in df.columns:
+            df['FORM_TYPE'] = df['form_type'] # the index's form wins when it has one
+        df.to_csv(args.export, index=False)
+        print(f"Exported {len(df)} filings -> {args.export}")
+        missing = [c for c in BACKEND_COLUMNS if c not in df.columns]
+        if missing:
+            print(f"Not yet in the store (needed by the backend): {missing}")
@@ -0,0 +1,159 @@
+import os
+import json
+import string
+import hashlib
+import argparse
+from itertools import repeat
+import numpy as np
+import pandas as pd
+
+# Loughran-McDonald category counts for many documents at once.
+#
+# The master dictionary is compiled once into a word index plus a uint8
+# category bitmask per word (cached on disk, keyed by the dictionary's content
+# hash). Scoring a batch tokenizes every document, maps all tokens to word ids
+# in one pass, and reduces the bitmasks per document with one
+# bincount per category, instead of a dict-of-dicts walk per token.
+#
+#   python -m pipeline.lexicon --dictionary Loughran-McDonald_MasterDictionary_1993-2024.csv \
+#       --input mda.jsonl --out lm_scores.csv
+
+LEXICON_VERSION = 1
+# Output column -> master dictionary column
+LM_CATEGORIES = {
+    'Negative': 'Negative',
+    'Positive': 'Positive',
+    'Uncertainty': 'Uncertainty',
+    'Litigious': 'Litigious',
+    'StrongModal': 'Strong_Modal',
+    'WeakModal': 'Weak_Modal',
+    'Constraining': 'Constraining',
+}
+CACHE_DIR = os.environ.get(
+    "CCTI_PIPELINE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+BATCH_SIZE = 256
+
+# Same normalization as the notebook's preprocess_text: lowercase, drop
+# punctuation and digits, split on whitespace (so counts stay comparable).
+# The deletion runs on UTF-8 bytes, where ASCII never occurs inside a
+# multi-byte character, which is several times faster than str.translate.
+_DROP = (string.punctuation + string.digits).encode('ascii')
+_stopwords = None
+
+def nltk_stopwords():
+    """NLTK's English stopword set, loaded once per process."""
+    global _stopwords
+    if _stopwords is None:
+        from nltk.corpus import stopwords
+        _stopwords = frozenset(stopwords.words('english'))
+    return _stopwords
+
+def tokenize(text, stopwords: frozenset = None):
+    if not isinstance(text, str):
+        return []
+    tokens = text.lower().encode('utf-8').translate(None, _DROP).decode('utf-8').split()
+    if stopwords:
+        tokens = [t for t in tokens if t not in stopwords]
+    return tokens
+
+class Lexicon:
+    def __init__(self, words: np.ndarray, masks: np.ndarray):
+        self.words = words
+        self.masks = masks
+        self.lookup = dict(zip(words.tolist(), range(len(words)))) # word -> id
+        self.categories = list(LM_CATEGORIES)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        words = df['Word'].astype(str).str.lower().to_numpy()
+        masks = np.zeros(len(df), dtype=np.uint8)
+        for bit, source in enumerate(LM_CATEGORIES.values()):
+            # Positive values are the year a word was added; 0 / negative = not (or no longer) in the list
+            flag = pd.to_numeric(df[source], errors='coerce').fillna(0).to_numpy() > 0
+            masks |= flag.astype(np.uint8) << bit
+        # Duplicate spellings are merged by OR-ing their categories
+        unique, inverse = np.unique(words.astype(str), return_inverse=True)
+        merged = np.zeros(len(unique), dtype=np.uint8)
+        np.bitwise_or.at(merged, inverse.ravel(), masks)
+        return cls(unique, merged)
+
+    def ids(self, tokens):
+        # Token ids in one C-level pass (-1 = not in the dictionary)
+        return np.fromiter(map(self.lookup.get, tokens, repeat(-1)), dtype=np.intp, count=len(tokens))
+
+    def score_tokens(self, docs: list):
+        """docs: list of token lists -> (n_docs, 7) int array of category counts."""
+        lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+        ids = self.ids([t for d in docs for t in d])
+        doc_of = np.repeat(np.arange(len(docs)), lengths)
+        hit = ids >= 0
+        masks = self.masks[ids[hit]]
+        doc_of = doc_of[hit]
+        counts = np.empty((len(docs), len(self.categories)), dtype=np.int64)
+        for bit in range(len(self.categories)):
+            counts[:, bit] = np.bincount(doc_of, weights=(masks >> bit) & 1, minlength=len(docs))
+        return counts
+
+    def score(self, texts, stopwords: frozenset = None):
+        """Category counts for an iterable of raw texts, as a DataFrame."""
+        texts = list(texts)
+        parts = []
+        for start in range(0, len(texts), BATCH_SIZE):
+            batch = [tokenize(t, stopwords) for t in texts[start:start + BATCH_SIZE]]
+            parts.append(self.score_tokens(batch))
+        counts = np.vstack(parts) if parts else np.empty((0, len(self.categories)), dtype=np.int64)
+        return pd.DataFrame(counts, columns=self.categories)
+
+def _file_hash(path: str):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _read_dictionary(path: str):
+    if path.lower().endswith(('.xlsx', '.xls')):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+def load_lexicon(path: str, cache_dir: str = None):
+    """Compiled lexicon for a master dictionary file (CSV or Excel), cached on disk."""
+    cache_dir = cache_dir or CACHE_DIR
+    key = _file_hash(path)
+    cache_path = os.path.join(cache_dir, f"lm-v{LEXICON_VERSION}-{key[:16]}.npz")
+    if os.path.exists(cache_path):
+        data = np.load(cache_path)
+        return Lexicon(data['words'], data['masks'])
+
+    lexicon = Lexicon.from_frame(_read_dictionary(path))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = f"{cache_path}.tmp-{os.getpid()}.npz"
+    np.savez(tmp, words=lexicon.words, masks=lexicon.masks)
+    os.replace(tmp, cache_path)
+    print(f"Compiled LM lexicon: {len(lexicon.words)} words -> {cache_path}")
+    return lexicon
+
+def score_jsonl(lexicon: Lexicon, in_path: str, out_path: str, text_field: str = 'mda',
+                stopwords: frozenset = None):
+    """Scores the records of a JSON Lines file (e.g. pipeline.mda output) into a CSV."""
+    with open(in_path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    scores = lexicon.score((r.get(text_field, '') for r in records), stopwords)
+    scores.insert(0, 'file', [r.get('file') for r in records])
+    scores.to_csv(out_path, index=False)
+    print(f"Scored {len(scores)} documents -> {out_path}")
+    return scores
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loughran-McDonald category counts per document.")
+    parser.add_argument("--dictionary", required=True, help="LM master dictionary (.csv or .xlsx)")
+    parser.add_argument("--input", default="mda.jsonl")
+    parser.add_argument("--out", default="lm_scores.csv")
+    parser.add_argument("--field", default="mda")
+    parser.add_argument("--nltk-stopwords", action="store_true",
+                        help="drop NLTK English stopwords first, as the notebook did")
+    args = parser.parse_args()
+    lex = load_lexicon(args.dictionary)
+    score_jsonl(lex, args.input, args.out, args.field, nltk_stopwords() if args.nltk_stopwords else None)
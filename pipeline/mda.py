@@ -0,0 +1,307 @@
+import os
+import re
+import io
+import json
+import argparse
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+# Streaming MD&A extractor for raw EDGAR filings (SGML submissions with
+# <DOCUMENT>/<TEXT> blocks, plain HTML / inline XBRL, or plain text).
+#
+# Files are read in bounded line pieces, markup is stripped incrementally by
+# an HTMLParser (no DOM is built) and the resulting text lines run through a
+# small state machine that collects every "Item 7 / Item 2 - Management's
+# Discussion and Analysis" section up to the next item. The longest candidate
+# wins, which skips the table-of-contents entries. Memory per file is bounded
+# by the read size plus the largest section (capped at MAX_SECTION_CHARS).
+#
+#   python -m pipeline.mda apple_sec_file --out mda.jsonl --workers 4
+
+READ_LIMIT = 1 << 16          # max characters per readline() piece
+MAX_SECTION_CHARS = 2_000_000
+MIN_SECTION_CHARS = 2000      # shorter candidates are table-of-contents entries
+SKIP_DOC_TYPES = ('GRAPHIC', 'ZIP', 'EXCEL', 'XML', 'JSON', 'PDF')
+
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'tr', 'li', 'table', 'hr', 'center', 'page', 'title',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'ul', 'ol', 'dl', 'dt', 'dd'
+}
+CELL_TAGS = {'td', 'th'}
+SKIP_TAGS = {'script', 'style', 'head', 'ix:header'}
+
+_WS = re.compile(r'\s+')
+_HTML_HINT = re.compile(r'<(html|\?xml|body|div|p|table|font)\b', re.IGNORECASE)
+_QUOTES = str.maketrans({'’': "'", '‘': "'", '`': "'", '´': "'", '�': "'",
+                         '–': '-', '—': '-'})
+_MDA = r"management'?s?\s*discussion\s+and\s+analysis"
+START_PATTERNS = {
+    '10-K': re.compile(r"^item\s*7\s*[\.:\-]?\s*" + _MDA),
+    '10-Q': re.compile(r"^item\s*2\s*[\.:\-]?\s*" + _MDA),
+}
+ITEM_LABEL = re.compile(r"^item\s*\d+\s*[a-z]?\s*[\.:\-]?$") # "Item 7." alone in its own cell
+END_PATTERNS = {
+    '10-K': re.compile(r"^item\s*(7\s*a|8)\b"),
+    '10-Q': re.compile(r"^(item\s*[3-6]\b|part\s*ii\b)"),
+}
+
+def clean_paragraph(text: str):
+    """Single-line, whitespace-normalized text (the notebook's clean_paragraph_for_excel)."""
+    if not isinstance(text, str):
+        return ""
+    return _WS.sub(' ', text.replace('\n', ' ').replace('\r', ' ')).strip()
+
+def form_from_name(file_name: str):
+    name = file_name.lower().replace('-', '').replace('_', '')
+    if '10k' in name:
+        return '10-K'
+    if '10q' in name:
+        return '10-Q'
+    return None
+
+class TextStripper(HTMLParser):
+    """Incremental markup stripper: feed() raw pieces, drain() the text so far."""
+
+    def __init__(self, html: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.html = html
+        self._out = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._out.append('\n')
+        elif tag in CELL_TAGS:
+            self._out.append(' ')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._out.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self._out.append('\n')
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        # In HTML, source line breaks are just whitespace; plain text keeps them
+        self._out.append(_WS.sub(' ', data) if self.html else data)
+
+    def drain(self):
+        text = ''.join(self._out)
+        self._out.clear()
+        return text
+
+class SectionFinder:
+    """Collects MD&A candidates from a stream of text and keeps the longest."""
+
+    def __init__(self):
+        self._tail = ''
+        self._label = None
+        self._kind = None
+        self._lines = []
+        self._size = 0
+        self.best = None # (kind, lines)
+        self.best_size = 0
+
+    def feed(self, text: str):
+        text = self._tail + text
+        lines = text.split('\n')
+        self._tail = lines.pop()
+        if len(self._tail) > READ_LIMIT:
+            # A single enormous "line" (minified HTML): process what we have
+            lines.append(self._tail)
+            self._tail = ''
+        for line in lines:
+            self._line(line)
+
+    def _line(self, raw: str):
+        line = _WS.sub(' ', raw).strip()
+        if not line:
+            return
+        key = line.lower().translate(_QUOTES)
+        if self._label is not None:
+            # Join a bare item label with the title that follows it
+            line = f"{self._label} {line}"
+            key = f"{self._label.lower()} {key}"
+            self._label = None
+        elif ITEM_LABEL.match(key):
+            self._label = line
+            return
+        for kind, pattern in START_PATTERNS.items():
+            if pattern.match(key):
+                self._finish()
+                self._kind = kind
+                self._lines = [line]
+                self._size = len(line)
+                return
+        if self._kind is None:
+            return
+        if END_PATTERNS[self._kind].match(key):
+            self._finish()
+            return
+        if self._size < MAX_SECTION_CHARS:
+            self._lines.append(line)
+            self._size += len(line) + 1
+
+    def _finish(self):
+        if self._kind is not None and self._size > self.best_size:
+            self.best = (self._kind, self._lines)
+            self.best_size = self._size
+        self._kind = None
+        self._lines = []
+        self._size = 0
+
+    def close(self):
+        if self._tail:
+            self._line(self._tail)
+            self._tail = ''
+        self._label = None
+        self._finish()
+
+def _read_pieces(path: str):
+    # Bounded pieces: a line, or READ_LIMIT characters of a longer one
+    with io.open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        while True:
+            piece = f.readline(READ_LIMIT)
+            if not piece:
+                return
+            yield piece
+
+def extract_mda(path: str):
+    """Extracts the MD&A section of one filing. Returns a JSON-ready record."""
+    name = os.path.basename(path)
+    finder = SectionFinder()
+    doc_type = None
+    form_type = None
+    stripper = None
+    in_text = False
+    saw_document = False
+    pending = [] # first pieces of a text block, until html/text mode is known
+
+    def start_text():
+        nonlocal stripper, pending
+        head = ''.join(pending)
+        stripper = TextStripper(html=bool(_HTML_HINT.search(head[:4096])))
+        pending = []
+        stripper.feed(head)
+        finder.feed(stripper.drain())
+
+    def end_text():
+        nonlocal stripper, in_text
+        if stripper is None:
+            start_text()
+        stripper.close()
+        finder.feed(stripper.drain() + '\n')
+        finder.close()
+        stripper = None
+        in_text = False
+
+    for piece in _read_pieces(path):
+        if not in_text:
+            marker = piece.lstrip()
+            if marker.startswith('<DOCUMENT>'):
+                saw_document = True
+                doc_type = None
+            elif marker.startswith('<TYPE>'):
+                doc_type = marker[6:].strip().upper()
+                if form_type is None and doc_type.startswith(('10-K', '10-Q')):
+                    form_type = doc_type
+            elif marker.startswith('<TEXT>'):
+                if doc_type and doc_type.startswith(SKIP_DOC_TYPES):
+                    in_text = 'skip'
+                else:
+                    in_text = True
+            elif not saw_document and marker:
+                # No SGML envelope: the whole file is one document
+                in_text = True
+                pending.append(piece)
+            continue
+
+        if piece.lstrip().startswith('</TEXT>'):
+            if in_text == 'skip':
+                in_text = False
+            else:
+                end_text()
+            continue
+        if in_text == 'skip':
+            continue
+        if stripper is None:
+            pending.append(piece)
+            if sum(len(p) for p in pending) < 4096:
+                continue
+            start_text()
+            continue
+        stripper.feed(piece)
+        finder.feed(stripper.drain())
+
+    if in_text is True:
+        end_text()
+
+    form_type = form_type or form_from_name(name)
+    record = {"file": name, "form_type": form_type, "found": finder.best_size >= MIN_SECTION_CHARS}
+    if record["found"]:
+        kind, lines = finder.best
+        record["section"] = "Item 7" if kind == '10-K' else "Item 2"
+        record["heading"] = lines[0]
+        record["mda"] = clean_paragraph('\n'.join(lines[1:]))
+    else:
+        record["mda"] = ""
+    record["chars"] = len(record["mda"])
+    return record
+
+def _safe_extract(path: str):
+    try:
+        return extract_mda(path)
+    except Exception as e:
+        return {"file": os.path.basename(path), "found": False, "mda": "", "chars": 0, "error": str(e)}
+
+def iter_corpus(paths, workers: int = None):
+    """
+    Yields extract_mda records for many files on a process pool. At most
+    2 * workers files are in flight, so memory stays bounded for any corpus
+    size; records come back in completion order.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        for path in paths:
+            running.add(pool.submit(_safe_extract, path))
+            if len(running) >= 2 * workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in running:
+            yield future.result()
+
+def filing_paths(directory: str):
+    for entry in sorted(os.listdir(directory)):
+        if entry.lower().endswith(('.htm', '.html', '.txt')):
+            yield os.path.join(directory, entry)
+
+def extract_corpus(directory: str, out_path: str, workers: int = None):
+    """Writes one JSON record per filing in directory to out_path (JSON Lines)."""
+    found = total = 0
+    with open(out_path, 'w', encoding='utf-8') as out:
+        for record in iter_corpus(filing_paths(directory), workers):
+            out.write(json.dumps(record) + '\n')
+            total += 1
+            found += record["found"]
+            if not record["found"]:
+                print(f"No MD&A found: {record['file']} {record.get('error', '')}".rstrip())
+    print(f"MD&A extracted from {found}/{total} filings -> {out_path}")
+    return found, total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract MD&A sections from raw EDGAR filings.")
+    parser.add_argument("directory", nargs="?", default="apple_sec_file")
+    parser.add_argument("--out", default="mda.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    extract_corpus(args.directory, args.out, args.workers)
@@ -0,0 +1,240 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+# Event-window market variables for every filing at once, from a local price
+# panel (no live downloads).
+#
+# The panel (CSV or Parquet; long ticker/date/close rows or one column per
+# ticker) is compiled once into flat arrays sorted by (ticker, date) and
+# cached as .npy files that later runs memory-map. Each filing is located with
+# a single searchsorted over the combined (ticker, day) key: the event day is
+# the first trading day on or after the filing date, as in the notebook's
+# asof lookups. Windows are then plain offsets into the arrays, and sums over
+# daily returns come from cumulative sums, so every horizon costs a few
+# vectorized array operations regardless of the number of filings.
+#
+# Per horizon h (trading days):
+#   Ret_{h}d       close[t0 + h] / close[t0] - 1
+#   Bench_{h}d     benchmark return over the same calendar window (--benchmark)
+#   AbnRet_{h}d    Ret - Bench
+#   RF_{h}d        compounded risk-free rate over the window (--rf)
+#   ExcessRet_{h}d Ret - RF
+#   Vol_{h}d       std of the h daily returns before the event day
+#
+#   python -m pipeline.returns --filings final_with_CCTI.csv --prices prices.csv \
+#       --benchmark SPY --rf F-F_Research_Data_Factors_daily.csv --out event_returns.csv
+
+PANEL_VERSION = 1
+HORIZONS = (5, 30, 60, 90)
+CACHE_DIR = os.environ.get(
+    "CCTI_PIPELINE_CACHE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
+_DAY_BIAS = 1 << 31 # keeps day numbers (days since 1970) non-negative inside the key
+
+def day_numbers(dates):
+    values = pd.to_datetime(pd.Series(dates), errors='coerce').to_numpy(dtype='datetime64[D]')
+    days = values.astype(np.int64)
+    days[np.isnat(values)] = np.iinfo(np.int64).min
+    return days
+
+def _read_table(path: str):
+    if path.lower().endswith(('.parquet', '.pq')):
+        return pd.read_parquet(path) # needs pyarrow or fastparquet
+    return pd.read_csv(path)
+
+def _long_format(df: pd.DataFrame, ticker_col: str, date_col: str, price_col: str):
+    if ticker_col in df.columns:
+        return df[[ticker_col, date_col, price_col]].set_axis(['ticker', 'date', 'close'], axis=1)
+    # Wide: one price column per ticker (e.g. a yfinance Close export)
+    wide = df.set_index(date_col)
+    long = wide.stack().reset_index()
+    return long.set_axis(['date', 'ticker', 'close'], axis=1)
+
+class PricePanel:
+    """Closing prices of many tickers as flat arrays sorted by (ticker, day)."""
+
+    def __init__(self, tickers: np.ndarray, offsets: np.ndarray, days: np.ndarray, close: np.ndarray):
+        self.tickers = tickers
+        self.offsets = offsets # block of ticker i: offsets[i]:offsets[i + 1]
+        self.days = days
+        self.close = close
+        self.lookup = dict(zip(tickers.tolist(), range(len(tickers))))
+        tid = np.repeat(np.arange(len(tickers), dtype=np.int64), np.diff(offsets))
+        self.keys = (tid << 32) + (days.astype(np.int64) + _DAY_BIAS)
+
+        # Daily simple returns (0 at block starts) and their running sums
+        ret = np.zeros(len(close))
+        if len(close) > 1:
+            ret[1:] = close[1:] / close[:-1] - 1
+        ret[offsets[:-1][np.diff(offsets) > 0]] = 0.0
+        self.cum_ret = np.concatenate([[0.0], np.cumsum(ret)])
+        self.cum_ret2 = np.concatenate([[0.0], np.cumsum(ret * ret)])
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, ticker_col: str = 'ticker', date_col: str = 'date',
+                   price_col: str = 'close'):
+        long = _long_format(df, ticker_col, date_col, price_col)
+        long['ticker'] = long['ticker'].astype(str).str.strip().str.upper()
+        long['day'] = day_numbers(long['date'])
+        long['close'] = pd.to_numeric(long['close'], errors='coerce')
+        long = long[(long['day'] > np.iinfo(np.int64).min) & (long['close'] > 0)]
+        long = long.sort_values(['ticker', 'day'], kind='stable').drop_duplicates(['ticker', 'day'], keep='last')
+
+        tickers, codes = np.unique(long['ticker'].to_numpy(dtype=str), return_inverse=True)
+        offsets = np.zeros(len(tickers) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(codes.ravel(), minlength=len(tickers)))
+        return cls(tickers, offsets, long['day'].to_numpy(dtype=np.int32), long['close'].to_numpy(dtype=float))
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        for name in ('tickers', 'offsets', 'days', 'close'):
+            np.save(os.path.join(tmp, f"{name}.npy"), getattr(self, name))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in ('tickers', 'offsets', 'days', 'close')
+        }
+        return cls(np.asarray(arrays['tickers']), **{k: v for k, v in arrays.items() if k != 'tickers'})
+
+    def locate(self, tickers, days: np.ndarray):
+        """
+        Position of the first trading day on or after each date in the
+        ticker's block, plus the block end; -1 where there is none.
+        """
+        tid = np.fromiter(
+            (self.lookup.get(str(t).strip().upper(), -1) for t in tickers), dtype=np.int64, count=len(days)
+        )
+        valid = (tid >= 0) & (days > np.iinfo(np.int64).min)
+        safe_tid = np.where(valid, tid, 0)
+        key = (safe_tid << 32) + (np.where(valid, days, 0) + _DAY_BIAS)
+        pos = np.searchsorted(self.keys, key, side='left')
+        end = self.offsets[safe_tid + 1]
+        valid &= pos < end
+        return np.where(valid, pos, -1), np.where(valid, end, -1)
+
+def _file_hash(path: str):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_panel(path: str, ticker_col: str = 'ticker', date_col: str = 'date', price_col: str = 'close',
+               cache_dir: str = None):
+    """Price panel for a CSV/Parquet file, compiled once and memory-mapped afterwards."""
+    cache_dir = cache_dir or CACHE_DIR
+    params = json.dumps([ticker_col, date_col, price_col])
+    key = hashlib.sha256((_file_hash(path) + params).encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"prices-v{PANEL_VERSION}-{key[:16]}")
+    if os.path.exists(os.path.join(cache_path, "close.npy")):
+        return PricePanel.load(cache_path)
+
+    panel = PricePanel.from_frame(_read_table(path), ticker_col, date_col, price_col)
+    os.makedirs(cache_dir, exist_ok=True)
+    panel.save(cache_path)
+    print(f"Compiled price panel: {len(panel.tickers)} tickers, {len(panel.close)} prices -> {cache_path}")
+    return PricePanel.load(cache_path)
+
+def load_rf(path: str, date_col: str = None, rate_col: str = 'RF', percent: bool = True):
+    """Daily risk-free series (Fama-French daily factors by default) as (days, cumulative log growth)."""
+    df = _read_table(path)
+    date_col = date_col or df.columns[0]
+    raw = df[date_col].astype(str).str.strip()
+    # The French library writes dates as YYYYMMDD
+    dates = pd.to_datetime(raw, format='%Y%m%d', errors='coerce').fillna(pd.to_datetime(raw, errors='coerce'))
+    rate = pd.to_numeric(df[rate_col], errors='coerce') / (100.0 if percent else 1.0)
+    keep = dates.notna() & rate.notna()
+    order = np.argsort(day_numbers(dates[keep]), kind='stable')
+    days = day_numbers(dates[keep])[order]
+    growth = np.concatenate([[0.0], np.cumsum(np.log1p(rate[keep].to_numpy()[order]))])
+    return days, growth
+
+def _window_growth(days: np.ndarray, cum: np.ndarray, start_days: np.ndarray, end_days: np.ndarray):
+    # Compounded growth over the series' dates in (start, end]
+    a = np.searchsorted(days, start_days, side='right')
+    b = np.searchsorted(days, end_days, side='right')
+    return np.exp(cum[b] - cum[a]) - 1
+
+def event_returns(tickers, filing_dates, panel: PricePanel, horizons=HORIZONS,
+                  benchmark: str = None, rf=None):
+    """Event-window returns/volatility for every filing, one row per input row."""
+    days = day_numbers(filing_dates)
+    pos, end = panel.locate(list(tickers), days)
+    found = pos >= 0
+    out = {'EventDate': np.full(len(days), np.datetime64('NaT'), dtype='datetime64[D]')}
+    out['EventDate'][found] = panel.days[pos[found]].astype('datetime64[D]')
+
+    bench = None
+    if benchmark is not None:
+        b = panel.lookup.get(benchmark.upper())
+        if b is None:
+            raise ValueError(f"Benchmark {benchmark} is not in the price panel")
+        lo, hi = panel.offsets[b], panel.offsets[b + 1]
+        bench = (np.asarray(panel.days[lo:hi]), np.asarray(panel.close[lo:hi]))
+
+    for h in horizons:
+        h = int(h)
+        ok = found & (pos + h < end)
+        p0 = np.where(ok, pos, 0)
+        p1 = np.where(ok, pos + h, 0)
+        ret = np.where(ok, panel.close[p1] / panel.close[p0] - 1, np.nan)
+        out[f'Ret_{h}d'] = ret
+
+        if bench is not None or rf is not None:
+            d0, d1 = panel.days[p0], panel.days[p1]
+        if bench is not None:
+            # As-of: last benchmark close on or before each end of the window
+            i0 = np.searchsorted(bench[0], d0, side='right') - 1
+            i1 = np.searchsorted(bench[0], d1, side='right') - 1
+            has = ok & (i0 >= 0)
+            b_ret = np.where(has, bench[1][np.maximum(i1, 0)] / bench[1][np.maximum(i0, 0)] - 1, np.nan)
+            out[f'Bench_{h}d'] = b_ret
+            out[f'AbnRet_{h}d'] = ret - b_ret
+        if rf is not None:
+            rf_ret = np.where(ok, _window_growth(rf[0], rf[1], d0, d1), np.nan)
+            out[f'RF_{h}d'] = rf_ret
+            out[f'ExcessRet_{h}d'] = ret - rf_ret
+
+        # Pre-event volatility: daily returns r[t0 - h .. t0 - 1]
+        start = panel.offsets[np.searchsorted(panel.offsets, np.where(found, pos, 0), side='right') - 1]
+        pre_ok = found & (pos - h - 1 >= start) & (h > 1)
+        a = np.where(pre_ok, pos - h, 0)
+        b = np.where(pre_ok, pos, 0)
+        s1 = panel.cum_ret[b] - panel.cum_ret[a]
+        s2 = panel.cum_ret2[b] - panel.cum_ret2[a]
+        var = np.maximum(s2 - s1 * s1 / h, 0) / max(h - 1, 1)
+        out[f'Vol_{h}d'] = np.where(pre_ok, np.sqrt(var), np.nan)
+    return pd.DataFrame(out)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-window returns for filings from a local price panel.")
+    parser.add_argument("--filings", required=True, help="CSV with ticker and filing date columns")
+    parser.add_argument("--prices", required=True, help="price panel (.csv or .parquet)")
+    parser.add_argument("--out", default="event_returns.csv")
+    parser.add_argument("--ticker-col", default="Ticker")
+    parser.add_argument("--date-col", default="FILING_DATE")
+    parser.add_argument("--price-ticker-col", default="ticker")
+    parser.add_argument("--price-date-col", default="date")
+    parser.add_argument("--price-col", default="close")
+    parser.add_argument("--benchmark", default=None, help="benchmark ticker inside the panel, e.g. SPY")
+    parser.add_argument("--rf", default=None, help="daily risk-free file (Fama-French format)")
+    parser.add_argument("--horizons", default=",".join(map(str, HORIZONS)))
+    args = parser.parse_args()
+
+    filings = pd.read_csv(args.filings, usecols=lambda c: c in (args.ticker_col, args.date_col, 'ACC_NUM'))
+    panel = load_panel(args.prices, args.price_ticker_col, args.price_date_col, args.price_col)
+    rf = load_rf(args.rf) if args.rf else None
+    horizons = [int(h) for h in args.horizons.split(",")]
+    result = event_returns(filings[args.ticker_col], filings[args.date_col], panel, horizons, args.benchmark, rf)
+    result = pd.concat([filings.reset_index(drop=True), result], axis=1)
+    result.to_csv(args.out, index=False)
+    print(f"Event returns for {result['EventDate'].notna().sum()}/{len(result)} filings -> {args.out}")
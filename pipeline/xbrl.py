@@ -0,0 +1,276 @@
+import os
+import re
+import math
+import zipfile
+import argparse
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+# Firm fundamentals (BM_w, Size_w, dAsset_w, ROE_w) straight from EDGAR XBRL
+# archives (the *-xbrl.zip of a filing), without unpacking them.
+#
+# Instance documents - inline XBRL (.htm) or plain instances (.xml) - are
+# streamed out of the zip into ElementTree.iterparse. Only the facts of a few
+# us-gaap/dei concepts and the contexts without dimensions are kept; every
+# other element is cleared as soon as it ends, so memory per archive stays
+# small. Archives are parsed in parallel on a process pool and the raw
+# ratios are then winsorized at the 1st/99th percentile across the panel,
+# like ExcessRet in the replication notebook:
+#
+#   Size   = ln(market value), market value = dei:EntityPublicFloat
+#   BM     = book equity / market value
+#   dAsset = total assets / prior period-end total assets - 1
+#   ROE    = net income / book equity
+#
+#   python -m pipeline.xbrl xbrl_archives/ --out fundamentals.csv --workers 8
+
+WINSOR_LIMITS = (0.01, 0.99)
+FACTS = {
+    'Assets': ('Assets',),
+    'Equity': ('StockholdersEquity', 'StockholdersEquityIncludingPortionAttributableToNoncontrollingInterest'),
+    'NetIncome': ('NetIncomeLoss', 'ProfitLoss'),
+    'MarketValue': ('EntityPublicFloat',),
+}
+META = ('DocumentType', 'DocumentPeriodEndDate', 'EntityCentralIndexKey', 'EntityRegistrantName')
+_WANTED = {c for names in FACTS.values() for c in names}
+
+XBRLI = '{http://www.xbrl.org/2003/instance}'
+IX = '{http://www.xbrl.org/2013/inlineXBRL}'
+_LINKBASE = re.compile(r'_(cal|def|lab|pre)\.xml$', re.IGNORECASE)
+_INSTANCE_HINT = re.compile(rb'xmlns(:\w+)?="http://www\.xbrl\.org/(2013/inlineXBRL|2003/instance)"')
+_NUMBER = re.compile(r'[^0-9.\-]')
+
+def _concept(qname: str):
+    # "us-gaap:Assets" or "{http://fasb.org/us-gaap/2024}Assets" -> "Assets" (other taxonomies -> None)
+    if qname.startswith('{'):
+        ns, _, local = qname[1:].partition('}')
+        return local if ('/us-gaap/' in ns or '/dei/' in ns) else None
+    prefix, _, local = qname.partition(':')
+    return local if prefix in ('us-gaap', 'dei') else None
+
+def _ix_number(elem):
+    """Value of an ix:nonFraction (display text + format, scale and sign)."""
+    fmt = (elem.get('format') or '').lower()
+    text = ''.join(elem.itertext()).strip()
+    if 'zero' in fmt or 'numword' in fmt or text in ('-', '—', ''):
+        value = 0.0
+    else:
+        if 'comma-decimal' in fmt or 'numcommadecimal' in fmt:
+            text = text.replace('.', '').replace(' ', '').replace(',', '.')
+        value = float(_NUMBER.sub('', text.replace(',', '')) or 'nan')
+    value *= 10 ** int(elem.get('scale') or 0)
+    return -value if elem.get('sign') == '-' else value
+
+def _context(elem):
+    """(start, end) dates of a dimensionless context, or None for segmented ones."""
+    if elem.find(f'.//{XBRLI}segment') is not None or elem.find(f'.//{XBRLI}scenario') is not None:
+        return None
+    period = elem.find(f'{XBRLI}period')
+    if period is None:
+        return None
+    instant = period.findtext(f'{XBRLI}instant')
+    if instant:
+        return None, instant.strip()[:10]
+    start, end = period.findtext(f'{XBRLI}startDate'), period.findtext(f'{XBRLI}endDate')
+    if not end:
+        return None
+    return (start or '').strip()[:10] or None, end.strip()[:10]
+
+def parse_instance(stream):
+    """
+    Streams one instance document. Returns (facts, meta): facts as
+    (concept, context_id, value) tuples for the concepts in FACTS, plus the dei
+    metadata strings, and the contexts they refer to.
+    """
+    facts = []
+    meta = {}
+    contexts = {}
+    keep = 0 # depth inside elements we still need whole
+    root = None
+    ended = 0
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if root is None:
+                root = elem
+            if tag == f'{XBRLI}context' or tag in (f'{IX}nonFraction', f'{IX}nonNumeric') or (
+                    keep == 0 and _concept(tag) is not None):
+                keep += 1
+            continue
+
+        if tag == f'{XBRLI}context':
+            keep -= 1
+            period = _context(elem)
+            if period is not None:
+                contexts[elem.get('id')] = period
+        elif tag == f'{IX}nonFraction' or tag == f'{IX}nonNumeric':
+            keep -= 1
+            concept = _concept(elem.get('name') or '')
+            if concept in _WANTED and tag == f'{IX}nonFraction' and elem.get(
+                    '{http://www.w3.org/2001/XMLSchema-instance}nil') != 'true':
+                try:
+                    facts.append((concept, elem.get('contextRef'), _ix_number(elem)))
+                except ValueError:
+                    pass
+            elif concept in META and concept not in meta:
+                meta[concept] = ' '.join(''.join(elem.itertext()).split())
+        elif keep and _concept(tag) is not None and not tag.startswith(IX):
+            # Plain instance: <us-gaap:Assets contextRef=...>123</us-gaap:Assets>
+            keep -= 1
+            concept = _concept(tag)
+            if concept in _WANTED and elem.text:
+                try:
+                    facts.append((concept, elem.get('contextRef'), float(elem.text)))
+                except ValueError:
+                    pass
+            elif concept in META and elem.text and concept not in meta:
+                meta[concept] = elem.text.strip()
+        if keep == 0:
+            elem.clear()
+            ended += 1
+            if ended % 10000 == 0 and root is not None:
+                root.clear() # drop the emptied shells of finished elements
+    return facts, meta, contexts
+
+def instance_members(archive: zipfile.ZipFile):
+    """Names of the instance documents in an archive (inline or plain)."""
+    names = []
+    for info in archive.infolist():
+        name = info.filename
+        lower = name.lower()
+        if not lower.endswith(('.htm', '.html', '.xml')) or _LINKBASE.search(lower) or lower.endswith('filingsummary.xml'):
+            continue
+        with archive.open(info) as f:
+            head = f.read(1 << 16)
+        if _INSTANCE_HINT.search(head) and (b'ix:header' in head or b'<xbrli:xbrl' in head or b'<xbrl' in head
+                                            or b'ix:nonFraction' in head or lower.endswith('.xml')):
+            names.append(name)
+    # A plain instance and its inline rendering carry the same facts: read one
+    plain = [n for n in names if n.lower().endswith('.xml')]
+    return plain[:1] or names
+
+def _latest(values: dict, on_or_before: str = None, before: str = None):
+    dates = sorted(d for d in values if (on_or_before is None or d <= on_or_before) and (before is None or d < before))
+    return (dates[-1], values[dates[-1]]) if dates else (None, None)
+
+def fundamentals(facts: list, contexts: dict, meta: dict):
+    """Raw fundamentals of one filing from its facts."""
+    instants = {k: {} for k in FACTS}
+    durations = {}
+    rank = {c: (k, names.index(c)) for k, names in FACTS.items() for c in names}
+    best = {} # (key, date) -> preference rank of the concept already stored
+    for concept, ctx, value in facts:
+        period = contexts.get(ctx)
+        if period is None or not math.isfinite(value):
+            continue
+        key, pref = rank[concept]
+        start, end = period
+        if start is None:
+            if best.get((key, end), 99) >= pref:
+                instants[key][end] = value
+                best[(key, end)] = pref
+        elif key == 'NetIncome':
+            days = (pd.Timestamp(end) - pd.Timestamp(start)).days
+            durations.setdefault(end, []).append((pref, -days, value))
+
+    period_end = None
+    if instants['Assets']:
+        period_end = max(instants['Assets'])
+    elif meta.get('DocumentPeriodEndDate'):
+        try:
+            period_end = pd.Timestamp(meta['DocumentPeriodEndDate']).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+
+    assets = instants['Assets'].get(period_end)
+    _, prior_assets = _latest(instants['Assets'], before=period_end) if period_end else (None, None)
+    equity = instants['Equity'].get(period_end)
+    _, market = _latest(instants['MarketValue'])
+    income = None
+    if period_end in durations:
+        # Longest period ending on the balance sheet date (the fiscal year for a 10-K)
+        income = sorted(durations[period_end])[0][2]
+
+    def ratio(a, b):
+        return a / b if a is not None and b not in (None, 0) else np.nan
+
+    return {
+        'cik': meta.get('EntityCentralIndexKey'),
+        'company': meta.get('EntityRegistrantName'),
+        'form_type': meta.get('DocumentType'),
+        'period_end': period_end,
+        'Assets': assets, 'PriorAssets': prior_assets, 'Equity': equity,
+        'NetIncome': income, 'MarketValue': market,
+        'Size': math.log(market) if market and market > 0 else np.nan,
+        'BM': ratio(equity, market),
+        'dAsset': ratio(assets, prior_assets) - 1,
+        'ROE': ratio(income, equity),
+    }
+
+def extract_archive(path: str):
+    """Fundamentals of one *-xbrl.zip archive, read in place."""
+    record = {'archive': os.path.basename(path)}
+    try:
+        with zipfile.ZipFile(path) as archive:
+            facts, meta, contexts = [], {}, {}
+            for name in instance_members(archive):
+                with archive.open(name) as stream:
+                    f, m, c = parse_instance(stream)
+                facts += f
+                contexts.update(c)
+                for k, v in m.items():
+                    meta.setdefault(k, v)
+        record.update(fundamentals(facts, contexts, meta))
+    except (zipfile.BadZipFile, ET.ParseError, OSError) as e:
+        record['error'] = str(e)
+    return record
+
+def iter_archives(paths, workers: int = None):
+    """extract_archive over many archives on a process pool, at most 2 * workers in flight."""
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        for path in paths:
+            running.add(pool.submit(extract_archive, path))
+            if len(running) >= 2 * workers:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in running:
+            yield future.result()
+
+def winsorize(s: pd.Series, limits: tuple = WINSOR_LIMITS):
+    low, high = s.quantile(limits[0]), s.quantile(limits[1])
+    return s.clip(lower=low, upper=high)
+
+def build_fundamentals(paths, workers: int = None):
+    """Panel of raw and winsorized (*_w) fundamentals, one row per archive."""
+    df = pd.DataFrame(list(iter_archives(paths, workers)))
+    for col in ('BM', 'Size', 'dAsset', 'ROE'):
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col + '_w'] = winsorize(df[col].astype(float))
+    return df.sort_values('archive').reset_index(drop=True)
+
+def archive_paths(target: str):
+    if os.path.isfile(target):
+        yield target
+        return
+    for entry in sorted(os.listdir(target)):
+        if entry.lower().endswith('.zip') and 'xbrl' in entry.lower():
+            yield os.path.join(target, entry)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Winsorized fundamentals from EDGAR XBRL archives.")
+    parser.add_argument("target", nargs="?", default=".", help="a *-xbrl.zip or a directory of them")
+    parser.add_argument("--out", default="fundamentals.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    panel = build_fundamentals(archive_paths(args.target), args.workers)
+    failed = panel['error'].notna().sum() if 'error' in panel.columns else 0
+    panel.to_csv(args.out, index=False)
+    print(f"Fundamentals for {len(panel) - failed}/{len(panel)} archives -> {args.out}")
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Shared fixtures: synthetic filings from benchmarks/synthetic.py and the
+# dataset built from them in each storage mode, next to naive pandas
+# references. Every on-disk artifact (snapshots, partitions, models, pipeline
+# caches) goes to a throwaway directory, set before the backend is imported
+# since its modules read these at import time. Partition scans use small
+# chunks on two threads so merges across chunks are exercised.
+WORK_DIR = tempfile.mkdtemp(prefix="ccti-tests-")
+for name, sub in (("CCTI_SNAPSHOT_DIR", "snapshots"), ("CCTI_PARTITION_DIR", "partitions"),
+                  ("CCTI_MODEL_DIR", "models"), ("CCTI_PIPELINE_CACHE", "cache")):
+    os.environ[name] = os.path.join(WORK_DIR, sub)
+os.environ["CCTI_CHUNK_ROWS"] = "1000"
+os.environ["CCTI_SCAN_WORKERS"] = "2"
+
+from backend import data_manager
+from benchmarks.synthetic import dataset
+
+N_ROWS = 6000
+N_UNDATED = 40
+MODES = ("memory", "compact", "partitioned")
+
+# (name, FilterRequest fields): open and closed date bounds, bounds inside a
+# month, each set filter, and all of them at once
+FILTERS = [
+    ("all", {}),
+    ("from", dict(start_date="2001-01-01")),
+    ("until", dict(end_date="2010-06-15")),
+    ("range", dict(start_date="2003-03-10", end_date="2012-11-20")),
+    ("one_day", dict(start_date="2007-05-14", end_date="2007-05-14")),
+    ("sics", dict(sics=[3571, 7372, 2834])),
+    ("forms", dict(forms=["10-K", "10-K405"])),
+    ("market", dict(market_conditions=[1])),
+    ("combined", dict(start_date="2005-01-01", end_date="2015-12-31", sics=[2834, 3674, 6021],
+                      forms=["10-K"], market_conditions=[0])),
+    ("empty", dict(start_date="2099-01-01")),
+]
+
+def filter_params():
+    return pytest.mark.parametrize("filters", [f for _, f in FILTERS], ids=[n for n, _ in FILTERS])
+
+def pandas_filter(df: pd.DataFrame, start_date=None, end_date=None, sics=None, forms=None,
+                  market_conditions=None):
+    """The filter as a plain boolean mask (NaT never satisfies a date bound)."""
+    dates = pd.to_datetime(df["FILING_DATE"])
+    mask = pd.Series(True, index=df.index)
+    if start_date:
+        mask &= dates >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= dates <= pd.Timestamp(end_date)
+    if sics:
+        mask &= df["SIC"].isin(sics)
+    if forms:
+        mask &= df["FORM_TYPE"].isin(forms)
+    if market_conditions:
+        mask &= df["MarketCondition"].isin(market_conditions)
+    return df[mask]
+
+def build_state(path: str, mode: str):
+    """The DatasetState of path in one storage mode (not published)."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(data_manager, "STORAGE", "partitioned" if mode == "partitioned" else "memory")
+        mp.setattr(data_manager, "COMPACT", mode == "compact")
+        return data_manager.build_dataset(path)
+
+@pytest.fixture(scope="session", autouse=True)
+def _work_dir():
+    yield WORK_DIR
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def synthetic_csv():
+    return dataset(N_ROWS, os.path.join(WORK_DIR, "data"), seed=7)
+
+@pytest.fixture(scope="session")
+def undated_csv(synthetic_csv):
+    """The synthetic filings with a few blank filing dates."""
+    path = os.path.join(WORK_DIR, "data", "undated.csv")
+    df = pd.read_csv(synthetic_csv)
+    rows = np.random.default_rng(11).choice(len(df), N_UNDATED, replace=False)
+    df.loc[rows, "FILING_DATE"] = np.nan
+    df.to_csv(path, index=False)
+    return path
+
+@pytest.fixture(scope="session")
+def source_frame(synthetic_csv):
+    """The CSV as pandas reads it, in the served (stable filing date) order."""
+    df = pd.read_csv(synthetic_csv)
+    order = np.argsort(pd.to_datetime(df["FILING_DATE"]).to_numpy(), kind="stable")
+    return df.iloc[order].reset_index(drop=True)
+
+@pytest.fixture(scope="session")
+def states(synthetic_csv):
+    return {mode: build_state(synthetic_csv, mode) for mode in MODES}
+
+@pytest.fixture(scope="session")
+def undated_states(undated_csv):
+    return {mode: build_state(undated_csv, mode) for mode in MODES}
+
+@pytest.fixture
+def publish():
+    """publish(state) makes state the current dataset for the test."""
+    previous = data_manager._state
+    yield data_manager.publish_dataset
+    if previous is not None:
+        data_manager.publish_dataset(previous)
+    else:
+        data_manager._state = None
+        data_manager.result_cache.clear()
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.cube import KPICube, describe_totals, kpi_totals, merge_totals, row_totals
+from conftest import MODES, N_UNDATED, filter_params, pandas_filter
+
+def kpis(state, **filters):
+    totals = kpi_totals(state.cube, state.df, state.index, **filters)
+    return totals["count"], describe_totals(totals, state.cube.measures)
+
+def assert_describes(described, rows: pd.DataFrame, rtol=1e-9):
+    for measure, stats in described.items():
+        values = rows[measure].dropna()
+        assert stats["n"] == len(values)
+        if len(values) > 1:
+            np.testing.assert_allclose(stats["mean"], values.mean(), rtol=rtol, atol=1e-12)
+            np.testing.assert_allclose(stats["var"], values.var(ddof=1), rtol=rtol * 100, atol=1e-12)
+
+@filter_params()
+def test_kpis_match_pandas(states, filters):
+    state = states["memory"]
+    expected = pandas_filter(state.df, **filters)
+    count, described = kpis(state, **filters)
+    assert count == len(expected)
+    assert_describes(described, expected)
+
+@filter_params()
+def test_kpis_by_month_match_groupby(states, filters):
+    state = states["memory"]
+    monthly = kpi_totals(state.cube, state.df, state.index, by_month=True, **filters)
+    expected = pandas_filter(state.df, **filters)
+    groups = dict(list(expected.groupby("ym")))
+    assert sorted(map(str, monthly)) == sorted(groups)
+    for ym, totals in monthly.items():
+        assert totals["count"] == len(groups[str(ym)])
+        assert_describes(describe_totals(totals, state.cube.measures), groups[str(ym)])
+
+@pytest.mark.parametrize("mode", ["compact", "partitioned"])
+@filter_params()
+def test_kpis_agree_across_modes(states, mode, filters):
+    count, described = kpis(states[mode], **filters)
+    base_count, base = kpis(states["memory"], **filters)
+    assert count == base_count
+    for measure, stats in base.items():
+        assert described[measure]["n"] == stats["n"]
+        # Compact columns are float32 within COMPACT_RTOL
+        rtol = 1e-5 if mode == "compact" else 1e-9
+        np.testing.assert_allclose(described[measure]["mean"], stats["mean"], rtol=rtol, atol=1e-9)
+        np.testing.assert_allclose(described[measure]["std"], stats["std"], rtol=rtol, atol=1e-9)
+
+@pytest.mark.parametrize("mode", MODES)
+def test_undated_rows_only_count_without_date_bounds(undated_states, mode):
+    state = undated_states[mode]
+    assert kpis(state)[0] == len(state.df)
+    assert kpis(state, start_date="1990-01-01")[0] == len(state.df) - N_UNDATED
+
+def test_appended_cube_matches_one_built_at_once(states):
+    df = states["memory"].df
+    whole = KPICube(df)
+    # Later chunks bring new months and codes, and revisit existing cells
+    merged = KPICube(dims=whole.dims, measures=whole.measures)
+    shuffled = df.sample(frac=1, random_state=5)
+    for lo in range(0, len(df), 1500):
+        merged.append(shuffled.iloc[lo:lo + 1500])
+    merged.append(df.iloc[0:0])
+    assert merged.n_cells == whole.n_cells
+    for ym_from, ym_to, sets in [(None, None, {}), ("2000-01", "2009-12", {"forms": ["10-K"]}),
+                                 (None, "2015-06", {"sics": [3571, 2834], "market_conditions": [0]})]:
+        a = whole.totals(whole.cell_mask(ym_from, ym_to, **sets))
+        b = merged.totals(merged.cell_mask(ym_from, ym_to, **sets))
+        assert a["count"] == b["count"]
+        np.testing.assert_array_equal(a["n"], b["n"])
+        np.testing.assert_allclose(a["sums"], b["sums"], rtol=1e-12)
+        np.testing.assert_allclose(a["sumsq"], b["sumsq"], rtol=1e-12)
+
+def test_merged_row_totals_match_the_whole(states):
+    df = states["memory"].df
+    measures = ["CCTI", "ExcessRet", "Vol_30d"]
+    half = len(df) // 2
+    merged = merge_totals(row_totals(df.iloc[:half], measures), row_totals(df.iloc[half:], measures))
+    whole = row_totals(df, measures)
+    assert merged["count"] == whole["count"]
+    np.testing.assert_allclose(merged["sums"], whole["sums"], rtol=1e-12)
+    np.testing.assert_allclose(merged["sumsq"], whole["sumsq"], rtol=1e-12)
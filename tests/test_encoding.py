@@ -0,0 +1,92 @@
+import gzip
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from backend import data_manager, tasks
+from backend.data_manager import SENTIMENT_COLS
+from backend.encoding import BINARY_MAGIC, encode_binary, encode_result, to_columns
+
+def request(query: str = "", accept: str = None, accept_encoding: str = None):
+    headers = [(k.encode(), v.encode()) for k, v in (("accept", accept), ("accept-encoding", accept_encoding)) if v]
+    return Request({"type": "http", "method": "POST", "path": "/", "query_string": query.encode(), "headers": headers})
+
+def decode_binary(body: bytes):
+    """A reader written from the layout in encode_binary's docstring: the columnar result."""
+    assert body[:4] == BINARY_MAGIC
+    (length,) = struct.unpack("<I", body[4:8])
+    header = json.loads(body[8:8 + length])
+    data = body[8 + length:]
+    assert (8 + length) % 8 == 0
+
+    def restore(value):
+        if isinstance(value, dict) and set(value) == {"$array"}:
+            spec = header["arrays"][value["$array"]]
+            assert spec["offset"] % 8 == 0
+            dtype = {"float64": "<f8", "int32": "<i4"}[spec["dtype"]]
+            arr = np.frombuffer(data, dtype=dtype, count=spec["byteLength"] // np.dtype(dtype).itemsize,
+                                offset=spec["offset"])
+            return arr.reshape(spec["shape"]).tolist()
+        if isinstance(value, dict):
+            return {k: restore(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [restore(v) for v in value]
+        return value
+    return restore(header["body"])
+
+@pytest.fixture(scope="module")
+def results(states):
+    previous = data_manager._state
+    data_manager.publish_dataset(states["memory"])
+    filters = dict(start_date="2004-01-01", forms=["10-K"])
+    out = {
+        "histogram": tasks.ccti_hist_task(filters, 40),
+        "heatmaps": tasks.heatmaps_task(filters, SENTIMENT_COLS[:3]),
+        "scatter": tasks.scatter_task(filters, 100.0, "binned", "full"),
+        "trend": tasks.trend_task(filters, 100.0, "binned", "full"),
+    }
+    data_manager._state = previous
+    return out
+
+@pytest.mark.parametrize("name, field", [("histogram", None), ("trend", None), ("scatter", "points"),
+                                         ("scatter", "trend")])
+def test_columns_match_pandas(results, name, field):
+    result = results[name]
+    columns = to_columns(result)
+    records, got = (result, columns) if field is None else (result[field], columns[field])
+    assert got == pd.DataFrame(records).to_dict(orient="list")
+
+@pytest.mark.parametrize("name", ["histogram", "heatmaps", "scatter", "trend"])
+def test_binary_round_trip(results, name):
+    result = json.loads(json.dumps(results[name], default=str))
+    assert decode_binary(encode_binary(result)) == to_columns(result)
+
+def test_binary_types_and_nested_arrays():
+    result = {"a": [{"x": 1, "y": 0.5, "label": "p"}, {"x": 2, "y": -1.25, "label": None}],
+              "grid": [[1.0, 2.0], [3.0, 4.0]], "big": [1, 2 ** 40], "ragged": [[1], [2, 3]], "empty": []}
+    body = encode_binary(result)
+    header = json.loads(body[8:8 + struct.unpack("<I", body[4:8])[0]])
+    dtypes = [(a["dtype"], a["shape"]) for a in header["arrays"]]
+    assert ("int32", [2]) in dtypes and ("float64", [2, 2]) in dtypes and ("float64", [2]) in dtypes
+    assert decode_binary(body) == to_columns(result)
+
+def test_negotiation_and_gzip(results):
+    result = results["scatter"]
+    assert encode_result(request(), result) is result
+    response = encode_result(request("format=columns", accept_encoding="gzip, br"), result)
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.media_type == "application/vnd.ccti.columns+json"
+    assert json.loads(gzip.decompress(response.body)) == json.loads(json.dumps(to_columns(result), default=str))
+    response = encode_result(request(accept="application/octet-stream"), result)
+    assert "content-encoding" not in response.headers
+    assert decode_binary(response.body) == to_columns(json.loads(json.dumps(result, default=str)))
+    small = encode_result(request("format=binary", accept_encoding="gzip"), results["histogram"][:2])
+    assert "content-encoding" not in small.headers # below COMPRESS_MIN_BYTES
+    with pytest.raises(HTTPException) as error:
+        encode_result(request("format=xml"), result)
+    assert error.value.status_code == 422
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.filter_index import FilterIndex
+from conftest import MODES, filter_params, pandas_filter
+
+def served_order(path: str):
+    df = pd.read_csv(path)
+    order = np.argsort(pd.to_datetime(df["FILING_DATE"]).to_numpy(), kind="stable")
+    return df.iloc[order].reset_index(drop=True)
+
+def accessions(df: pd.DataFrame):
+    return df["ACC_NUM"].astype(str).tolist()
+
+@pytest.mark.parametrize("mode", MODES)
+@filter_params()
+def test_select_matches_pandas(states, source_frame, mode, filters):
+    state = states[mode]
+    expected = pandas_filter(source_frame, **filters)
+    assert accessions(state.index.select(state.df, **filters)) == accessions(expected)
+    assert len(state.index.row_positions(**filters)) == len(expected)
+
+@pytest.mark.parametrize("mode", MODES)
+@filter_params()
+def test_undated_rows_match_no_date_bound(undated_states, undated_csv, mode, filters):
+    state = undated_states[mode]
+    expected = pandas_filter(served_order(undated_csv), **filters)
+    assert accessions(state.index.select(state.df, **filters)) == accessions(expected)
+
+def test_unsorted_frame_is_indexed_in_date_order(source_frame):
+    shuffled = source_frame.sample(frac=1, random_state=3).reset_index(drop=True)
+    shuffled["FILING_DATE"] = pd.to_datetime(shuffled["FILING_DATE"])
+    index = FilterIndex(shuffled)
+    assert index.order is not None
+    filters = dict(start_date="2004-02-15", end_date="2009-09-30", forms=["10-K"])
+    selected = index.select(shuffled, **filters)
+    expected = pandas_filter(shuffled, **filters)
+    assert selected["FILING_DATE"].is_monotonic_increasing
+    assert sorted(accessions(selected)) == sorted(accessions(expected))
+
+def test_date_only_selection_is_a_view(states):
+    state = states["memory"]
+    assert state.index.order is None
+    lo, hi, mask = state.index.positions(start_date="2001-01-01", end_date="2002-12-31")
+    assert mask is None
+    assert np.shares_memory(
+        state.index.select(state.df, start_date="2001-01-01", end_date="2002-12-31")["CCTI"].to_numpy(),
+        state.df["CCTI"].to_numpy()
+    )
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import tasks
+from backend.data_manager import SENTIMENT_COLS
+from conftest import filter_params, pandas_filter
+
+# The chart tasks answer the same in every storage mode: exactly for the
+# partitioned store (same float64 values, streamed), to float32 precision for
+# the compact frame.
+OTHER_MODES = ["compact", "partitioned"]
+RTOL = {"compact": 1e-5, "partitioned": 1e-10}
+
+def run_in(publish, state, task, *args):
+    publish(state)
+    return task(*args)
+
+def assert_close(a, b, rtol):
+    np.testing.assert_allclose(np.asarray(a, dtype=float), np.asarray(b, dtype=float), rtol=rtol, atol=rtol * 0.1)
+
+@pytest.mark.parametrize("mode", OTHER_MODES)
+@filter_params()
+def test_histogram(states, publish, mode, filters):
+    got = run_in(publish, states[mode], tasks.ccti_hist_task, filters, 30)
+    expected = run_in(publish, states["memory"], tasks.ccti_hist_task, filters, 30)
+    assert len(got) == len(expected)
+    assert sum(r["count"] for r in got) == sum(r["count"] for r in expected)
+    if mode == "partitioned":
+        assert got == expected
+    else:
+        # A float32 value next to a bin edge may land in the neighbouring bin
+        assert sum(abs(a["count"] - b["count"]) for a, b in zip(got, expected)) <= 2
+
+@pytest.mark.parametrize("mode", OTHER_MODES)
+@filter_params()
+def test_heatmaps(states, publish, mode, filters):
+    got = run_in(publish, states[mode], tasks.heatmaps_task, filters, SENTIMENT_COLS)
+    expected = run_in(publish, states["memory"], tasks.heatmaps_task, filters, SENTIMENT_COLS)
+    assert (got["x"], got["y"]) == (expected["x"], expected["y"])
+    assert got["panels"].keys() == expected["panels"].keys()
+    for col, panel in expected["panels"].items():
+        assert got["panels"][col]["counts"] == panel["counts"]
+        for field in ("z", "se"):
+            assert_close(pd.DataFrame(got["panels"][col][field]), pd.DataFrame(panel[field]), RTOL[mode])
+
+@pytest.mark.parametrize("mode", OTHER_MODES)
+@pytest.mark.parametrize("trend", ["binned", "exact"])
+@filter_params()
+def test_full_trend(states, publish, mode, trend, filters):
+    args = (filters, 100.0, trend, "full")
+    got = pd.DataFrame(run_in(publish, states[mode], tasks.trend_task, *args), columns=["CCTI", "Trend"])
+    expected = pd.DataFrame(run_in(publish, states["memory"], tasks.trend_task, *args), columns=["CCTI", "Trend"])
+    assert len(got) == len(expected)
+    if mode == "compact" and trend == "exact":
+        if len(expected) < 100:
+            return # with a few dozen points, LOWESS windows are narrow enough to amplify float32 rounding
+        assert_close(got, expected, 1e-3)
+    else:
+        assert_close(got, expected, RTOL[mode])
+
+@pytest.mark.parametrize("mode", OTHER_MODES)
+def test_scatter_of_a_small_filter_shows_every_row(states, publish, mode):
+    filters = dict(start_date="2010-01-01", end_date="2013-06-30", forms=["10-K"])
+    got = run_in(publish, states[mode], tasks.scatter_task, filters, 5.0, "exact", "sample")
+    expected = run_in(publish, states["memory"], tasks.scatter_task, filters, 5.0, "exact", "sample")
+    eligible = pandas_filter(states["memory"].df, **filters)
+    assert len(expected["points"]) == int((eligible["Vol_30d"] <= 5.0).sum()) < 2000
+    got_points = pd.DataFrame(got["points"]).sort_values("ACC_NUM").reset_index(drop=True)
+    expected_points = pd.DataFrame(expected["points"]).sort_values("ACC_NUM").reset_index(drop=True)
+    assert got_points["ACC_NUM"].astype(str).tolist() == expected_points["ACC_NUM"].tolist()
+    assert got_points["FILING_DATE"].tolist() == expected_points["FILING_DATE"].tolist()
+    assert_close(got_points[["CCTI", "ExcessRet", "Vol_30d"]], expected_points[["CCTI", "ExcessRet", "Vol_30d"]],
+                 RTOL[mode])
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import charts, partitions
+from backend.data_manager import filtered_columns
+from conftest import filter_params, pandas_filter
+
+MEASURES = ["CCTI", "ExcessRet", "Vol_30d"]
+
+def moments(chunk):
+    x = np.column_stack([chunk[m] for m in MEASURES])
+    return len(x), x.sum(axis=0), (x * x).sum(axis=0)
+
+@filter_params()
+def test_scan_totals_match_pandas(states, filters):
+    store = states["partitioned"].store
+    parts = store.scan(moments, MEASURES, **filters)
+    expected = pandas_filter(states["memory"].df, **filters)[MEASURES].to_numpy()
+    assert sum(p[0] for p in parts) == len(expected)
+    if len(expected):
+        np.testing.assert_allclose(np.sum([p[1] for p in parts], axis=0), expected.sum(axis=0), rtol=1e-10)
+        np.testing.assert_allclose(np.sum([p[2] for p in parts], axis=0), (expected ** 2).sum(axis=0), rtol=1e-10)
+
+@filter_params()
+def test_chunks_are_bounded_and_pruned(states, filters):
+    store = states["partitioned"].store
+    chunks = list(store.chunks(**filters))
+    sizes = [sum(hi - lo for lo, hi, _ in chunk) for chunk in chunks]
+    assert all(size <= partitions.CHUNK_ROWS for size in sizes)
+    if not filters:
+        assert len(chunks) == -(-store.n_rows // partitions.CHUNK_ROWS)
+    if filters.get("start_date") and filters.get("end_date"):
+        # Only partitions whose span overlaps the range are read
+        assert sum(sizes) < store.n_rows
+
+@filter_params()
+def test_filtered_columns_match_memory(states, filters):
+    columns = ["CCTI", "ExcessRet", "CoName", "FORM_TYPE", "FILING_DATE"]
+    got = filtered_columns(filters, columns, states["partitioned"])
+    expected = filtered_columns(filters, columns, states["memory"])
+    assert list(got.columns) == columns
+    pd.testing.assert_frame_equal(got.reset_index(drop=True).astype({"CoName": object, "FORM_TYPE": object}),
+                                  expected.reset_index(drop=True).astype({"CoName": object, "FORM_TYPE": object}),
+                                  check_dtype=False)
+
+def scan_of(store, filters, workers):
+    return lambda fn, columns: store.scan(fn, columns, workers=workers, **filters)
+
+@pytest.mark.parametrize("chunk_rows, workers", [(250, 1), (700, 3), (6000, 1)])
+def test_scans_do_not_depend_on_chunking(states, publish, monkeypatch, chunk_rows, workers):
+    publish(states["partitioned"]) # scan_frame decodes with the current store
+    store = states["partitioned"].store
+    filters = dict(start_date="1998-01-01", forms=["10-K", "10-KSB"])
+    baseline = (charts.scan_scatter(scan_of(store, filters, 1), trend="binned", trend_on="full"),
+                charts.scan_trend_line(scan_of(store, filters, 1), trend="exact"))
+    monkeypatch.setattr(partitions, "CHUNK_ROWS", chunk_rows)
+    scatter = charts.scan_scatter(scan_of(store, filters, workers), trend="binned", trend_on="full")
+    assert scatter["points"] == baseline[0]["points"]
+    np.testing.assert_allclose(pd.DataFrame(scatter["trend"]), pd.DataFrame(baseline[0]["trend"]), rtol=1e-10)
+    assert charts.scan_trend_line(scan_of(store, filters, workers), trend="exact") == baseline[1]
+
+def test_scatter_sample_is_drawn_from_the_filter(states, publish):
+    publish(states["partitioned"])
+    store = states["partitioned"].store
+    filters = dict(end_date="2019-12-31", market_conditions=[1])
+    result = charts.scan_scatter(scan_of(store, filters, 2), vol_cutoff=4.0)
+    points = pd.DataFrame(result["points"])
+    eligible = pandas_filter(states["memory"].df, **filters)
+    eligible = eligible[eligible["Vol_30d"] <= 4.0]
+    assert len(points) == min(charts.SCATTER_SAMPLE, len(eligible)) < len(eligible)
+    assert points["ACC_NUM"].is_unique and points["ACC_NUM"].isin(eligible["ACC_NUM"]).all()
+    assert points["CCTI"].is_monotonic_increasing
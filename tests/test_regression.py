@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from backend import regression
+from backend.regression import SPECS, run_regression
+from conftest import FILTERS, MODES, pandas_filter
+
+FILTER_FIELDS = dict(start_date=None, end_date=None, sics=None, forms=None, market_conditions=None)
+FITTED = [(n, f) for n, f in FILTERS if n not in ("one_day", "empty")]
+
+@pytest.fixture(autouse=True)
+def fresh_cube(monkeypatch):
+    # The cube is memoized per dataset version, which every mode of a CSV shares
+    monkeypatch.setattr(regression, "_cube", None)
+
+def statsmodels_fit(path: str, filters: dict, spec: str, cov_type: str):
+    """The notebook's regression: source values, missing targets dropped, regressors fillna(0)."""
+    target, variables = SPECS[spec]
+    df = pd.read_csv(path)
+    if target == "ExcessRet_w":
+        low, high = np.nanquantile(df["ExcessRet"], [0.01, 0.99])
+        df["ExcessRet_w"] = df["ExcessRet"].clip(low, high)
+    df = pandas_filter(df, **filters).dropna(subset=[target])
+    X = sm.add_constant(df[variables].fillna(0), has_constant="add")
+    return sm.OLS(df[target], X).fit(cov_type=cov_type)
+
+def fit(state, filters: dict, spec: str, cov_type: str, **kwargs):
+    target, variables = SPECS[spec]
+    return run_regression(state, dict(FILTER_FIELDS, **filters), target, variables, cov_type, **kwargs)
+
+def assert_matches(result, model):
+    assert result["n"] == int(model.nobs)
+    coefs = pd.DataFrame(result["coefficients"]).set_index("variable")
+    np.testing.assert_allclose(coefs["coef"], model.params[coefs.index], rtol=1e-7, atol=1e-10)
+    np.testing.assert_allclose(coefs["se"], model.bse[coefs.index], rtol=1e-7, atol=1e-12)
+    np.testing.assert_allclose(coefs["p"], model.pvalues[coefs.index], rtol=1e-5, atol=1e-10)
+    np.testing.assert_allclose(result["r2"], model.rsquared, rtol=1e-7, atol=1e-12)
+    np.testing.assert_allclose(result["adj_r2"], model.rsquared_adj, rtol=1e-6, atol=1e-12)
+
+@pytest.mark.parametrize("cov_type", ["nonrobust", "HC3"])
+@pytest.mark.parametrize("filters", [f for _, f in FITTED], ids=[n for n, _ in FITTED])
+def test_matches_statsmodels(states, synthetic_csv, filters, cov_type):
+    result = fit(states["memory"], filters, "ccti_sq", cov_type)
+    assert_matches(result, statsmodels_fit(synthetic_csv, filters, "ccti_sq", cov_type))
+
+@pytest.mark.parametrize("spec", ["sentiment", "enhanced", "ccti_mc"])
+def test_specifications_match_statsmodels(states, synthetic_csv, spec):
+    filters = dict(start_date="2000-02-15", forms=["10-K", "10-KSB"])
+    assert_matches(fit(states["memory"], filters, spec, "HC3"), statsmodels_fit(synthetic_csv, filters, spec, "HC3"))
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("filters", [f for _, f in FITTED], ids=[n for n, _ in FITTED])
+def test_modes_and_undated_rows_match_statsmodels(undated_states, undated_csv, mode, filters):
+    result = fit(undated_states[mode], filters, "ccti", "HC3")
+    assert_matches(result, statsmodels_fit(undated_csv, filters, "ccti", "HC3"))
+
+@pytest.mark.parametrize("name", ["one_day", "empty"])
+def test_too_few_rows_is_an_error(states, name):
+    with pytest.raises(ValueError):
+        fit(states["memory"], dict(FILTERS)[name], "ccti_sq", "HC3")
+
+def test_cluster_bootstrap_matches_weighted_least_squares(states, synthetic_csv):
+    # With no filter every cluster is one ym x FORM_TYPE x MarketCondition partition, in sorted
+    # order; a replicate is WLS with its multinomial cluster counts as row weights
+    n_boot, seed = 40, 5
+    result = fit(states["memory"], {}, "ccti", "nonrobust", n_boot=n_boot, seed=seed)
+    target, variables = SPECS["ccti"]
+    df = pd.read_csv(synthetic_csv)
+    df["ym"] = pd.to_datetime(df["FILING_DATE"]).dt.to_period("M").astype(str)
+    cluster = df.groupby(["ym", "FORM_TYPE", "MarketCondition"], sort=True).ngroup().to_numpy()
+    m = cluster.max() + 1
+    assert result["bootstrap"] == {"replicates": n_boot, "clusters": m}
+
+    weights = np.random.default_rng(seed).multinomial(m, np.full(m, 1.0 / m), size=n_boot)
+    X = sm.add_constant(df[variables].fillna(0))
+    draws = np.array([sm.WLS(df[target], X, weights=w[cluster]).fit().params.to_numpy() for w in weights])
+    coefs = pd.DataFrame(result["coefficients"])
+    np.testing.assert_allclose(coefs["boot_se"], draws.std(axis=0, ddof=1), rtol=1e-6)
+    np.testing.assert_allclose(coefs["boot_ci_low"], np.quantile(draws, 0.025, axis=0), rtol=1e-6, atol=1e-12)
+    np.testing.assert_allclose(coefs["boot_ci_high"], np.quantile(draws, 0.975, axis=0), rtol=1e-6, atol=1e-12)
+
+def test_bootstrap_is_reproducible_across_threads(states, monkeypatch):
+    monkeypatch.setattr(regression, "BOOT_BATCH", 16)
+    filters = dict(start_date="2002-06-10", end_date="2018-03-20", sics=[3571, 2834, 7372, 6021])
+    serial = fit(states["memory"], filters, "ccti_mc", "HC3", n_boot=100, seed=1)
+    monkeypatch.setattr(regression, "BOOT_THREADS", 3)
+    threaded = fit(states["memory"], filters, "ccti_mc", "HC3", n_boot=100, seed=1)
+    assert serial == threaded
+    assert all(0 < c["boot_se"] < np.inf for c in serial["coefficients"])
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.returns import event_returns, load_panel, load_rf
+
+N_FIRMS = 30
+HORIZONS = (1, 5, 30)
+
+@pytest.fixture(scope="module")
+def market(source_frame, tmp_path_factory):
+    """
+    Filings of a few synthetic firms (ticker = CIK), a price panel with gaps and
+    firm-specific listing spans, a benchmark and a daily risk-free file.
+    """
+    directory = tmp_path_factory.mktemp("returns")
+    rng = np.random.default_rng(3)
+    firms = source_frame["ACC_NUM"].str[:10].drop_duplicates().head(N_FIRMS).tolist()
+    filings = source_frame[source_frame["ACC_NUM"].str[:10].isin(firms)][["ACC_NUM", "FILING_DATE"]].copy()
+    filings["Ticker"] = "T" + filings["ACC_NUM"].str[:10]
+    # A ticker without prices and a filing without a date
+    filings.iloc[0, filings.columns.get_loc("Ticker")] = "NOPRICES"
+    filings.iloc[1, filings.columns.get_loc("FILING_DATE")] = np.nan
+
+    days = pd.bdate_range("1993-06-01", "2025-03-31")
+    frames = []
+    for ticker in ["T" + f for f in firms] + ["SPY"]:
+        keep = rng.random(len(days)) > 0.1 # missing trading days
+        n = len(days)
+        lo, hi = (rng.integers(0, n // 4), rng.integers(3 * n // 4, n)) if ticker != "SPY" else (0, n)
+        keep[:lo] = keep[hi:] = False
+        dates = days[keep]
+        close = 20 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(dates))))
+        frames.append(pd.DataFrame({"ticker": ticker.lower(), "date": dates.strftime("%Y-%m-%d"), "close": close}))
+    prices = pd.concat(frames, ignore_index=True)
+    prices_path = directory / "prices.csv"
+    prices.to_csv(prices_path, index=False)
+
+    rf = pd.DataFrame({"date": days.strftime("%Y%m%d"), "RF": rng.uniform(0.0, 0.02, len(days)).round(4)})
+    rf_path = directory / "rf.csv"
+    rf.to_csv(rf_path, index=False)
+    return filings.reset_index(drop=True), prices, rf, str(prices_path), str(rf_path), str(directory / "cache")
+
+def naive_event_returns(filings, prices, rf):
+    """Per filing with pandas: merge_asof for the event day, Series.asof for the benchmark."""
+    prices = prices.assign(ticker=prices["ticker"].str.upper(), date=pd.to_datetime(prices["date"]))
+    series = {t: g.set_index("date")["close"] for t, g in prices.groupby("ticker")}
+    rf = rf.assign(date=pd.to_datetime(rf["date"], format="%Y%m%d")).set_index("date")["RF"] / 100
+    bench = series["SPY"]
+
+    events = filings.assign(FILING_DATE=pd.to_datetime(filings["FILING_DATE"]), row=np.arange(len(filings)))
+    dated = events.dropna(subset=["FILING_DATE"]).sort_values("FILING_DATE")
+    located = pd.merge_asof(
+        dated, prices.rename(columns={"ticker": "Ticker", "date": "EventDate"}).sort_values("EventDate"),
+        left_on="FILING_DATE", right_on="EventDate", by="Ticker", direction="forward"
+    ).set_index("row")
+    rows = []
+    for i in range(len(filings)):
+        out = {"EventDate": located["EventDate"].get(i, pd.NaT)}
+        s = series.get(str(filings["Ticker"][i]).upper())
+        t0 = s.index.get_loc(out["EventDate"]) if s is not None and pd.notna(out["EventDate"]) else None
+        for h in HORIZONS:
+            ret = bench_ret = rf_ret = vol = np.nan
+            if t0 is not None and t0 + h < len(s):
+                d0, d1 = s.index[t0], s.index[t0 + h]
+                ret = s.iloc[t0 + h] / s.iloc[t0] - 1
+                if pd.notna(bench.asof(d0)):
+                    bench_ret = bench.asof(d1) / bench.asof(d0) - 1
+                rf_ret = (1 + rf[(rf.index > d0) & (rf.index <= d1)]).prod() - 1
+            if t0 is not None and h > 1 and t0 - h - 1 >= 0:
+                vol = s.pct_change().iloc[t0 - h:t0].std(ddof=1)
+            out.update({f"Ret_{h}d": ret, f"Bench_{h}d": bench_ret, f"AbnRet_{h}d": ret - bench_ret,
+                        f"RF_{h}d": rf_ret, f"ExcessRet_{h}d": ret - rf_ret, f"Vol_{h}d": vol})
+        rows.append(out)
+    return pd.DataFrame(rows)
+
+def test_event_returns_match_pandas(market):
+    filings, prices, rf, prices_path, rf_path, cache = market
+    panel = load_panel(prices_path, cache_dir=cache)
+    got = event_returns(filings["Ticker"], filings["FILING_DATE"], panel, HORIZONS, benchmark="spy",
+                        rf=load_rf(rf_path))
+    expected = naive_event_returns(filings, prices, rf)
+    assert len(got) == len(filings)
+    assert got["EventDate"].isna().sum() > 2 # unknown ticker, no date, outside the listing span
+    assert got[["Ret_30d", "Bench_30d", "RF_30d", "Vol_30d"]].notna().all(axis=1).mean() > 0.5
+    pd.testing.assert_series_equal(
+        pd.to_datetime(got["EventDate"]).astype("datetime64[ns]"),
+        pd.to_datetime(expected["EventDate"]).astype("datetime64[ns]"), check_names=False
+    )
+    for col in expected.columns.drop("EventDate"):
+        np.testing.assert_allclose(got[col].to_numpy(), expected[col].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-12, err_msg=col)
+
+def test_compiled_panel_is_reused(market, capsys):
+    filings, prices, rf, prices_path, rf_path, cache = market
+    first = load_panel(prices_path, cache_dir=cache)
+    capsys.readouterr()
+    second = load_panel(prices_path, cache_dir=cache)
+    assert "Compiled price panel" not in capsys.readouterr().out
+    assert isinstance(second.close, np.memmap)
+    np.testing.assert_array_equal(first.keys, second.keys)
+    np.testing.assert_array_equal(first.close, second.close)
+
+def test_unknown_benchmark_is_rejected(market):
+    filings, prices, rf, prices_path, rf_path, cache = market
+    with pytest.raises(ValueError):
+        event_returns(filings["Ticker"], filings["FILING_DATE"], load_panel(prices_path, cache_dir=cache),
+                      HORIZONS, benchmark="NOPE")
@@ -0,0 +1,163 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pipeline.xbrl import build_fundamentals, extract_archive
+
+N_FIRMS = 12
+NAMESPACES = (
+    'xmlns:xbrli="http://www.xbrl.org/2003/instance" xmlns:xbrldi="http://xbrl.org/2006/xbrldi" '
+    'xmlns:us-gaap="http://fasb.org/us-gaap/2024" xmlns:dei="http://xbrl.sec.gov/dei/2024" '
+    'xmlns:acme="http://acme.example/2024"'
+)
+
+def context(cid: str, start: str = None, end: str = None, member: str = None):
+    period = f"<xbrli:startDate>{start}</xbrli:startDate><xbrli:endDate>{end}</xbrli:endDate>" if start \
+        else f"<xbrli:instant>{end}</xbrli:instant>"
+    segment = (f'<xbrli:segment><xbrldi:explicitMember dimension="us-gaap:StatementBusinessSegmentsAxis">'
+               f'{member}</xbrldi:explicitMember></xbrli:segment>') if member else ""
+    return (f'<xbrli:context id="{cid}"><xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">'
+            f'0000000001</xbrli:identifier>{segment}</xbrli:entity><xbrli:period>{period}</xbrli:period>'
+            f'</xbrli:context>')
+
+def firm_facts(row: pd.Series):
+    """Whole-thousand statement values derived from a synthetic filing's controls."""
+    k = lambda x: float(round(x / 1000) * 1000)
+    market = k(np.exp(row["Size_w"] + 21))
+    equity = k(market * (abs(row["BM_w"]) + 0.05))
+    assets = k(equity * 2.5)
+    return {
+        "MarketValue": market,
+        "Equity": equity,
+        "Assets": assets,
+        "PriorAssets": k(assets / (1 + row["dAsset_w"])),
+        "NetIncome": k(equity * row["ROE_w"]),
+    }
+
+def contexts(year: int):
+    return "".join([
+        context("cur", end=f"{year}-12-31"),
+        context("prior", end=f"{year - 1}-12-31"),
+        context("float", end=f"{year}-06-30"),
+        context("fy", start=f"{year}-01-01", end=f"{year}-12-31"),
+        context("q4", start=f"{year}-10-01", end=f"{year}-12-31"),
+        context("seg", end=f"{year}-12-31", member="acme:WidgetsMember"),
+    ])
+
+def inline_instance(facts: dict, year: int, cik: str, name: str):
+    def number(concept, ctx, value):
+        sign = ' sign="-"' if value < 0 else ""
+        return (f'<ix:nonFraction name="{concept}" contextRef="{ctx}" unitRef="usd" decimals="-3" scale="3"'
+                f' format="ixt:num-dot-decimal"{sign}>{abs(value) / 1000:,.0f}</ix:nonFraction>')
+    body = [
+        '<ix:nonNumeric name="dei:DocumentType" contextRef="fy">10-K</ix:nonNumeric>',
+        f'<ix:nonNumeric name="dei:EntityCentralIndexKey" contextRef="fy">{cik}</ix:nonNumeric>',
+        f'<ix:nonNumeric name="dei:EntityRegistrantName" contextRef="fy"><b>{name}</b></ix:nonNumeric>',
+        number("dei:EntityPublicFloat", "float", facts["MarketValue"]),
+        number("us-gaap:Assets", "cur", facts["Assets"]),
+        number("us-gaap:Assets", "prior", facts["PriorAssets"]),
+        number("us-gaap:Assets", "seg", facts["Assets"] / 4), # dimensional: ignored
+        number("acme:Assets", "cur", 1.0), # other taxonomy: ignored
+        number("us-gaap:StockholdersEquityIncludingPortionAttributableToNoncontrollingInterest", "cur",
+               facts["Equity"] + 7000.0), # less preferred than StockholdersEquity
+        number("us-gaap:StockholdersEquity", "cur", facts["Equity"]),
+        number("us-gaap:NetIncomeLoss", "q4", facts["NetIncome"] / 4), # shorter period: ignored
+        number("us-gaap:NetIncomeLoss", "fy", facts["NetIncome"]),
+        '<ix:nonFraction name="us-gaap:ProfitLoss" contextRef="fy" unitRef="usd" xsi:nil="true"'
+        ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"/>',
+    ]
+    return (f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:ix="http://www.xbrl.org/2013/inlineXBRL" '
+            f'{NAMESPACES}><body><div style="display:none"><ix:header><ix:resources>{contexts(year)}'
+            f'</ix:resources></ix:header></div><p>{"</p><p>".join(body)}</p></body></html>')
+
+def plain_instance(facts: dict, year: int, cik: str, name: str):
+    def number(concept, ctx, value):
+        return f'<{concept} contextRef="{ctx}" unitRef="usd" decimals="0">{value:.0f}</{concept}>'
+    body = [
+        '<dei:DocumentType contextRef="fy">10-K</dei:DocumentType>',
+        f'<dei:EntityCentralIndexKey contextRef="fy">{cik}</dei:EntityCentralIndexKey>',
+        f'<dei:EntityRegistrantName contextRef="fy">{name}</dei:EntityRegistrantName>',
+        number("dei:EntityPublicFloat", "float", facts["MarketValue"]),
+        number("us-gaap:Assets", "cur", facts["Assets"]),
+        number("us-gaap:Assets", "prior", facts["PriorAssets"]),
+        number("us-gaap:Assets", "seg", facts["Assets"] / 4),
+        number("us-gaap:StockholdersEquity", "cur", facts["Equity"]),
+        number("us-gaap:NetIncomeLoss", "q4", facts["NetIncome"] / 4),
+        number("us-gaap:NetIncomeLoss", "fy", facts["NetIncome"]),
+    ]
+    return f'<?xml version="1.0"?><xbrli:xbrl {NAMESPACES}>{contexts(year)}{"".join(body)}</xbrli:xbrl>'
+
+@pytest.fixture(scope="module")
+def archives(source_frame, tmp_path_factory):
+    """One archive per synthetic firm (inline and plain instances alternating) and the facts written."""
+    directory = tmp_path_factory.mktemp("xbrl")
+    rows = source_frame.dropna(subset=["BM_w"]).drop_duplicates("CoName").head(N_FIRMS)
+    expected = []
+    for i, (_, row) in enumerate(rows.iterrows()):
+        year = pd.Timestamp(row["FILING_DATE"]).year
+        cik = row["ACC_NUM"][:10]
+        facts = firm_facts(row)
+        path = os.path.join(directory, f"{cik}-{year % 100:02d}-{i:06d}-xbrl.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            if i % 2:
+                z.writestr(f"firm-{year}1231.xml", plain_instance(facts, year, cik, row["CoName"]))
+            else:
+                z.writestr(f"firm-{year}1231.htm", inline_instance(facts, year, cik, row["CoName"]))
+            z.writestr(f"firm-{year}1231_cal.xml", f"<linkbase {NAMESPACES}/>")
+            z.writestr("exhibit21.htm", "<html><body><p>Subsidiaries</p></body></html>")
+        expected.append(dict(archive=os.path.basename(path), cik=cik, company=row["CoName"],
+                             period_end=f"{year}-12-31", **facts))
+    return str(directory), pd.DataFrame(expected)
+
+def naive_ratios(df: pd.DataFrame):
+    return pd.DataFrame({
+        "Size": np.log(df["MarketValue"]),
+        "BM": df["Equity"] / df["MarketValue"],
+        "dAsset": df["Assets"] / df["PriorAssets"] - 1,
+        "ROE": df["NetIncome"] / df["Equity"],
+    })
+
+def test_extracted_facts_and_ratios(archives):
+    directory, expected = archives
+    got = pd.DataFrame([extract_archive(os.path.join(directory, a)) for a in expected["archive"]])
+    assert "error" not in got.columns
+    for col in ("cik", "company", "period_end"):
+        assert got[col].tolist() == expected[col].tolist()
+    assert (got["form_type"] == "10-K").all()
+    for col in ("MarketValue", "Equity", "Assets", "PriorAssets", "NetIncome"):
+        np.testing.assert_array_equal(got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float))
+    ratios = naive_ratios(expected)
+    for col in ratios:
+        np.testing.assert_allclose(got[col].to_numpy(dtype=float), ratios[col].to_numpy(), rtol=1e-12)
+
+def test_panel_is_winsorized_like_pandas_clip(archives):
+    directory, expected = archives
+    paths = [os.path.join(directory, a) for a in expected["archive"]]
+    panel = build_fundamentals(paths, workers=1)
+    assert panel["archive"].tolist() == sorted(expected["archive"])
+    ratios = naive_ratios(expected.set_index("archive").loc[panel["archive"]].reset_index())
+    for col in ("BM", "Size", "dAsset", "ROE"):
+        raw = ratios[col]
+        clipped = raw.clip(raw.quantile(0.01), raw.quantile(0.99))
+        np.testing.assert_allclose(panel[col + "_w"].to_numpy(dtype=float), clipped.to_numpy(), rtol=1e-12)
+
+def test_unreadable_archive_is_reported(tmp_path):
+    path = tmp_path / "broken-xbrl.zip"
+    path.write_bytes(b"not a zip")
+    record = extract_archive(str(path))
+    assert record["archive"] == "broken-xbrl.zip" and "error" in record
+
+APPLE_ARCHIVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "0000320193-24-000123-xbrl.zip")
+
+@pytest.mark.skipif(not os.path.exists(APPLE_ARCHIVE), reason="sample EDGAR archive not present")
+def test_sample_edgar_archive():
+    # Apple's fiscal 2024 10-K: balance sheet, income statement and cover page figures
+    record = extract_archive(APPLE_ARCHIVE)
+    assert (record["cik"], record["form_type"], record["period_end"]) == ("0000320193", "10-K", "2024-09-28")
+    assert record["Assets"] == 364_980e6 and record["PriorAssets"] == 352_583e6
+    assert record["Equity"] == 56_950e6 and record["NetIncome"] == 93_736e6
+    np.testing.assert_allclose(record["ROE"], 93_736 / 56_950, rtol=1e-12)